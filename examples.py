@@ -60,7 +60,7 @@ def main():
     curved_column = ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
     curved_column.to_file(intermediates_dir / 'curved_column.scad')
 
-    keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+    keyboard = DactylManuform.from_config(config)
     keyboard.to_file(intermediates_dir / 'keyboard.scad')
 
 
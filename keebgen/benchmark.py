@@ -0,0 +1,299 @@
+import argparse
+import configparser
+import itertools
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import solid as sl
+
+from .geometry_base import CuboidAnchorCollection, layout_only
+from .key_assy import prototype_cache
+from .key_column import ConcaveOrtholinearColumn
+from .keyboard import DactylManuform
+from .web import make_web
+from .skirt import FlaredSkirt
+from .config import SkirtConfig, KeyboardConfig
+
+# Fixed workloads that time the hot paths of building and exporting a keyboard.
+# Every run is appended to a json history file, and can be compared against a saved baseline:
+#
+#   python -m keebgen.benchmark run --save-baseline baseline.json
+#   ... change things ...
+#   python -m keebgen.benchmark run
+#   python -m keebgen.benchmark compare baseline.json
+#
+# Timings are the minimum and median of several repeats after a warmup. The minimum is the least
+# noisy estimate of the cost, and is what comparisons use.
+#
+# `run --quick` cuts the slowest workloads down, e.g. the OpenSCAD render only renders one column instead
+# of the whole keyboard. Quick runs are only compared against quick baselines.
+
+_DEFAULT_CONFIG = Path(__file__).resolve().parent.parent / 'default_config.ini'
+
+# benchmarks are registered here by name, in the order they run
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(func):
+    """
+    Registers a benchmark. func is called once with the config and whether this is a quick run,
+    and returns the function to time.
+    The timed function may return a dict of extra metrics, like sizes, which are compared like timings.
+    Returning None from func skips the benchmark, for workloads that need optional tools.
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _keyboard(config):
+    return DactylManuform.from_config(config)
+
+
+@benchmark
+def dactyl_manuform_build(config, quick):
+    def run():
+        # build from scratch, without prototypes from earlier runs
+        prototype_cache.clear()
+        _keyboard(config)
+    return run
+
+
+@benchmark
+def layout_build(config, quick):
+    def run():
+        prototype_cache.clear()
+        with layout_only():
+            _keyboard(config)
+    return run
+
+
+@benchmark
+def column_build(config, quick):
+    def run():
+        prototype_cache.clear()
+        ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
+    return run
+
+
+@benchmark
+def anchor_queries(config, quick):
+    anchors = CuboidAnchorCollection.create(dims=(18, 18, 4))
+    faces = ('top', 'bottom', 'left', 'right', 'front', 'back')
+    queries = [(a,) for a in faces] + list(itertools.combinations(faces, 2)) + list(itertools.combinations(faces, 3))
+
+    def run():
+        # fresh copies, so every query misses the query cache
+        for _ in range(100):
+            collection = anchors.copy()
+            for query in queries:
+                collection[query]
+    return run
+
+
+@benchmark
+def skirt_build(config, quick):
+    edge_pairs = _keyboard(config).build_result['edge_pairs']
+    skirt_config = SkirtConfig()
+
+    def run():
+        FlaredSkirt(edge_pairs, skirt_config)
+    return run
+
+
+@benchmark
+def web_build(config, quick):
+    built = _keyboard(config).build_result
+    groups = [built[f'column_{col_num}'].keys() for col_num in range(DactylManuform.num_cols)] + \
+             [built['thumb_cluster'].key_grid.keys()]
+    keyboard = KeyboardConfig.load(config['keyboard'])
+    max_gaps = [keyboard.web_max_gap] * DactylManuform.num_cols + [keyboard.web_thumb_gap]
+
+    def run():
+        make_web(groups, max_gaps)
+    return run
+
+
+@benchmark
+def scad_serialize(config, quick):
+    keyboard = _keyboard(config)
+
+    def run():
+        return {'scad_bytes': len(sl.scad_render(keyboard.solid()))}
+    return run
+
+
+@benchmark
+def openscad_render(config, quick):
+    """Renders the whole keyboard to an stl with OpenSCAD, or a single column in quick runs"""
+    if shutil.which('openscad') is None:
+        return None
+    if quick:
+        part = ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
+    else:
+        part = _keyboard(config)
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            scad_file = Path(tmp) / 'part.scad'
+            scad_file.write_text(sl.scad_render(part.solid()))
+            subprocess.run(['openscad', '-o', str(Path(tmp) / 'part.stl'), str(scad_file)],
+                           check=True, capture_output=True)
+    return run
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, None where it can't be measured"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _git_commit():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def run_benchmarks(config=None, repeat=5, only=None, quick=False) -> dict:
+    """
+    Runs the registered benchmarks and returns a record of the run.
+    Each benchmark is warmed up once, then timed `repeat` times. quick cuts the slowest workloads down
+    """
+    if config is None:
+        config = configparser.ConfigParser()
+        config.read(_DEFAULT_CONFIG)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        run = setup(config, quick)
+        if run is None:
+            continue
+        extra = run() or {}
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        results[name] = {'min': min(times), 'median': statistics.median(times), 'repeat': repeat, **extra}
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def load_history(file_name) -> list:
+    path = Path(file_name)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text())
+
+
+def append_history(record, file_name):
+    history = load_history(file_name)
+    history.append(record)
+    Path(file_name).write_text(json.dumps(history, indent=1))
+
+
+def compare(baseline: dict, current: dict, threshold=0.1):
+    """
+    Compares each benchmark's minimum time and extra metrics with the baseline.
+    Returns a list of (benchmark, metric, baseline value, current value, ratio, regressed) tuples,
+    where regressed is True if the metric grew by more than threshold.
+    A quick run can only be compared against another quick run.
+    """
+    if baseline.get('quick', False) != current.get('quick', False):
+        raise ValueError('can not compare a quick run against a full one, run both with or without --quick')
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        for metric, value in result.items():
+            if metric in ('median', 'repeat') or not isinstance(value, (int, float)) or metric not in base:
+                continue
+            ratio = value / base[metric] if base[metric] else float('inf') if value else 1.0
+            rows.append((name, metric, base[metric], value, ratio, ratio > 1 + threshold))
+    if baseline.get('peak_rss_bytes') and current.get('peak_rss_bytes'):
+        ratio = current['peak_rss_bytes'] / baseline['peak_rss_bytes']
+        rows.append(('process', 'peak_rss_bytes', baseline['peak_rss_bytes'], current['peak_rss_bytes'],
+                     ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':<24}{'metric':<16}{'baseline':>14}{'current':>14}{'change':>9}"]
+    for name, metric, base, value, ratio, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f'{name:<24}{metric:<16}{base:>14.6g}{value:>14.6g}{(ratio - 1) * 100:>+8.1f}%{flag}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m keebgen.benchmark',
+                                     description='Times fixed keyboard workloads and tracks them over time.')
+    parser.add_argument('--history', default='benchmark_history.json', help='json file of past runs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and add them to the history')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run')
+    run_parser.add_argument('--config', default=str(_DEFAULT_CONFIG))
+    run_parser.add_argument('--save-baseline', metavar='FILE', help='also save this run as a baseline')
+    run_parser.add_argument('--quick', action='store_true',
+                            help='cut the slowest workloads down, e.g. render one column instead of the keyboard')
+
+    compare_parser = commands.add_parser('compare', help='compare the latest run against a baseline')
+    compare_parser.add_argument('baseline', help='file written by run --save-baseline')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='fractional increase that counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        config = configparser.ConfigParser()
+        if not config.read(args.config):
+            parser.error(f'could not read config "{args.config}"')
+        record = run_benchmarks(config, args.repeat, args.only, args.quick)
+        append_history(record, args.history)
+        if args.save_baseline:
+            Path(args.save_baseline).write_text(json.dumps(record, indent=1))
+        for name, result in record['results'].items():
+            extra = ''.join(f', {k} {v}' for k, v in result.items() if k not in ('min', 'median', 'repeat'))
+            print(f"{name:<24} min {result['min'] * 1000:9.2f}ms  median {result['median'] * 1000:9.2f}ms{extra}")
+        if record['peak_rss_bytes']:
+            print(f"peak rss {record['peak_rss_bytes'] / 2 ** 20:.1f} MiB")
+        return 0
+
+    history = load_history(args.history)
+    if not history:
+        parser.error(f'no runs in "{args.history}", use the run command first')
+    try:
+        rows = compare(json.loads(Path(args.baseline).read_text()), history[-1], args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    print(format_comparison(rows))
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -3,6 +3,7 @@ From https://stackoverflow.com/a/50381071/2061787
 """
 # import some extra stuff for downstream
 from abc import ABC, abstractmethod, ABCMeta as NativeABCMeta
+from inspect import getattr_static
 
 class DummyAttribute:
     pass
@@ -14,14 +15,22 @@ def abstractattribute(obj=None):
     return obj
 
 
+def _is_abstract(obj, name):
+    # getattr_static doesn't run properties, which may be expensive or not ready yet
+    return getattr(getattr_static(obj, name, None), '__is_abstract_attribute__', False)
+
+
 class BetterABCMeta(NativeABCMeta):
 
     def __call__(cls, *args, **kwargs):
         instance = NativeABCMeta.__call__(cls, *args, **kwargs)
+        # only the attributes that are abstract in the class can still be abstract in the instance
+        if '_abstract_attribute_names' not in cls.__dict__:
+            cls._abstract_attribute_names = frozenset(name for name in dir(cls) if _is_abstract(cls, name))
         abstract_attributes = {
             name
-            for name in dir(instance)
-            if getattr(getattr(instance, name), '__is_abstract_attribute__', False)
+            for name in cls._abstract_attribute_names
+            if _is_abstract(instance, name)
         }
         if abstract_attributes:
             raise NotImplementedError(
@@ -31,4 +40,4 @@ class BetterABCMeta(NativeABCMeta):
                     ', '.join(abstract_attributes)
                 )
             )
-        return instance
\ No newline at end of file
+        return instance
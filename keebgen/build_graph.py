@@ -0,0 +1,137 @@
+import hashlib
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, List
+
+from .config import Config
+
+# Describes a build as a graph of named steps, so a rebuild only recomputes the steps whose
+# inputs changed.
+# Each node has a fingerprint made from its own inputs, usually config values, and the fingerprints
+# of the nodes it depends on. A node whose fingerprint matches the previous build reuses the
+# previous value instead of running again.
+# Values are shared between builds, so node functions must not modify the values they are given.
+# Copy a Part before moving it.
+# Global settings that change what every node builds, like the resolution profile, are given to the
+# graph as a salt that is part of every fingerprint, so changing them rebuilds everything.
+
+
+def fingerprint(value) -> str:
+    """A repr of value that is the same for equal configs, regardless of type or ordering"""
+    if isinstance(value, Config):
+        return value.content_hash
+    if isinstance(value, Mapping):
+        # configparser sections, dicts
+        return '{' + ','.join(f'{k!r}:{fingerprint(value[k])}' for k in sorted(value)) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(fingerprint(v) for v in value) + ']'
+    return repr(value)
+
+
+class _Node:
+    def __init__(self, name, func, deps, inputs):
+        self.name = name
+        self.func = func
+        self.deps = deps
+        self.inputs = inputs
+
+
+class NodeReport:
+    """What happened to one node during a build"""
+    def __init__(self, name, rebuilt, seconds):
+        self.name = name
+        self.rebuilt = rebuilt
+        # time spent running the node, 0 if it was reused
+        self.seconds = seconds
+
+    def __repr__(self):
+        status = f'rebuilt in {self.seconds * 1000:.1f}ms' if self.rebuilt else 'reused'
+        return f"{self.__class__.__name__}: {self.name} {status}"
+
+
+class BuildResult:
+    """The value and fingerprint of every node in a build"""
+    def __init__(self, values, fingerprints, report: List[NodeReport]):
+        self.values = values
+        self.fingerprints = fingerprints
+        # one NodeReport per node, in build order
+        self.report = report
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    @property
+    def rebuilt(self):
+        return [node.name for node in self.report if node.rebuilt]
+
+    @property
+    def reused(self):
+        return [node.name for node in self.report if not node.rebuilt]
+
+    @property
+    def seconds(self):
+        return sum(node.seconds for node in self.report)
+
+    def summary(self):
+        """A table of each node, slowest first"""
+        lines = [f'{len(self.rebuilt)} of {len(self.report)} nodes rebuilt in {self.seconds:.3f}s']
+        for node in sorted(self.report, key=lambda n: -n.seconds):
+            status = f'{node.seconds * 1000:9.1f}ms' if node.rebuilt else '   reused'
+            lines.append(f'  {status}  {node.name}')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {len(self.rebuilt)} rebuilt, {len(self.reused)} reused"
+
+
+class BuildGraph:
+    """
+    Named build steps and their dependencies.
+    Nodes must be added after the nodes they depend on, so the graph can't have cycles and the
+    order they were added in is a valid build order.
+    """
+    def __init__(self, salt=None):
+        """
+        :param salt: anything else every node depends on, like global settings. Changing its fingerprint
+                     rebuilds every node
+        """
+        self._nodes: Dict[str, _Node] = {}
+        self._salt = fingerprint(salt)
+
+    def add(self, name, func: Callable, deps=(), inputs=None):
+        """
+        Adds a node that is built by calling func with the values of deps, in order.
+
+        :param deps: names of nodes that must be built first
+        :param inputs: anything else the result depends on, like config sections. Changing the
+                       fingerprint of inputs causes the node and everything that depends on it to rebuild
+        """
+        if name in self._nodes:
+            raise KeyError(f'Node "{name}" is already in this BuildGraph.')
+        for dep in deps:
+            if dep not in self._nodes:
+                raise KeyError(f'Node "{name}" depends on "{dep}", which has not been added.')
+        self._nodes[name] = _Node(name, func, tuple(deps), inputs)
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def build(self, previous: BuildResult = None) -> BuildResult:
+        """Builds every node, reusing the values from previous for nodes that haven't changed"""
+        values = {}
+        fingerprints = {}
+        report = []
+        for node in self._nodes.values():
+            digest = hashlib.sha1(f'{self._salt}:{node.name!r}:{fingerprint(node.inputs)}'.encode())
+            for dep in node.deps:
+                digest.update(fingerprints[dep].encode())
+            fingerprints[node.name] = digest.hexdigest()
+
+            if previous is not None and previous.fingerprints.get(node.name) == fingerprints[node.name]:
+                values[node.name] = previous.values[node.name]
+                report.append(NodeReport(node.name, False, 0.0))
+                continue
+            start = time.perf_counter()
+            values[node.name] = node.func(*(values[dep] for dep in node.deps))
+            report.append(NodeReport(node.name, True, time.perf_counter() - start))
+        return BuildResult(values, fingerprints, report)
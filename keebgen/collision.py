@@ -0,0 +1,270 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from .geometry_base import Part, Assembly, AnchorCollection
+from .key_assy import KeyAssy
+from . import geometry_utils as utils
+
+# Finds keycaps and sockets that intersect each other, without rendering.
+#
+#   for collision in find_collisions(keyboard, travel=4.0):
+#       print(collision)
+#
+# Each keycap and socket is approximated by the oriented box around its cuboid anchors, aligned to
+# the part's own left/right, front/back and top/bottom directions. The boxes are put into a bounding
+# volume hierarchy of their axis aligned bounds, and only pairs whose bounds overlap are given the
+# exact separating axis test. Keycaps taper towards the top, so pairs whose boxes intersect are
+# tested again against the convex hulls of their anchors, which is exact for the anchor geometry.
+# Keycaps can be swept down their switch travel, so keys that only hit each other while pressed
+# are found too.
+
+# distance a keycap moves down when pressed, for cherry mx style switches
+KEY_TRAVEL = 4.0
+
+# parts of a KeyAssy that are checked
+KEY_PARTS = ('keycap', 'socket')
+
+
+class OrientedBox:
+    """A box with its center, the unit vectors of its axes as rows, and its half size along each axis"""
+    def __init__(self, center, axes, half_extents):
+        self.center = np.asarray(center, dtype=float)
+        self.axes = np.asarray(axes, dtype=float)
+        self.half_extents = np.asarray(half_extents, dtype=float)
+
+    @staticmethod
+    def from_anchors(anchors: AnchorCollection) -> 'OrientedBox':
+        """
+        The smallest box around the points of a cuboid anchor collection, aligned to its faces.
+        The z axis points from the bottom face to the top face.
+        """
+        def direction(to_label, from_label):
+            return np.mean(anchors[to_label].array, axis=0) - np.mean(anchors[from_label].array, axis=0)
+
+        # orthonormal axes, keeping the top/bottom axis exact as it is the direction of travel
+        z = direction('top', 'bottom')
+        z /= np.linalg.norm(z)
+        x = direction('right', 'left')
+        x -= np.dot(x, z) * z
+        x /= np.linalg.norm(x)
+        axes = np.array((x, np.cross(z, x), z))
+
+        local = anchors.array @ axes.T
+        low, high = np.min(local, axis=0), np.max(local, axis=0)
+        return OrientedBox(((low + high) / 2) @ axes, axes, (high - low) / 2)
+
+    def swept(self, distance) -> 'OrientedBox':
+        """The box covering every position of this box moved up to distance down its own z axis"""
+        return OrientedBox(self.center - self.axes[2] * distance / 2, self.axes,
+                           self.half_extents + (0, 0, abs(distance) / 2))
+
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The (min, max) corners of the axis aligned box around this box"""
+        reach = np.abs(self.axes).T @ self.half_extents
+        return self.center - reach, self.center + reach
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}: center {self.center}, half extents {self.half_extents}'
+
+
+def box_penetration(a_centers, a_axes, a_half, b_centers, b_axes, b_half, clearance=0.0) -> np.ndarray:
+    """
+    Separating axis test between pairs of oriented boxes, given as stacked arrays of centers (N,3),
+    axes (N,3,3) and half extents (N,3).
+    Returns the penetration depth of each pair, the distance one box has to move to separate them,
+    or a negative number if they don't touch. With a clearance, boxes are treated as that much
+    bigger, so boxes closer than clearance have a positive depth.
+    """
+    # the 3 face axes of each box and the 9 edge cross products
+    cross = np.cross(a_axes[:, :, None, :], b_axes[:, None, :, :]).reshape((-1, 9, 3))
+    axes = np.concatenate((a_axes, b_axes, cross), axis=1)
+    lengths = np.linalg.norm(axes, axis=2)
+    # parallel edges don't give an axis, and their face axes are already tested
+    valid = lengths > 1e-9
+    axes = axes / np.where(valid, lengths, 1.0)[:, :, None]
+
+    # how far each box reaches along each axis
+    a_reach = np.abs(np.einsum('pkd,pjd->pkj', axes, a_axes)) @ a_half[:, :, None]
+    b_reach = np.abs(np.einsum('pkd,pjd->pkj', axes, b_axes)) @ b_half[:, :, None]
+    distance = np.abs(np.einsum('pkd,pd->pk', axes, b_centers - a_centers))
+    overlap = a_reach[:, :, 0] + b_reach[:, :, 0] + clearance - distance
+    return np.min(np.where(valid, overlap, np.inf), axis=1)
+
+
+class ConvexShape:
+    """The convex hull of some points, with its face normals and edge directions for separating axis tests"""
+    def __init__(self, points):
+        hull = utils.convex_hull(points)
+        if hull is None:
+            raise ValueError('a ConvexShape needs points that span 3 dimensions')
+        self.vertices, faces = hull
+        triangles = self.vertices[faces]
+        edges = np.concatenate([triangles[:, (i + 1) % 3] - triangles[:, i] for i in range(3)])
+        self.normals = _unit(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]))
+        self.edges = _unit(edges)
+
+    def penetration(self, other: 'ConvexShape', clearance=0.0) -> float:
+        """The distance one shape has to move to separate them, negative if they don't touch"""
+        cross = np.cross(self.edges[:, None], other.edges[None, :]).reshape((-1, 3))
+        cross = cross[np.linalg.norm(cross, axis=1) > 1e-9]
+        axes = np.concatenate((self.normals, other.normals, _unit(cross)))
+        a = self.vertices @ axes.T
+        b = other.vertices @ axes.T
+        overlap = np.minimum(a.max(axis=0), b.max(axis=0)) - np.maximum(a.min(axis=0), b.min(axis=0))
+        return float(np.min(overlap)) + clearance
+
+
+def _unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over axis aligned boxes, split at the median of the longest axis.
+    Node i has the bounds lower[i], upper[i]. Leaves have no children and own the boxes
+    items[start[i]:stop[i]].
+    """
+    def __init__(self, lower, upper, leaf_size=4):
+        self._box_lower = np.asarray(lower, dtype=float).reshape((-1, 3))
+        self._box_upper = np.asarray(upper, dtype=float).reshape((-1, 3))
+        self.leaf_size = leaf_size
+        self.items = np.arange(len(self._box_lower))
+        self.lower, self.upper, self.children, self.start, self.stop = [], [], [], [], []
+        if len(self.items):
+            self._build(0, len(self.items))
+        self.lower = np.array(self.lower).reshape((-1, 3))
+        self.upper = np.array(self.upper).reshape((-1, 3))
+
+    def _build(self, start, stop):
+        node = len(self.children)
+        items = self.items[start:stop]
+        lower = np.min(self._box_lower[items], axis=0)
+        upper = np.max(self._box_upper[items], axis=0)
+        self.lower.append(lower)
+        self.upper.append(upper)
+        self.start.append(start)
+        self.stop.append(stop)
+        self.children.append(None)
+        if stop - start <= self.leaf_size:
+            return node
+
+        centers = self._box_lower[items] + self._box_upper[items]
+        axis = np.argmax(upper - lower)
+        self.items[start:stop] = items[np.argsort(centers[:, axis], kind='stable')]
+        middle = (start + stop) // 2
+        self.children[node] = (self._build(start, middle), self._build(middle, stop))
+        return node
+
+    def _overlaps(self, a, b):
+        return np.all(self.lower[a] <= self.upper[b]) and np.all(self.lower[b] <= self.upper[a])
+
+    def overlapping_pairs(self) -> np.ndarray:
+        """(N,2) array of the indexes of every pair of boxes whose bounds overlap, each pair once with i < j"""
+        if not len(self.items):
+            return np.zeros((0, 2), dtype=int)
+        pairs = []
+        stack = [(0, 0)]
+        while stack:
+            a, b = stack.pop()
+            if a != b and not self._overlaps(a, b):
+                continue
+            if self.children[a] is None and self.children[b] is None:
+                pairs.append(self._leaf_pairs(a, b))
+            elif a == b:
+                left, right = self.children[a]
+                stack += [(left, left), (right, right), (left, right)]
+            else:
+                # open up the node that isn't a leaf, or the bigger one
+                if self.children[a] is None or (self.children[b] is not None and
+                                                 self.stop[b] - self.start[b] > self.stop[a] - self.start[a]):
+                    a, b = b, a
+                stack += [(child, b) for child in self.children[a]]
+        pairs = np.concatenate(pairs)
+        return np.sort(pairs, axis=1)
+
+    def _leaf_pairs(self, a, b):
+        items_a = self.items[self.start[a]:self.stop[a]]
+        items_b = self.items[self.start[b]:self.stop[b]]
+        i, j = (x.ravel() for x in np.meshgrid(items_a, items_b, indexing='ij'))
+        keep = (i < j) if a == b else np.ones(len(i), dtype=bool)
+        keep &= np.all(self._box_lower[i] <= self._box_upper[j], axis=1)
+        keep &= np.all(self._box_lower[j] <= self._box_upper[i], axis=1)
+        return np.stack((i[keep], j[keep]), axis=1)
+
+
+class Collision:
+    """Two parts of different keys that intersect"""
+    def __init__(self, path_a, part_a, path_b, part_b, depth):
+        # paths of the keys in the assembly, e.g. '2/r3' for key 'r3' of column 2
+        self.path_a = path_a
+        self.path_b = path_b
+        # which part of each key, one of KEY_PARTS
+        self.part_a = part_a
+        self.part_b = part_b
+        # how far the parts overlap
+        self.depth = depth
+
+    def __repr__(self):
+        return f'{self.path_a} {self.part_a} hits {self.path_b} {self.part_b} by {self.depth:.2f}mm'
+
+
+def find_keys(part: Part) -> List[Tuple[str, KeyAssy]]:
+    """Every KeyAssy in part with the path of part names or indexes leading to it, e.g. '2/r3'"""
+    if isinstance(part, KeyAssy):
+        return [('', part)]
+    if not isinstance(part, Assembly):
+        return []
+    return [('/'.join(map(str, path)), child) for path, child in part.walk() if isinstance(child, KeyAssy)]
+
+
+def find_collisions(assembly: Assembly, travel=0.0, clearance=0.0, parts=KEY_PARTS) -> List[Collision]:
+    """
+    Finds the parts of different keys in assembly that intersect, deepest first.
+
+    :param travel: how far keycaps are swept down their switch travel, e.g. KEY_TRAVEL
+    :param clearance: parts closer than this are reported too
+    :param parts: the parts of each key that are checked
+    """
+    boxes = []
+    points = []
+    owners = []
+    for path, key in find_keys(assembly):
+        for part_name in parts:
+            anchors = key.anchors_by_part(part_name)
+            box = OrientedBox.from_anchors(anchors)
+            part_points = anchors.array
+            if part_name == 'keycap' and travel:
+                box = box.swept(travel)
+                # the swept volume of a convex shape is the hull of its start and end
+                part_points = np.concatenate((part_points, part_points - box.axes[2] * travel))
+            boxes.append(box)
+            points.append(part_points)
+            owners.append((path, part_name))
+    if not boxes:
+        return []
+
+    lower, upper = np.array([box.bounds() for box in boxes]).transpose((1, 0, 2))
+    pairs = BVH(lower - clearance / 2, upper + clearance / 2).overlapping_pairs()
+    # parts of the same key are allowed to touch
+    pairs = pairs[[owners[i][0] != owners[j][0] for i, j in pairs]] if len(pairs) else pairs
+    if not len(pairs):
+        return []
+
+    centers = np.array([box.center for box in boxes])
+    axes = np.array([box.axes for box in boxes])
+    half = np.array([box.half_extents for box in boxes])
+    i, j = pairs[:, 0], pairs[:, 1]
+    hit = box_penetration(centers[i], axes[i], half[i], centers[j], axes[j], half[j], clearance) > 0
+
+    shapes = {}
+    collisions = []
+    for a, b in zip(i[hit], j[hit]):
+        for index in (a, b):
+            if index not in shapes:
+                shapes[index] = ConvexShape(points[index])
+        depth = shapes[a].penetration(shapes[b], clearance)
+        if depth > 0:
+            collisions.append(Collision(*owners[a], *owners[b], depth))
+    collisions.sort(key=lambda collision: -collision.depth)
+    return collisions
@@ -0,0 +1,317 @@
+import configparser
+import dataclasses
+import hashlib
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+# Typed configs for each part of a keyboard, loaded from the sections of a .ini file.
+#
+#   configs = load_ini('default_config.ini')
+#   column = configs.column.replace(radius=50.0)
+#
+# Configs are frozen and checked when they are made, so a bad value fails where it was set instead
+# of deep inside a build. replace() makes a copy with some options changed, which is much cheaper
+# than copying a ConfigParser. content_hash is the same for configs with the same values, and is
+# what caches and incremental builds key on.
+# Parts still take ConfigParser sections. They load them with <Config class>.load(), which passes
+# configs through unchanged.
+
+SWITCH_TYPES = ('cherry_mx',)
+KEYCAP_TYPES = ('oem',)
+WALL_MODES = ('hull', 'sweep')
+WEB_MODES = ('manual', 'auto')
+
+
+def _parse(value_type, value):
+    """value as value_type. Strings are parsed the way ConfigParser does"""
+    if get_origin(value_type) is Union:
+        # Optional[x]
+        if value is None or value == '':
+            return None
+        value_type = next(arg for arg in get_args(value_type) if arg is not type(None))
+    if get_origin(value_type) is tuple:
+        if isinstance(value, str):
+            value = [v for v in value.replace('(', '').replace(')', '').split(',') if v.strip()]
+        item_type = get_args(value_type)[0]
+        return tuple(_parse(item_type, v) for v in value)
+    if value_type is bool and isinstance(value, str):
+        if value.strip().lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+            raise ValueError(f'not a boolean: {value!r}')
+        return configparser.ConfigParser.BOOLEAN_STATES[value.strip().lower()]
+    if value_type is int and isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'not an integer: {value!r}')
+    return value_type(value.strip() if isinstance(value, str) else value)
+
+
+def _format(value) -> str:
+    """value the way it is written in a .ini file"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, tuple):
+        return ', '.join(_format(v) for v in value)
+    return str(value)
+
+
+@dataclass(frozen=True)
+class Config:
+    """Base class of all configs. Subclasses are frozen dataclasses and check their values in _check()"""
+    # name of the .ini section the config is read from
+    section = None
+
+    def __post_init__(self):
+        # parse the fields that were given as strings or other types
+        for name, value_type in get_type_hints(type(self)).items():
+            if name in self._fields():
+                try:
+                    object.__setattr__(self, name, _parse(value_type, getattr(self, name)))
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f'[{self.section}] {name}: {e}') from None
+        self._check()
+
+    def _check(self):
+        pass
+
+    def _require(self, condition, message):
+        if not condition:
+            raise ValueError(f'[{self.section}] {message}')
+
+    @classmethod
+    def _fields(cls):
+        return [f.name for f in dataclasses.fields(cls) if f.init]
+
+    @classmethod
+    def from_section(cls, section: Mapping):
+        """Config from a ConfigParser section or dict of options. Options that aren't set keep their defaults"""
+        unknown = set(section) - set(cls._fields())
+        if unknown:
+            raise ValueError(f'[{cls.section}] unknown options: {", ".join(sorted(unknown))}')
+        return cls(**{name: section[name] for name in section})
+
+    @classmethod
+    def load(cls, config):
+        """config if it already is one of cls, otherwise a config from a section, see from_section()"""
+        if isinstance(config, cls):
+            return config
+        return cls.from_section({} if config is None else config)
+
+    def replace(self, **options):
+        """A copy with options changed. Values can be strings, as in a .ini file"""
+        if not options:
+            return self
+        return dataclasses.replace(self, **options)
+
+    def to_dict(self):
+        """The options as strings, as they are written in a .ini file. Options that aren't set are left out"""
+        return {name: _format(getattr(self, name)) for name in self._fields() if getattr(self, name) is not None}
+
+    @cached_property
+    def content_hash(self) -> str:
+        """Hash of the config's type and values, the same for equal configs"""
+        values = ','.join(f'{name}={getattr(self, name)!r}' for name in self._fields())
+        return hashlib.sha1(f'{type(self).__name__}({values})'.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class SocketConfig(Config):
+    section = 'socket'
+    # flat space reserved around the switch for the keycap
+    overall_width: float = 18.0
+    overall_length: float = 18.0
+    # how tight the switch fits in the opening
+    switch_opening_width: float = 14.4
+    switch_opening_length: float = 14.4
+    plate_thickness: float = 4.0
+    hot_swap: bool = False
+    side_nubs: bool = True
+
+    def _check(self):
+        self._require(self.plate_thickness > 0, 'plate_thickness must be positive')
+        self._require(0 < self.switch_opening_width < self.overall_width,
+                      'switch_opening_width must be positive and less than overall_width')
+        self._require(0 < self.switch_opening_length < self.overall_length,
+                      'switch_opening_length must be positive and less than overall_length')
+
+
+@dataclass(frozen=True)
+class KeyConfig(Config):
+    section = 'key_assy'
+    switch_type: str = 'cherry_mx'
+    keycap_type: str = 'oem'
+
+    def _check(self):
+        self._require(self.switch_type in SWITCH_TYPES, f'switch_type must be one of {SWITCH_TYPES}')
+        self._require(self.keycap_type in KEYCAP_TYPES, f'keycap_type must be one of {KEYCAP_TYPES}')
+
+
+@dataclass(frozen=True)
+class ColumnConfig(Config):
+    section = 'column'
+    num_keys: int = 4
+    # 0 indexed, starting with the bottom-most key
+    home_index: int = 1
+    radius: float = 55.0
+    key_gap: float = 2.5
+    # individually lean each key by this angle (about Y axis)
+    key_side_lean: float = 0.0
+    # angle of the home row key (about X axis)
+    home_tiltback_angle: float = 25.0
+    show_finger_wireframe: bool = True
+    first_digit_len: float = 45.0
+
+    def _check(self):
+        self._require(self.num_keys > 0, 'num_keys must be positive')
+        self._require(0 <= self.home_index < self.num_keys, 'home_index must be one of the keys')
+        self._require(self.radius > 0, 'radius must be positive')
+        self._require(self.key_gap >= 0, 'key_gap can not be negative')
+
+
+@dataclass(frozen=True)
+class ThumbClusterConfig(Config):
+    section = 'thumb_cluster'
+    # xyz euler angles in degrees, then the offset in mm, that move the thumb cluster from the
+    # home key of its column into place
+    rotation: Tuple[float, ...] = (20.0, -30.0, 20.0)
+    offset: Tuple[float, ...] = (-5.0, -3.0, -7.0)
+
+    def _check(self):
+        self._require(len(self.rotation) == 3, 'rotation must be 3 angles')
+        self._require(len(self.offset) == 3, 'offset must be 3 values')
+
+
+@dataclass(frozen=True)
+class SkirtConfig(Config):
+    section = 'skirt'
+    wall_thickness: float = 2.0
+    flare_len: float = 4.0
+    flare_angle: float = 30.0
+    # see skirt.FlaredSkirt
+    wall_mode: str = 'hull'
+
+    def _check(self):
+        self._require(self.wall_thickness > 0, 'wall_thickness must be positive')
+        self._require(self.flare_len >= 0, 'flare_len can not be negative')
+        self._require(self.wall_mode in WALL_MODES, f'wall_mode must be one of {WALL_MODES}')
+
+
+@dataclass(frozen=True)
+class KeyboardConfig(Config):
+    section = 'keyboard'
+    # x distance between neighbouring columns
+    column_spacing: float = 19.0
+    # overrides the [skirt] wall_mode if set
+    skirt_wall_mode: Optional[str] = None
+    # see keyboard.DactylManuform
+    web_mode: str = 'manual'
+    web_max_gap: float = 16.0
+    web_thumb_gap: float = 24.0
+    # (column number, option, value) for options of single columns, set as column_<number>_<option>
+    column_overrides: Tuple[Tuple[int, str, str], ...] = ()
+
+    @classmethod
+    def _fields(cls):
+        return [name for name in super()._fields() if name != 'column_overrides']
+
+    def __post_init__(self):
+        object.__setattr__(self, 'column_overrides',
+                           tuple(sorted((int(col), str(option), str(value))
+                                        for col, option, value in self.column_overrides)))
+        super().__post_init__()
+
+    def _check(self):
+        self._require(self.skirt_wall_mode in WALL_MODES + (None,), f'skirt_wall_mode must be one of {WALL_MODES}')
+        self._require(self.web_mode in WEB_MODES, f'web_mode must be one of {WEB_MODES}')
+        self._require(self.web_max_gap > 0 and self.web_thumb_gap > 0, 'web gaps must be positive')
+
+    @classmethod
+    def from_section(cls, section: Mapping):
+        options = {}
+        overrides = []
+        for name in section:
+            col, _, option = name[len('column_'):].partition('_')
+            if name.startswith('column_') and col.isdigit() and option:
+                overrides.append((int(col), option, section[name]))
+            else:
+                options[name] = section[name]
+        return super().from_section(options).replace(column_overrides=tuple(overrides))
+
+    def to_dict(self):
+        options = super().to_dict()
+        options.update({f'column_{col}_{option}': value for col, option, value in self.column_overrides})
+        return options
+
+    def column_options(self, col_num) -> dict:
+        """The options set for one column"""
+        return {option: value for col, option, value in self.column_overrides if col == col_num}
+
+    @cached_property
+    def content_hash(self) -> str:
+        return hashlib.sha1((super().content_hash + repr(self.column_overrides)).encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class ResolutionProfile(Config):
+    """How finely curved surfaces are tessellated, see keebgen.resolution"""
+    section = 'resolution'
+    # OpenSCAD's $fn, $fa and $fs, set once at the top of .scad files. fn = 0 uses fa and fs
+    fn: int = 0
+    fa: float = 12.0
+    fs: float = 2.0
+    # segments of the primitives that set their own. 0 leaves them to fn, fa and fs
+    keycap_curve_segments: int = 100
+    side_nub_segments: int = 20
+    sphere_segments: int = 0
+    # keycaps are drawn as their outline, without the curved cut in the top
+    keycap_proxy: bool = False
+
+    def _check(self):
+        self._require(self.fn >= 0, 'fn can not be negative')
+        self._require(self.fa > 0 and self.fs > 0, 'fa and fs must be positive')
+        for name in ('keycap_curve_segments', 'side_nub_segments', 'sphere_segments'):
+            self._require(getattr(self, name) == 0 or getattr(self, name) >= 3, f'{name} must be 0 or at least 3')
+
+    def file_header(self) -> str:
+        """OpenSCAD code that sets fn, fa and fs for the whole file"""
+        return f'$fn = {self.fn};\n$fa = {self.fa};\n$fs = {self.fs};\n'
+
+
+@dataclass(frozen=True)
+class KeebConfig:
+    """The configs of every part of a keyboard"""
+    socket: SocketConfig = SocketConfig()
+    key: KeyConfig = KeyConfig()
+    column: ColumnConfig = ColumnConfig()
+    keyboard: KeyboardConfig = KeyboardConfig()
+    thumb_cluster: ThumbClusterConfig = ThumbClusterConfig()
+    skirt: SkirtConfig = SkirtConfig()
+
+    @cached_property
+    def content_hash(self) -> str:
+        hashes = ','.join(getattr(self, f.name).content_hash for f in dataclasses.fields(self))
+        return hashlib.sha1(hashes.encode()).hexdigest()
+
+
+def load_ini(config: Union[str, Path, configparser.ConfigParser]) -> KeebConfig:
+    """Configs from a .ini file, or a ConfigParser. Missing sections and options keep their defaults"""
+    if not isinstance(config, configparser.ConfigParser):
+        path = config
+        config = configparser.ConfigParser()
+        if not config.read(path):
+            raise FileNotFoundError(f'could not read config "{path}"')
+    configs = {}
+    for f in dataclasses.fields(KeebConfig):
+        config_type = get_type_hints(KeebConfig)[f.name]
+        if config.has_section(config_type.section):
+            configs[f.name] = config_type.from_section(config[config_type.section])
+    return KeebConfig(**configs)
+
+
+def to_parser(configs: KeebConfig) -> configparser.ConfigParser:
+    """A ConfigParser with a section for each config, to be written to a .ini file"""
+    config = configparser.ConfigParser()
+    for f in dataclasses.fields(configs):
+        part_config = getattr(configs, f.name)
+        config[part_config.section] = part_config.to_dict()
+    return config
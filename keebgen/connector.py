@@ -1,7 +1,9 @@
 import solid as sl
 from collections import Iterable
 
-from .geometry_base import Part, AnchorCollection
+from .geometry_base import Part, AnchorCollection, Recipe
+from . import geometry_utils as utils
+from . import resolution
 
 # if the passed object is a 3D point, return it as a list where the only element is that point
 # important for proper iteration
@@ -20,24 +22,44 @@ def _sanitize_points(maybe_point):
     return maybe_point
 
 # helper function to make tiny spheres around an iterable of points
+# spheres have the resolution profile's number of segments, see keebgen.resolution
 def _make_spheres(geo, diameter):
     geo = _sanitize_points(geo)
+    segments = resolution.get_profile().sphere_segments or None
     spheres = []
     for point in geo:
-        spheres.append(sl.translate(point.coords)(sl.sphere(d=diameter)))
+        spheres.append(sl.translate(point.coords.tolist())(sl.sphere(d=diameter, segments=segments)))
     return spheres
 
 
 #Connectors will create a part that is a convex hull around all points in *args
 class Connector(Part):
+    # when True, the convex hull is computed in python and emitted as a single polyhedron.
+    # Only applies to connectors with point sized spheres, and falls back to the hull of spheres
+    # when the points are collinear or coplanar
+    use_polyhedron = True
+    # spheres at or below this diameter are only there to mark points
+    _point_diameter = 0.001
+
     def __init__(self, anchors: AnchorCollection, diameter=0.001):
         super().__init__()
         assert len(anchors) > 0
         self._anchors = AnchorCollection.copy_from(anchors)
+        # the hull is only computed when the solid is first used. Its points are where the anchors are now
+        self._solid = Recipe(self._make_solid, self._anchors.copy(), diameter,
+                             self.use_polyhedron and diameter <= self._point_diameter)
+
+    @staticmethod
+    def _make_solid(anchors, diameter, use_polyhedron):
+        if use_polyhedron:
+            hull = utils.convex_hull(anchors.array)
+            if hull is not None:
+                vertices, faces = hull
+                return sl.polyhedron(vertices.tolist(), faces.tolist())
 
         # using hull around tiny spheres is a hack, but whatever. saves a ton of code
-        spheres = _make_spheres(self._anchors, diameter)
+        spheres = _make_spheres(anchors, diameter)
         # make sure we didn't end up with zero points
         # TODO we may want to adjust this functionality later and just return solid.part() for empty connectors
         assert len(spheres) > 0
-        self._solid = sl.hull()(*spheres)
+        return sl.hull()(*spheres)
@@ -2,7 +2,7 @@ from keebgen.better_abc import abstractmethod
 import numpy as np
 import solid as sl
 
-from .geometry_base import Assembly, PartCollection, LabeledPoint, AnchorCollection
+from .geometry_base import Assembly, PartCollection, LabeledPoint, AnchorCollection, Recipe
 from .connector import Connector
 
 class Finger(Assembly):
@@ -23,5 +23,10 @@ class Finger(Assembly):
 
         self._anchors = AnchorCollection(self.anchors_by_part("first_digit") + self.anchors_by_part("second_and_third_digits"))
 
+        # only shown in the preview. Wraps the connectors' recipes, so they are still built on first use
         for part in self._parts:
-            part.solid().set_modifier('%')
+            part._solid = Recipe(self._preview_only, part._solid_source)
+
+    @staticmethod
+    def _preview_only(solid):
+        return solid.set_modifier('%')
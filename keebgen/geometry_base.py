@@ -3,43 +3,208 @@ from keebgen.better_abc import BetterABCMeta, abstractmethod, abstractattribute
 import solid as sl
 import numpy as np
 import itertools
+import copy
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Sequence, Union, Set, Iterable
 
 from . import geometry_utils as utils
+from . import resolution
+
+# when True, keyboards and thumb clusters are built as a layout: parts that have anchors are placed,
+# but parts that only add to the solid, like connectors, finger wireframes and the skirt, are left out.
+# Set it with layout_only()
+_layout_only = False
+
+
+@contextmanager
+def layout_only(enabled=True):
+    """
+    Parts made within the block are built as a layout only, see _layout_only.
+    Much cheaper than a full build when only anchor positions are needed, like for metrics or collisions.
+    """
+    global _layout_only
+    previous = _layout_only
+    _layout_only = enabled
+    try:
+        yield
+    finally:
+        _layout_only = previous
+
+
+def is_layout_only() -> bool:
+    return _layout_only
+
+
+class Recipe:
+    """
+    Builds a solid the first time it is needed by calling build(*args), and keeps it.
+    Recipes in args are built first. Copies of a part share its recipe, so the solid is built once for all of them.
+    The solid is built again when the resolution profile changes, see keebgen.resolution.
+    """
+    __slots__ = ('_build', '_args', '_solid', '_profile')
+
+    def __init__(self, build, *args):
+        self._build = build
+        self._args = args
+        self._solid = None
+        self._profile = None
+
+    @property
+    def built(self) -> bool:
+        return self._solid is not None
+
+    def __call__(self) -> sl.OpenSCADObject:
+        profile = resolution.get_profile()
+        if self._solid is None or self._profile != profile:
+            self._solid = self._build(*(arg() if isinstance(arg, Recipe) else arg for arg in self._args))
+            self._profile = profile
+        return self._solid
+
 
 # base class for all solids
 class Part(metaclass=BetterABCMeta):
-    _solid: sl.OpenSCADObject = abstractattribute()
+    # the solid, or a Recipe that builds it the first time it is used. Set and read through _solid
+    _solid_source: Union[sl.OpenSCADObject, Recipe] = abstractattribute()
     _anchors: AnchorCollection = abstractattribute()
 
-    # child __init__() functions responsible for populating self._solid and self.anchors
+    # translations and rotations are accumulated into a single 4x4 matrix that is only
+    # applied to the solid as one multmatrix when solid() is called.
+    # set to False to wrap the solid in nested translate/rotate calls, which can be easier to debug
+    accumulate_transforms = True
+    # None is treated as the identity transform
+    _transform: np.ndarray = None
+    # counts changes to this part, see generation
+    _generation = 0
+    # the PartCollections this part was added to, which pass its changes on to their assemblies
+    _collections = ()
+
+    # child __init__() functions responsible for populating self._solid and self.anchors.
+    # Parts that set self._solid to a Recipe only build their solid when solid() is first called
     def solid(self):
-        return self._solid
+        return self._apply_transform(self._solid)
+
+    @property
+    def _solid(self) -> sl.OpenSCADObject:
+        if isinstance(self._solid_source, Recipe):
+            return self._solid_source()
+        return self._solid_source
+
+    @_solid.setter
+    def _solid(self, solid: Union[sl.OpenSCADObject, Recipe]):
+        self._solid_source = solid
 
     def translate(self, x=0, y=0, z=0):
-        self._solid = sl.translate([x,y,z])(self._solid)
+        if self.accumulate_transforms:
+            self._transform = utils.translation_matrix((x, y, z)) @ self.transform
+        else:
+            self._solid = sl.translate([x,y,z])(self._apply_transform(self._solid))
+            self._transform = None
         self._anchors.translate(x,y,z)
+        self._changed()
 
     def rotate(self, x=0, y=0, z=0, degrees=True):
         if degrees == False:
             x = utils.rad2deg(x)
             y = utils.rad2deg(y)
             z = utils.rad2deg(z)
-        self._solid = sl.rotate([x, y, z])(self._solid)
+        if self.accumulate_transforms:
+            self._transform = utils.rotation_matrix((x, y, z)) @ self.transform
+        else:
+            self._solid = sl.rotate([x, y, z])(self._apply_transform(self._solid))
+            self._transform = None
         self._anchors.rotate(x,y,z)
+        self._changed()
+
+    def multmatrix(self, matrix):
+        """Applies a 4x4 homogeneous transform, like a translate() or rotate() in one step"""
+        matrix = np.asarray(matrix, dtype=float)
+        if self.accumulate_transforms:
+            self._transform = matrix @ self.transform
+        else:
+            self._solid = sl.multmatrix(matrix.tolist())(self._apply_transform(self._solid))
+            self._transform = None
+        self._anchors.multmatrix(matrix)
+        self._changed()
+
+    @property
+    def generation(self) -> int:
+        """
+        Counts moves of this part with translate(), rotate() or multmatrix(), including moves of its parts
+        and parts added to it, so data cached from it, like Assembly.spatial_index(), can tell when it is out of date
+        """
+        return self._generation
+
+    def _changed(self):
+        self._generation += 1
+        for collection in self._collections:
+            collection._changed()
+
+    @property
+    def transform(self) -> np.ndarray:
+        """The accumulated 4x4 transform that has not yet been applied to the solid"""
+        if self._transform is None:
+            return np.eye(4)
+        return self._transform
+
+    def _apply_transform(self, solid):
+        if self._transform is None:
+            return solid
+        return sl.multmatrix(self._transform.tolist())(solid)
 
     @property
     def anchors(self):
         return self._anchors
 
-    def to_file(self, file_name):
-        sl.scad_render_to_file(self.solid(), file_name)
+    def copy(self):
+        """Returns a copy that shares the solid with this part, but has its own anchors and transform"""
+        new = copy.copy(self)
+        if self._anchors is not None:
+            new._anchors = self._anchors.copy()
+        # the copy isn't in any PartCollection yet
+        new._collections = ()
+        return new
+
+    def mesh(self, backend=None):
+        """
+        Builds a triangle mesh of the solid in python, without OpenSCAD.
+        See mesh_backend.MeshBackend, requires the manifold3d package for boolean operations.
+        """
+        from .mesh_backend import solid_to_mesh
+        return solid_to_mesh(self.solid(), backend)
+
+    def to_stl(self, file_name, backend=None):
+        """Writes a binary stl using the mesh backend, see mesh()"""
+        from .mesh_io import write_stl
+        write_stl(self.mesh(backend), file_name)
+
+    def to_off(self, file_name, backend=None):
+        """Writes an OFF file using the mesh backend, see mesh()"""
+        from .mesh_io import write_off
+        write_off(self.mesh(backend), file_name)
+
+    def to_file(self, file_name, use_modules=False):
+        """
+        Writes the solid to a .scad file, with the resolution profile's $fn, $fa and $fs at the top.
+        If use_modules is True, repeated subtrees are written once as OpenSCAD modules
+        and a ModuleReport is returned.
+        """
+        if use_modules:
+            from .scad_modules import scad_render_to_file_with_modules
+            return scad_render_to_file_with_modules(self.solid(), file_name)
+        sl.scad_render_to_file(self.solid(), file_name, file_header=resolution.file_header())
 
 
 class PartCollection:
     def __init__(self):
         self._part_list = []
         self._index_lookup = {}
+        # the assembly this is the _parts of, which changes when its parts do
+        self._owner = None
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner._changed()
 
     def add(self, part: Part, name=None):
         # if name provided, track index
@@ -48,6 +213,8 @@ class PartCollection:
                 raise KeyError(f'Name "{name}" is already in this PartCollection.')
             self._index_lookup[name] = len(self._part_list)
         self._part_list.append(part)
+        part._collections += (self,)
+        self._changed()
 
     def get(self, name) -> Union[Part, Assembly]:
         if name in self._index_lookup:
@@ -57,6 +224,15 @@ class PartCollection:
     def __getitem__(self, idx):
         return self._part_list[idx]
 
+    def copy(self):
+        """Returns a PartCollection of copies of each part, see Part.copy()"""
+        new = PartCollection()
+        new._part_list = [part.copy() for part in self._part_list]
+        new._index_lookup = dict(self._index_lookup)
+        for part in new._part_list:
+            part._collections = (new,)
+        return new
+
     def solid(self):
         solids = sl.part()
         for part in self._part_list:
@@ -84,16 +260,31 @@ class PartCollection:
         for part in self._part_list:
             part.rotate(x, y, z, degrees)
 
+    def multmatrix(self, matrix, name=None):
+        if name is not None:
+            self.get(name).multmatrix(matrix)
+            return
+        for part in self._part_list:
+            part.multmatrix(matrix)
+
 
 class Assembly(Part):
     _parts: PartCollection = abstractattribute()
     # This is purposefully left as None to bypass Part's abstractattribute.
     # It should be required, but this is an exception.
-    _solid = None
+    _solid_source = None
+    # built on first use by spatial_index()
+    _spatial_index = None
 
     def __init__(self):
         super().__init__()
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # changes to the parts are passed on to this assembly
+        if name == '_parts' and isinstance(value, PartCollection):
+            value._owner = self
+
     # child __init__() functions responsible for populating self._parts and self._anchors
     def solid(self):
         return self._parts.solid()
@@ -101,10 +292,37 @@ class Assembly(Part):
     def translate(self, x=0, y=0, z=0):
         self._anchors.translate(x, y, z)
         self._parts.translate(x, y, z)
+        self._changed()
 
     def rotate(self, x=0, y=0, z=0, degrees=True):
         self._anchors.rotate(x, y, z, degrees)
         self._parts.rotate(x, y, z, degrees)
+        self._changed()
+
+    def multmatrix(self, matrix):
+        self._anchors.multmatrix(matrix)
+        self._parts.multmatrix(matrix)
+        self._changed()
+
+    def copy(self):
+        new = super().copy()
+        new._parts = self._parts.copy()
+        new._spatial_index = None
+        return new
+
+    def to_stl(self, file_name, backend=None, per_part=False):
+        """
+        Writes a binary stl using the mesh backend.
+        If per_part is True, file_name is used as a directory and each part is written to its own
+        stl, named by its part name or index.
+        """
+        if not per_part:
+            return super().to_stl(file_name, backend)
+        directory = Path(file_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        names = {index: name for name, index in self._parts._index_lookup.items()}
+        for index, part in enumerate(self._parts):
+            part.to_stl(directory / f'{names.get(index, index)}.stl', backend)
 
     def anchors_by_part(self, part_name) -> AnchorCollection:
         """Returns the anchors of the requested part"""
@@ -116,13 +334,60 @@ class Assembly(Part):
     def get_part(self, part_name):
         return self._parts.get(part_name)
 
+    def walk(self, path=()):
+        """
+        Yields (path, part) for every part below this assembly, depth first, where path is a tuple
+        of the part names, or indexes of unnamed parts, leading to it
+        """
+        names = {index: name for name, index in self._parts._index_lookup.items()}
+        for index, part in enumerate(self._parts):
+            part_path = path + (names.get(index, index),)
+            yield part_path, part
+            if isinstance(part, Assembly):
+                yield from part.walk(part_path)
+
+    def spatial_index(self):
+        """
+        A KD-tree over the anchors of every part in this assembly, see spatial_index.SpatialIndex.
+        The index is kept, and rebuilt when this assembly's generation changed since it was built,
+        because parts were moved or added.
+        """
+        from .spatial_index import SpatialIndex
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self)
+        return self._spatial_index.refresh()
+
 
 class LabeledPoint:
-    """A 3D point with one or more labels"""
+    """
+    A 3D point with one or more labels.
+
+    Points that come from an AnchorCollection are lightweight views into the collection's
+    coordinate array, so modifying their coords modifies the collection.
+    """
+    __slots__ = ('_points', '_index', 'labels')
+
     def __init__(self, coords: Sequence[float], labels: Union[Sequence[str], Set[str]]):
         assert np.asarray(coords).size == 3
-        self.coords = list(coords)
-        self.labels = set(labels)
+        self._points = np.array(coords, dtype=float).reshape((1, 3))
+        self._index = 0
+        self.labels = frozenset(labels)
+
+    @classmethod
+    def _view(cls, points: np.ndarray, index: int, labels: frozenset) -> LabeledPoint:
+        point = cls.__new__(cls)
+        point._points = points
+        point._index = index
+        point.labels = labels
+        return point
+
+    @property
+    def coords(self) -> np.ndarray:
+        return self._points[self._index]
+
+    @coords.setter
+    def coords(self, coords: Sequence[float]):
+        self._points[self._index] = coords
 
     def translate(self, x=0, y=0, z=0):
         self.coords = utils.translate_point(self.coords, (x,y,z))
@@ -131,62 +396,163 @@ class LabeledPoint:
         self.coords = utils.rotate_point(self.coords, (x,y,z), degrees)
 
     def __repr__(self):
-        return f"{self.__class__.__name__}: coords: {self.coords}, labels: {self.labels}"
+        return f"{self.__class__.__name__}: coords: {self.coords.tolist()}, labels: {set(self.labels)}"
 
 
 class AnchorCollection:
-    """A container for LabeledPoints"""
+    """
+    A container for LabeledPoints.
+
+    Coordinates are stored in a contiguous (N,3) array with a parallel list of label sets, so
+    transforms are applied to all points at once. Labels are also interned as bitmasks so label
+    queries are a single vectorized mask. Collections returned by label queries are cached views
+    that share storage with the collection they came from.
+    """
     def __init__(self, points: Iterable[LabeledPoint]):
-        self.labeled_points = list(points)
+        if isinstance(points, AnchorCollection):
+            self._set_storage(points.array, points.labels)
+        else:
+            points = list(points)
+            self._set_storage([p.coords for p in points], [p.labels for p in points])
+
+    def _set_storage(self, coords, labels):
+        self._points = np.array(coords, dtype=float).reshape((-1, 3))
+        self._labels = [frozenset(x) for x in labels]
+        assert len(self._points) == len(self._labels)
+
+        # intern each label as one bit, so each point's labels become a single integer mask
+        self._label_bits = {}
+        for point_labels in self._labels:
+            for label in point_labels:
+                self._label_bits.setdefault(label, 1 << len(self._label_bits))
+        if len(self._label_bits) > 64:
+            raise ValueError(f'AnchorCollection supports at most 64 distinct labels, got {len(self._label_bits)}')
+        self._label_masks = np.array([sum(self._label_bits[x] for x in point_labels) for point_labels in self._labels],
+                                     dtype=np.uint64)
+
+        # None when this collection owns the whole array, otherwise the indexes it is a view of
+        self._index = None
+        self._query_cache = {}
+
+    def _view(self, index: np.ndarray) -> AnchorCollection:
+        """Returns a collection of the requested indexes that shares storage with this one"""
+        view = AnchorCollection.__new__(AnchorCollection)
+        view._points = self._points
+        view._labels = self._labels
+        view._label_bits = self._label_bits
+        view._label_masks = self._label_masks
+        view._index = index
+        view._query_cache = {}
+        return view
 
     @staticmethod
     def copy_from(other: AnchorCollection):
-        copies = [LabeledPoint(list(x.coords), x.labels) for x in other.labeled_points]
-        return AnchorCollection(copies)
+        return AnchorCollection(other)
+
+    def copy(self) -> AnchorCollection:
+        """Returns a copy of the same type with its own storage"""
+        new = self.__class__.__new__(self.__class__)
+        new._set_storage(self.array.copy(), self.labels)
+        return new
+
+    def _indexes(self) -> np.ndarray:
+        if self._index is None:
+            return np.arange(len(self._points))
+        return self._index
 
     def __getitem__(self, labels):
         """Gets points by one or more labels"""
         if isinstance(labels, str):
-            labels = {labels}
+            labels = frozenset((labels,))
+        else:
+            labels = frozenset(labels)
+
+        # queries only depend on labels, which never change, so results stay valid through transforms
+        if labels in self._query_cache:
+            return self._query_cache[labels]
+
+        if all(x in self._label_bits for x in labels):
+            query = np.uint64(sum(self._label_bits[x] for x in labels))
+            if self._index is None:
+                index = np.flatnonzero((self._label_masks & query) == query)
+            else:
+                index = self._index[(self._label_masks[self._index] & query) == query]
         else:
-            labels = set(labels)
+            # at least one label is not in this collection
+            index = np.array((), dtype=int)
 
-        points = [p for p in self.labeled_points if p.labels.issuperset(labels)]
-        return AnchorCollection(points)
+        result = self._view(index)
+        self._query_cache[labels] = result
+        return result
 
     def __iter__(self):
-        return iter(self.labeled_points)
+        for i in self._indexes():
+            yield LabeledPoint._view(self._points, i, self._labels[i])
 
     def __len__(self):
-        return len(self.labeled_points)
+        return len(self._indexes())
 
     def __add__(self, other):
-        return AnchorCollection(self.labeled_points + other.labeled_points)
+        # collections that share storage stay linked, otherwise the points are copied
+        if self._points is other._points:
+            return self._view(np.concatenate((self._indexes(), other._indexes())))
+        combined = AnchorCollection(())
+        combined._set_storage(np.concatenate((self.array, other.array)), self.labels + other.labels)
+        return combined
 
     def __radd__(self, other): # So `sum` can be used
         if other == 0:
-            return AnchorCollection(self.labeled_points)
-        return AnchorCollection(other.labeled_points + self.labeled_points)
+            return self._view(self._indexes())
+        return other.__add__(self)
+
+    @property
+    def labeled_points(self):
+        return list(self)
 
     @property
     def coords(self):
-        return [x.coords for x in self.labeled_points]
+        """Coordinates of each point. Each is a view, so modifying them modifies the collection"""
+        return [self._points[i] for i in self._indexes()]
+
+    @property
+    def array(self) -> np.ndarray:
+        """An (N,3) array of the coordinates. This is a copy for collections that are views"""
+        if self._index is None:
+            return self._points
+        return self._points[self._index]
+
+    @property
+    def labels(self):
+        return [self._labels[i] for i in self._indexes()]
 
     def bounds(self):
-        coords = np.array(self.coords)
-        return tuple(np.max(coords, axis=0) -
-                     np.min(coords, axis=0))
+        return tuple(utils.bounds(self.array))
 
     def centroid(self):
-        return tuple(np.mean(self.coords, axis=0))
+        return tuple(utils.mean_point(self.array))
 
     def translate(self, x=0, y=0, z=0):
-        for point in self.labeled_points:
-            point.translate(x,y,z)
+        if self._index is None:
+            self._points += (x, y, z)
+        else:
+            self._points[self._index] += (x, y, z)
 
     def rotate(self, x=0, y=0, z=0, degrees=True):
-        for point in self.labeled_points:
-            point.rotate(x,y,z,degrees)
+        if len(self) == 0:
+            return
+        if self._index is None:
+            self._points[:] = utils.rotate_points(self._points, (x,y,z), degrees)
+        else:
+            self._points[self._index] = utils.rotate_points(self._points[self._index], (x,y,z), degrees)
+
+    def multmatrix(self, matrix):
+        """Applies a 4x4 homogeneous transform to every point"""
+        if len(self) == 0:
+            return
+        if self._index is None:
+            self._points[:] = utils.transform_points(self._points, matrix)
+        else:
+            self._points[self._index] = utils.transform_points(self._points[self._index], matrix)
 
     def __repr__(self):
         return f"{self.__class__.__name__}: {self.labeled_points}"
@@ -202,7 +568,7 @@ class CuboidAnchorCollection(AnchorCollection):
         """
         assert len(corner_coords) == 8
         if isinstance(corner_coords, AnchorCollection):
-            corner_coords = [x.coords for x in corner_coords]
+            corner_coords = corner_coords.array
 
         # make sure each point is 3D
         for coord in corner_coords:
@@ -210,8 +576,7 @@ class CuboidAnchorCollection(AnchorCollection):
 
         corner_coords = self._sort_coords(corner_coords)
         labels = self._create_labels()
-        labeled_points = [LabeledPoint(c,l) for c,l in zip(corner_coords, labels)]
-        super().__init__(labeled_points)
+        self._set_storage(corner_coords, labels)
 
     @staticmethod
     def create(dims=(1,1,1), offset=(0,0,0)):
@@ -228,7 +593,7 @@ class CuboidAnchorCollection(AnchorCollection):
 
     @staticmethod
     def copy_from(other: AnchorCollection):
-        return CuboidAnchorCollection(other.coords.copy())
+        return CuboidAnchorCollection(other.array)
 
     @staticmethod
     def _sort_coords(coords) -> np.ndarray:
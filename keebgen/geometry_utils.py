@@ -1,5 +1,5 @@
+from functools import lru_cache
 from numpy import pi
-from scipy.spatial.transform import Rotation
 from numpy.linalg import norm
 import numpy as np
 
@@ -9,44 +9,121 @@ def deg2rad(degrees: float) -> float:
 def rad2deg(rad: float) -> float:
     return np.rad2deg(rad)
 
+# returns the 3x3 matrix for xyz euler angles in radians, same convention as OpenSCAD rotate()
+# the same few angles are used over and over, so recently used matrices are kept
+# returned matrices are shared, so they are read only
+@lru_cache(maxsize=1024)
+def _euler_matrix(x, y, z):
+    cx, sx = np.cos(x), np.sin(x)
+    cy, sy = np.cos(y), np.sin(y)
+    cz, sz = np.cos(z), np.sin(z)
+    # extrinsic x, then y, then z. Rz @ Ry @ Rx
+    m = np.array([[cy*cz, sx*sy*cz - cx*sz, cx*sy*cz + sx*sz],
+                  [cy*sz, sx*sy*sz + cx*cz, cx*sy*sz - sx*cz],
+                  [  -sy,            sx*cy,            cx*cy]])
+    m.flags.writeable = False
+    return m
+
+def euler_matrix(eulers, degrees=True) -> np.ndarray:
+    assert len(eulers) == 3
+    if degrees:
+        eulers = np.deg2rad(eulers)
+    return _euler_matrix(*(float(x) for x in eulers))
+
 # eulers are xyz euler angle in degrees
 # can rotate single point or N points
-# 3 vecotr, or 3xN vector of points
-def rotate_points(points, eulers, degrees=True):
-    r = Rotation.from_euler('xyz', eulers, degrees=degrees)
-    return r.apply(points)
+# 3 vector, or Nx3 array of points
+def rotate_points(points, eulers, degrees=True) -> np.ndarray:
+    return np.asarray(points, dtype=float) @ euler_matrix(eulers, degrees).T
 
 # for convenience to match translation syntax
-def rotate_point(point, eulers, degrees=True):
+def rotate_point(point, eulers, degrees=True) -> np.ndarray:
     return rotate_points(point, eulers, degrees)
 
-def translate_point(p, t):
+# can translate single point or N points
+def translate_points(points, t) -> np.ndarray:
     assert len(t) == 3
+    return np.asarray(points, dtype=float) + np.asarray(t, dtype=float)
+
+def translate_point(p, t) -> np.ndarray:
     assert len(p) == 3
-    return [p[0] + t[0],
-            p[1] + t[1],
-            p[2] + t[2]]
+    return translate_points(p, t)
+
+# 4x4 homogeneous transforms, used to accumulate Part transforms
+def translation_matrix(t):
+    assert len(t) == 3
+    m = np.eye(4)
+    m[:3, 3] = t
+    return m
+
+# eulers are xyz euler angle, same convention as rotate_points and OpenSCAD rotate()
+def rotation_matrix(eulers, degrees=True):
+    m = np.eye(4)
+    m[:3, :3] = euler_matrix(eulers, degrees)
+    return m
 
-def translate_points(points, t):
-    new_points = []
-    for point in points:
-        new_points.append(translate_point(point, t))
-    return new_points
+# applies a 4x4 homogeneous transform to a single point or N points
+def transform_points(points, matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=float)
+    assert matrix.shape == (4, 4)
+    return np.asarray(points, dtype=float) @ matrix[:3, :3].T + matrix[:3, 3]
 
 # return the mean of the individual x, y, and z values of points
-def mean_point(points):
-    # TODO this is inelegant but I was sure it would work. could use cleanup and a test
-    mean_point = [0, 0, 0]
-    for point in points:
-        assert len(point) == 3
-        mean_point[0] += point[0]
-        mean_point[1] += point[1]
-        mean_point[2] += point[2]
-
-    mean_point[0] = mean_point[0] / len(points)
-    mean_point[1] = mean_point[1] / len(points)
-    mean_point[2] = mean_point[2] / len(points)
-    return mean_point
+def mean_point(points) -> np.ndarray:
+    points = np.asarray(points, dtype=float)
+    assert points.ndim == 2 and points.shape[1] == 3
+    return np.mean(points, axis=0)
+
+# return the size of the axis aligned box around the points in x, y, and z
+def bounds(points) -> np.ndarray:
+    points = np.asarray(points, dtype=float)
+    assert points.ndim == 2 and points.shape[1] == 3
+    return np.max(points, axis=0) - np.min(points, axis=0)
+
+# returns (vertices, faces) of the 3D convex hull of points, or None if the points are degenerate
+# (fewer than 4 points, or all collinear or coplanar).
+# faces are triangles numbered clockwise when looking at the exterior, as OpenSCAD polyhedron() expects
+def convex_hull(points, tolerance=1e-9):
+    points = np.asarray(points, dtype=float).reshape((-1, 3))
+    if len(points) < 4:
+        return None
+    # the smallest singular value is ~0 if the points don't span 3 dimensions
+    centered = points - np.mean(points, axis=0)
+    singular_values = np.linalg.svd(centered, compute_uv=False)
+    if singular_values[2] <= tolerance * max(singular_values[0], 1.0):
+        return None
+
+    # scipy is only needed here, so it is not imported unless hulls are computed
+    from scipy.spatial import ConvexHull
+    hull = ConvexHull(points)
+
+    # only keep the points that are on the hull, and renumber the faces to match
+    vertices = hull.vertices
+    renumber = np.full(len(points), -1, dtype=int)
+    renumber[vertices] = np.arange(len(vertices))
+    faces = renumber[hull.simplices]
+
+    # flip any faces that are counter-clockwise when looking at the exterior
+    vertex_coords = points[vertices]
+    a, b, c = (vertex_coords[faces[:, i]] for i in range(3))
+    counter_clockwise = np.einsum('ij,ij->i', np.cross(b - a, c - a), hull.equations[:, :3]) > 0
+    faces[counter_clockwise] = faces[counter_clockwise][:, ::-1]
+    return vertex_coords, faces
+
+# returns the indexes of the points on the 2D convex hull of points, counter-clockwise,
+# or None if the points are degenerate (fewer than 3 points, or all collinear).
+# points exactly on a hull edge are not included
+def convex_hull_2D(points, tolerance=1e-9):
+    points = np.asarray(points, dtype=float).reshape((-1, 2))
+    if len(points) < 3:
+        return None
+    centered = points - np.mean(points, axis=0)
+    singular_values = np.linalg.svd(centered, compute_uv=False)
+    if singular_values[1] <= tolerance * max(singular_values[0], 1.0):
+        return None
+
+    from scipy.spatial import ConvexHull
+    return ConvexHull(points).vertices
 
 # return vector of length one pointing from 1->2
 def unit_vector(point1, point2):
@@ -1,10 +1,12 @@
 from keebgen.better_abc import abstractmethod
+from collections import OrderedDict
 import numpy as np
 
 from .geometry_base import Assembly, CuboidAnchorCollection, PartCollection
 from . import geometry_utils as utils
 from . import switch_socket
 from . import keycap
+from .config import KeyConfig, SocketConfig
 
 
 # different Key subclasses will exist depending on the desired alignment
@@ -18,22 +20,33 @@ class KeyAssy(Assembly):
     def __init__(self, config, socket_config, r, u=1):
         super().__init__()
         self._parts = PartCollection()
+        config = KeyConfig.load(config)
 
         # this will hold all parts of the key
-        if config.get('switch_type') == 'cherry_mx':
+        if config.switch_type == 'cherry_mx':
             self._parts.add(switch_socket.CherryMXSocket(socket_config, u), 'socket')
         else:
-            raise Exception('socket for switch type ' + config.get('switch_type') + ' not implemented')
+            raise Exception('socket for switch type ' + config.switch_type + ' not implemented')
 
-        if config.get('keycap_type') == 'oem':
+        if config.keycap_type == 'oem':
             self._parts.add(keycap.OEM(r, u), 'keycap')
         else:
-            raise Exception('keycap type ' + config.get('keycap_type') + ' not implemented')
+            raise Exception('keycap type ' + config.keycap_type + ' not implemented')
 
         # A new CuboidAnchorCollection is defined to set the anchor labels correctly
         self._anchors = CuboidAnchorCollection.copy_from(self.anchors_by_part('keycap')['top'] +
                                                          self.anchors_by_part('socket')['top'])
 
+    @classmethod
+    def cached(cls, config, socket_config, r, u=1, cache=None):
+        """
+        Returns a key from a prototype cache instead of building a new one.
+        The key shares its geometry with the prototype, but has its own anchors and transforms.
+        """
+        if cache is None:
+            cache = prototype_cache
+        return cache.get(cls, config, socket_config, r, u)
+
 
 # FaceAlignedKeys will have the faces forming a smooth curve on the keybaord regardless of switch and keycap type
 class FaceAlignedKey(KeyAssy):
@@ -78,3 +91,45 @@ class SocketAlignedKey(KeyAssy):
 
         # set the assembly corner anchors to top of the socket
         # no additional alignment required
+
+
+class KeyPrototypeCache:
+    def __init__(self, max_size=64):
+        """
+        Builds each distinct key once, and hands out copies of it.
+        The least recently used prototype is dropped once there are more than max_size.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._prototypes = OrderedDict()
+
+    @staticmethod
+    def _key(key_cls, config, socket_config, r, u):
+        # use the effective values, so equivalent configs share prototypes
+        return (key_cls, KeyConfig.load(config).content_hash, SocketConfig.load(socket_config).content_hash,
+                r, float(u))
+
+    def get(self, key_cls, config, socket_config, r, u=1) -> KeyAssy:
+        key = self._key(key_cls, config, socket_config, r, u)
+        if key in self._prototypes:
+            self.hits += 1
+            self._prototypes.move_to_end(key)
+        else:
+            self.misses += 1
+            self._prototypes[key] = key_cls(config, socket_config, r, u)
+            if len(self._prototypes) > self.max_size:
+                self._prototypes.popitem(last=False)
+        return self._prototypes[key].copy()
+
+    def clear(self):
+        self._prototypes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._prototypes)
+
+
+# default cache used by KeyAssy.cached()
+prototype_cache = KeyPrototypeCache()
@@ -2,11 +2,13 @@ from keebgen.better_abc import abstractmethod
 import numpy as np
 import solid as sl
 
-from .geometry_base import Assembly, PartCollection, CuboidAnchorCollection, LabeledPoint, AnchorCollection
+from .geometry_base import (Assembly, PartCollection, CuboidAnchorCollection, LabeledPoint, AnchorCollection,
+                            is_layout_only)
 from . import geometry_utils as utils
 from .key_assy import FaceAlignedKey
 from .connector import Connector
 from .finger import Finger
+from .config import ColumnConfig
 
 class KeyColumn(Assembly):
     @abstractmethod
@@ -17,74 +19,119 @@ class KeyColumn(Assembly):
     def get_key_names(self):
         return self._key_names
 
+    def keys(self):
+        """Returns a list of KeyAssys, in the order of get_key_names()"""
+        return [self.get_part(name) for name in self._key_names]
+
+
+def column_key_poses(num_keys, home_index, radius, key_gap=2.5, key_side_lean=0.0, home_tiltback_angle=0.0,
+                     front_y=None, back_y=None) -> np.ndarray:
+    """
+    Poses of the keys of a ConcaveOrtholinearColumn, in closed form.
+
+    Each key is leaned about the Y axis, then rotated about the X axis around a point radius above it,
+    so its top face is one key_gap from its neighbours, and the whole column is tilted back by
+    home_tiltback_angle. Both rotations about X share an axis direction, so they are one rotation
+    of home_tiltback_angle + the key's angle, followed by an offset.
+
+    radius, key_gap, key_side_lean and home_tiltback_angle, in degrees, are numbers, or arrays of the
+    same shape to solve a batch of columns in one call.
+    front_y and back_y are the y of the middle of the top front and back edge of each key before it is
+    placed, with a shape of (num_keys,), or the batch shape + (num_keys,). See key_edges().
+
+    :return: (num_keys, 4, 4) transforms that move each key into place, with the batch shape in front
+    """
+    radius, gap, lean, home = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in
+                                                    (radius, key_gap, key_side_lean, home_tiltback_angle)))
+    shape = radius.shape + (num_keys,)
+    front_y = np.broadcast_to(np.abs(np.asarray(front_y, dtype=float)), shape)
+    back_y = np.broadcast_to(np.abs(np.asarray(back_y, dtype=float)), shape)
+    radius, gap, lean, home = (value[..., None] for value in (radius, gap, lean, home))
+
+    # angle between neighbouring keys, that leaves one gap width between their top faces
+    one_offset = np.arctan(front_y/radius) + np.arctan(back_y/radius) + 2 * np.arctan(gap/(2*radius))
+    angle = one_offset * (np.arange(num_keys) - home_index)
+    tilt = angle + np.deg2rad(home)
+    lean = np.broadcast_to(np.deg2rad(lean), shape)
+
+    # Rx(home + angle) @ Ry(lean), same convention as utils.euler_matrix
+    cx, sx = np.cos(tilt), np.sin(tilt)
+    cy, sy = np.cos(lean), np.sin(lean)
+    zeros = np.zeros(shape)
+    poses = np.zeros(shape + (4, 4))
+    poses[..., :3, :3] = np.stack([np.stack([cy, zeros, sy], axis=-1),
+                                   np.stack([sx*sy, cx, -sx*cy], axis=-1),
+                                   np.stack([-cx*sy, sx, cx*cy], axis=-1)], axis=-2)
+
+    # rotating about a point radius above the key moves it by (0, r sin(angle), r (1 - cos(angle))),
+    # which is then tilted back with the rest of the column
+    offset_y = radius * np.sin(angle)
+    offset_z = radius * (1 - np.cos(angle))
+    home = np.deg2rad(home)
+    poses[..., 1, 3] = np.cos(home) * offset_y - np.sin(home) * offset_z
+    poses[..., 2, 3] = np.sin(home) * offset_y + np.cos(home) * offset_z
+    poses[..., 3, 3] = 1
+    return poses
+
+
+def key_edges(keys):
+    """(front_y, back_y) of the keys, the y of the middle of their top front and back edges, see column_key_poses()"""
+    front_y = [utils.mean_point(key.anchors['top', 'front'].array)[1] for key in keys]
+    back_y = [utils.mean_point(key.anchors['top', 'back'].array)[1] for key in keys]
+    return np.array(front_y), np.array(back_y)
+
 
 class ConcaveOrtholinearColumn(KeyColumn):
     def __init__(self, config, key_config, socket_config):
         super().__init__()
         self._parts = PartCollection()
 
-        radius = config.getfloat('radius')
-        gap = config.getfloat('key_gap')
-        num_keys = config.getint('num_keys')
-        home_index = config.getint('home_index')
-        key_lean = config.getfloat('key_side_lean')
-        home_angle = config.getfloat('home_tiltback_angle')
-        show_finger_wireframe = config.getboolean('show_finger_wireframe')
-        first_digit_len = config.getfloat('first_digit_len')
-
-        prev_anchors = None
+        config = ColumnConfig.load(config)
+        radius = config.radius
+        gap = config.key_gap
+        num_keys = config.num_keys
+        home_index = config.home_index
+        key_lean = config.key_side_lean
+        home_angle = config.home_tiltback_angle
+        show_finger_wireframe = config.show_finger_wireframe
+        first_digit_len = config.first_digit_len
+        # only the keys are placed in a layout, see geometry_base.layout_only()
+        layout_only = is_layout_only()
+
+        keys = []
         self._key_names = []
         for i in range(num_keys):
             r = 4-i + (home_index-1)
-            rotation_index = i - home_index
             if r <= 0:
                 r = 1
             if r > 4:
                 r = 4
-
+            keys.append(FaceAlignedKey.cached(key_config, socket_config, r))
             # for alignment across rows, name keys by index from the home row. negative is below home
-            key_name = rotation_index
-            self._key_names.append(key_name)
-
-            # add a key_assy to the parts
-            self._parts.add(FaceAlignedKey(key_config, socket_config, r), key_name)
-            self._parts.rotate(0, key_lean, 0, name=key_name)
-            self._parts.translate(0, 0, -radius, name=key_name)
-
-            # get y values from top face of the key
-            anchors = self.anchors_by_part(key_name)
-            center_top_front_anchor = utils.mean_point(anchors['top', 'front'].coords)
-            center_top_back_anchor = utils.mean_point(anchors['top', 'back'].coords)
-            y_front = center_top_front_anchor[1]
-            y_back = center_top_back_anchor[1]
+            self._key_names.append(i - home_index)
 
-            # find rotation angle to create one gap width between adjacent keys
-            one_offset = np.arctan(abs(y_front)/radius) + np.arctan(abs(y_back)/radius) + 2 * np.arctan(gap/(2*radius))
+        # every key is moved into place in one step
+        poses = column_key_poses(num_keys, home_index, radius, gap, key_lean, home_angle, *key_edges(keys))
 
-            rotation_angle = one_offset * -rotation_index
-            self._parts.rotate(-rotation_angle, 0, 0, degrees=False, name=key_name)
-            self._parts.translate(0, 0, radius, name=key_name)
+        prev_anchors = None
+        for key_name, key, pose in zip(self._key_names, keys, poses):
+            key.multmatrix(pose)
+            self._parts.add(key, key_name)
 
-            if show_finger_wireframe and rotation_index == 0:
+            if show_finger_wireframe and key_name == 0 and not layout_only:
                 finger_name = str(key_name) + "_finger"
-
-                self._parts.add(Finger(radius, first_digit_len, home_angle), finger_name)
-
-                #self._parts.get(finger_name)._solid += first_to_second_connector.solid()
-                # rotate the tip of the finger, then add the first to second knuckle connection
-                self._parts.rotate(-rotation_angle, 0, 0, degrees=False, name=finger_name)
-                self._parts.rotate(0, key_lean, 0, name=finger_name)
-                self._parts.translate(0, 0, radius, name=finger_name)
-
-
-            if prev_anchors is not None:
-                connector = Connector(prev_anchors + self.get_part(key_name).anchors_by_part('socket')['back'])
+                finger = Finger(radius, first_digit_len, home_angle)
+                finger.rotate(0, key_lean, 0)
+                finger.translate(0, 0, radius)
+                finger.rotate(home_angle, 0, 0)
+                self._parts.add(finger, finger_name)
+
+            if prev_anchors is not None and not layout_only:
+                connector = Connector(prev_anchors + key.anchors_by_part('socket')['back'])
                 self._parts.add(connector)
 
             # remember where to connect the next key
-            prev_anchors = self.get_part(key_name).anchors_by_part('socket')['front']
+            prev_anchors = key.anchors_by_part('socket')['front']
 
         first_anchors = self._parts[0].anchors_by_part('socket')
         self._anchors = CuboidAnchorCollection.copy_from(first_anchors['back'] + prev_anchors)
-
-        self.rotate(home_angle, 0, 0, degrees=True)
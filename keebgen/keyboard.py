@@ -1,13 +1,15 @@
+from __future__ import annotations
 from keebgen.better_abc import abstractmethod
-from .geometry_base import Assembly, PartCollection, AnchorCollection
-
-# TODO remove this when configs updated
-import configparser
-
+from .geometry_base import Part, Assembly, PartCollection, AnchorCollection, is_layout_only
+from .config import (KeebConfig, KeyboardConfig, ColumnConfig, KeyConfig, SocketConfig, ThumbClusterConfig,
+                     SkirtConfig, load_ini)
 from .key_column import ConcaveOrtholinearColumn
 from .connector import Connector
 from .thumb_cluster import ManuformThumbCluster
 from .skirt import FlaredSkirt
+from .build_graph import BuildGraph
+from .web import make_web
+from . import resolution
 
 class Keyboard(Assembly):
     @abstractmethod
@@ -17,271 +19,304 @@ class Keyboard(Assembly):
 
 
 class DactylManuform(Keyboard):
-    def __init__(self, config, col_config, key_config, socket_config):
+    # options of each column that differ from the column config, tuned by hand.
+    # x_offset, y_offset and z_offset move the column instead of being passed to it
+    column_tuning = (
+        # sub pointer
+        dict(key_side_lean=20, show_finger_wireframe=False, radius=56.4, first_digit_len=55.5,
+             x_offset=3.5, y_offset=0, z_offset=3),
+        # pointer
+        dict(radius=56.4, first_digit_len=55.5, x_offset=0, y_offset=0, z_offset=0),
+        # middle, with an extra row at the bottom
+        dict(num_keys=5, home_index=2, radius=65.0, first_digit_len=62,
+             x_offset=0, y_offset=11, z_offset=5),
+        # ring, with an extra row at the bottom
+        dict(num_keys=5, home_index=2, radius=64.0, first_digit_len=59,
+             x_offset=0, y_offset=3, z_offset=-2.5),
+        # pinky
+        dict(radius=48.9, first_digit_len=44, x_offset=0, y_offset=-19, z_offset=-6.5),
+        # post pinky
+        dict(key_side_lean=-20, show_finger_wireframe=False, radius=48.9, first_digit_len=44,
+             x_offset=-3.5, y_offset=-19, z_offset=-3.5),
+    )
+    num_cols = len(column_tuning)
+    _offset_options = ('x_offset', 'y_offset', 'z_offset')
+
+    def __init__(self, config, col_config, key_config, socket_config, previous: DactylManuform = None,
+                 thumb_config=None, skirt_config=None):
+        """
+        Each config is a config from keebgen.config, or a config section it is loaded from.
+        thumb_config and skirt_config keep their defaults if they aren't given.
+
+        The keyboard is built as a graph of steps, see build_graph.BuildGraph.
+        If previous is given, steps whose configs didn't change are reused from it instead of
+        being built again. self.build_result reports what was rebuilt and how long each step took.
+
+        Options of a single column can be overridden in the keyboard config as
+        column_<column number>_<option>, e.g. column_4_radius = 50.0, on top of column_tuning.
+        The column's position can be overridden the same way with x_offset, y_offset and z_offset,
+        where x_offset is added to the regular column spacing.
+
+        skirt_wall_mode in the keyboard config is the skirt's wall_mode, see skirt.FlaredSkirt.
+
+        web_mode = auto in the keyboard config builds the connectors between the columns and the
+        thumb cluster with web.make_web() instead of by hand. web_max_gap is the widest gap it bridges
+        between columns, and web_thumb_gap the widest gap to the thumb cluster.
+
+        A keyboard made within geometry_base.layout_only() only has its keys placed, without connectors
+        or the skirt.
+        """
         super().__init__()
+        self.layout_only = is_layout_only()
+        configs = KeebConfig(socket=SocketConfig.load(socket_config), key=KeyConfig.load(key_config),
+                             column=ColumnConfig.load(col_config), keyboard=KeyboardConfig.load(config),
+                             thumb_cluster=ThumbClusterConfig.load(thumb_config), skirt=SkirtConfig.load(skirt_config))
+        graph = self._build_graph(configs)
+        self.build_result = graph.build(previous.build_result if previous is not None else None)
+        built = self.build_result
+
+        # values in the build result are shared with later builds, so the keyboard is assembled
+        # from copies before being moved into place
+        for col_num in range(self.num_cols):
+            self._parts.add(built[f'column_{col_num}'].copy(), col_num)
+            for connector in built.values.get(f'connectors_{col_num}', []):
+                self._parts.add(connector.copy())
+        self._parts.add(built['thumb_cluster'].copy())
+        for connector in built.values.get('thumb_connectors', []) + built.values.get('web', []):
+            self._parts.add(connector.copy())
 
-        # TODO add config parsing. this is terrible right now
-        # there should ideally be a different column config for each row, but this will do for proof of concept
-        # all of these numbers should come from the config file or default config
-        # TODO will want different spacing for end cols if they are tilted
-        num_cols = 6
-
-        index_radius = 56.4
-        index_first_digit_len = 55.5
-
-        middle_radius = 65.0
-        middle_first_digit_len = 62
-
-        ring_radius = 64.0
-        ring_first_digit_len = 59
-
-        pinky_radius = 48.9
-        pinky_first_digit_len = 44
-
-        section_name = 'column'
-        col_configs = []
-        for col in range(num_cols):
-            new_conf = configparser.ConfigParser()
-            new_conf.add_section(section_name)
-            for key in col_config:
-                new_conf.set(section_name, key, col_config.get(key))
-            # add extra row a t bottom for middle and ring fingers
-
-            if col == 2 or col == 3:
-                new_conf.set(section_name, 'num_keys', str(5))
-                new_conf.set(section_name, 'home_index', str(2))
-
-            # set side lean
-            if col == 0:
-                new_conf.set(section_name, 'key_side_lean', str(20))
-                new_conf.set(section_name, 'show_finger_wireframe', 'false')
-            elif col == num_cols-1:
-                new_conf.set(section_name, 'key_side_lean', str(-20))
-                new_conf.set(section_name, 'show_finger_wireframe', 'false')
-
-            # set radius by finger
-            if col <= 1:
-                new_conf.set(section_name, 'radius', str(index_radius))
-                new_conf.set(section_name, 'first_digit_len', str(index_first_digit_len))
-            elif col == 2:
-                new_conf.set(section_name, 'radius', str(middle_radius))
-                new_conf.set(section_name, 'first_digit_len', str(middle_first_digit_len))
-            elif col == 3:
-                new_conf.set(section_name, 'radius', str(ring_radius))
-                new_conf.set(section_name, 'first_digit_len', str(ring_first_digit_len))
-            else:
-                new_conf.set(section_name, 'radius', str(pinky_radius))
-                new_conf.set(section_name, 'first_digit_len', str(pinky_first_digit_len))
-
-            col_configs.append(new_conf[section_name])
-
-        col_x_spacing = 19.0 #mm
-
-        sub_pointer_y_off = 0
-        pointer_y_off = 0
-        middle_y_off = 11
-        ring_y_off = 3
-        pinky_y_off = -19
-        post_pinky_y_off = pinky_y_off
-
-        sub_pointer_z_off = 3
-        pointer_z_off = 0
-        middle_z_off = 5
-        ring_z_off = -2.5
-        pinky_z_off = -6.5
-        post_pinky_z_off = pinky_z_off + 3
-
-        prev_name = None
-        for col_num, col_config in enumerate(col_configs):
-            name = col_num
-            self._parts.add(ConcaveOrtholinearColumn(col_config, key_config, socket_config), name)
-
-            #TODO this should be part of the config
-            col_fudge = 0
-            if col_num < 1:
-                col_fudge = 3.5
-                y_off = sub_pointer_y_off
-                z_off = sub_pointer_z_off
-            elif col_num == 1:
-                y_off = pointer_y_off
-                z_off = pointer_z_off
-            elif col_num == 2:
-                y_off = middle_y_off
-                z_off = middle_z_off
-            elif col_num == 3:
-                y_off = ring_y_off
-                z_off = ring_z_off
-            elif col_num == 4:
-                y_off = pinky_y_off
-                z_off = pinky_z_off
-            else:
-                col_fudge = -3.5
-                y_off = post_pinky_y_off
-                z_off = post_pinky_z_off
-
-            # all column positioning must happen before the connectors are made
-            shift = col_num - 1
-            self._parts.translate(col_x_spacing*shift+col_fudge, y_off, z_off, name=name)
-
-            if prev_name is not None:
-                # add connectors between previous col and this col
-                # must check if row in this col existed in prev cal and vv.
-                prev_col = self.get_part(prev_name)
-                cur_col = self.get_part(name)
-
-                #TODO make this prettier
-                prev_col_prev_anchors = None
-                cur_col_prev_anchors = None
-                for row in range(-6, 6):
-                    try:
-                        prev_col_key = prev_col.get_part(row)
-                        prev_col_anchors = prev_col_key.anchors_by_part('socket')
-                    except:
-                        prev_col_key = prev_col_anchors = None
-
-                    try:
-                        cur_col_key = cur_col.get_part(row)
-                        cur_col_anchors = cur_col_key.anchors_by_part('socket')
-                    except:
-                        cur_col_key = cur_col_anchors = None
-
-                    # TODO this is really annoying
-                    # naming is bad too, "connect connectors"
-
-                    # normal case, both connectors exist
-                    # connect adjacent socket edges
-                    if prev_col_anchors and cur_col_anchors:
-                        self._parts.add(Connector(prev_col_anchors['right'] +
-                                                  cur_col_anchors['left']))
-                        # self._parts.add(Connector(prev_col_anchors['bottom']))
-
-
-                    # cur and prev rows exist for both cols
-                    # connect the connectors that are between the cur and prev rows for each col
-                    if prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
-                        self._parts.add(Connector(prev_col_anchors['right', 'back'] +
-                                                  prev_col_prev_anchors['right', 'front'] +
-                                                  cur_col_anchors['left', 'back'] +
-                                                  cur_col_prev_anchors['left', 'front']))
-
-
-                    # these four conditionals handle the end conditions when one col is shorter than the other
-
-                    # prev_col one longer on bottom
-                    if prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and not cur_col_prev_anchors:
-                        self._parts.add(Connector(prev_col_anchors['right', 'back'] +
-                                                 prev_col_prev_anchors['right'] +
-                                                 cur_col_anchors['left', 'back']))
-
-                    # cur_col one longer on bottom
-                    if prev_col_anchors and not prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
-                        self._parts.add(Connector(prev_col_anchors['right', 'bottom'] +
-                                                 cur_col_anchors['left', 'bottom'] +
-                                                 cur_col_prev_anchors['left']))
-
-                    # prev_col one longer on top
-                    if prev_col_anchors and prev_col_prev_anchors and not cur_col_anchors and cur_col_prev_anchors:
-                        self._parts.add(Connector(prev_col_anchors['right'] +
-                                                 prev_col_prev_anchors['right', 'front'] +
-                                                 cur_col_prev_anchors['left', 'front']))
-
-                    # cur_col one longer on top
-                    if not prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
-                        self._parts.add(Connector(prev_col_prev_anchors['right', 'front'] +
-                                                 cur_col_anchors['left'] +
-                                                 cur_col_prev_anchors['left', 'front']))
-
-                    prev_col_prev_anchors = prev_col_anchors
-                    cur_col_prev_anchors = cur_col_anchors
-
-            prev_name = name
+        # TODO translation should happen based on the config, or based on the minimum Z height of all parts
+        # to make sure all parts of the keyboard stay above the xy plane
+        self._place(self._parts)
+        # the skirt is made from edges that were already moved into place
+        if 'skirt' in built.values:
+            self._parts.add(built['skirt'].copy(), 'skirt')
 
+        #TODO add anchors that make sense
+        self._anchors = None
+
+    @staticmethod
+    def _place(part):
+        """Moves a part, or all parts in a PartCollection, from the layout into its final position"""
+        part.translate(0,0,60)
+        part.rotate(0,20,0,degrees=True)
+
+    @classmethod
+    def from_config(cls, config, previous: DactylManuform = None) -> DactylManuform:
+        """Keyboard from a KeebConfig, a ConfigParser or the path of a .ini file"""
+        if not isinstance(config, KeebConfig):
+            config = load_ini(config)
+        return cls(config.keyboard, config.column, config.key, config.socket, previous,
+                   config.thumb_cluster, config.skirt)
+
+    def _build_graph(self, configs: KeebConfig) -> BuildGraph:
+        """
+        Configs feed the columns, columns feed the connectors between them, the thumb
+        cluster and the skirt edges, and the edges feed the skirt.
+        A layout only has the columns and the thumb cluster, which are built without their connectors.
+        """
+        keyboard, key, socket = configs.keyboard, configs.key, configs.socket
+        # global settings that change how parts are built, nodes built with other settings aren't reused
+        graph = BuildGraph(salt=(Connector.use_polyhedron, Part.accumulate_transforms, resolution.get_profile()))
+        columns = [f'column_{col_num}' for col_num in range(self.num_cols)]
+        auto_web = keyboard.web_mode == 'auto'
+        layout = self.layout_only
+        for col_num, name in enumerate(columns):
+            options = dict(self.column_tuning[col_num], **keyboard.column_options(col_num))
+            offsets = {option: float(options.pop(option)) for option in self._offset_options if option in options}
+            column = configs.column.replace(**options)
+            graph.add(name, lambda col_num=col_num, column=column, offsets=offsets:
+                          self._make_column(col_num, column, offsets, keyboard.column_spacing, key, socket),
+                      inputs=(col_num, column, offsets, keyboard.column_spacing, key, socket, layout))
+            if col_num > 0 and not auto_web and not layout:
+                graph.add(f'connectors_{col_num}', self._make_column_connectors,
+                          deps=(columns[col_num-1], name))
+        graph.add('thumb_cluster', lambda col: self._make_thumb_cluster(col, configs.thumb_cluster, key, socket),
+                  deps=(columns[1],), inputs=(configs.thumb_cluster, key, socket, layout))
+        if layout:
+            return graph
+        if auto_web:
+            max_gaps = [keyboard.web_max_gap] * self.num_cols + [keyboard.web_thumb_gap]
+            graph.add('web', lambda thumb_cluster, *cols:
+                          make_web([col.keys() for col in cols] + [thumb_cluster.key_grid.keys()], max_gaps),
+                      deps=['thumb_cluster'] + columns, inputs=max_gaps)
+        else:
+            graph.add('thumb_connectors', self._make_thumb_connectors, deps=['thumb_cluster'] + columns[:4])
+        graph.add('edge_pairs', self._make_edge_pairs, deps=['thumb_cluster'] + columns)
+
+        skirt = configs.skirt
+        if keyboard.skirt_wall_mode is not None:
+            skirt = skirt.replace(wall_mode=keyboard.skirt_wall_mode)
+        graph.add('skirt', lambda edge_pairs: FlaredSkirt(edge_pairs, skirt), deps=('edge_pairs',), inputs=skirt)
+        return graph
+
+    @staticmethod
+    def _make_column(col_num, column_config, offsets, spacing, key_config, socket_config):
+        column = ConcaveOrtholinearColumn(column_config, key_config, socket_config)
+        # all column positioning must happen before the connectors are made
+        column.translate(spacing * (col_num - 1) + offsets.get('x_offset', 0.0),
+                         offsets.get('y_offset', 0.0), offsets.get('z_offset', 0.0))
+        return column
+
+    @staticmethod
+    def _make_column_connectors(prev_col, cur_col):
+        """Connectors between the sockets of two adjacent columns"""
+        # must check if row in this col existed in prev cal and vv.
+        connectors = []
+
+        #TODO make this prettier
+        prev_col_prev_anchors = None
+        cur_col_prev_anchors = None
+        for row in range(-6, 6):
+            try:
+                prev_col_key = prev_col.get_part(row)
+                prev_col_anchors = prev_col_key.anchors_by_part('socket')
+            except:
+                prev_col_key = prev_col_anchors = None
+
+            try:
+                cur_col_key = cur_col.get_part(row)
+                cur_col_anchors = cur_col_key.anchors_by_part('socket')
+            except:
+                cur_col_key = cur_col_anchors = None
+
+            # TODO this is really annoying
+            # naming is bad too, "connect connectors"
+
+            # normal case, both connectors exist
+            # connect adjacent socket edges
+            if prev_col_anchors and cur_col_anchors:
+                connectors.append(Connector(prev_col_anchors['right'] +
+                                            cur_col_anchors['left']))
+                # connectors.append(Connector(prev_col_anchors['bottom']))
+
+
+            # cur and prev rows exist for both cols
+            # connect the connectors that are between the cur and prev rows for each col
+            if prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
+                connectors.append(Connector(prev_col_anchors['right', 'back'] +
+                                            prev_col_prev_anchors['right', 'front'] +
+                                            cur_col_anchors['left', 'back'] +
+                                            cur_col_prev_anchors['left', 'front']))
+
+
+            # these four conditionals handle the end conditions when one col is shorter than the other
+
+            # prev_col one longer on bottom
+            if prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and not cur_col_prev_anchors:
+                connectors.append(Connector(prev_col_anchors['right', 'back'] +
+                                           prev_col_prev_anchors['right'] +
+                                           cur_col_anchors['left', 'back']))
+
+            # cur_col one longer on bottom
+            if prev_col_anchors and not prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
+                connectors.append(Connector(prev_col_anchors['right', 'bottom'] +
+                                           cur_col_anchors['left', 'bottom'] +
+                                           cur_col_prev_anchors['left']))
+
+            # prev_col one longer on top
+            if prev_col_anchors and prev_col_prev_anchors and not cur_col_anchors and cur_col_prev_anchors:
+                connectors.append(Connector(prev_col_anchors['right'] +
+                                           prev_col_prev_anchors['right', 'front'] +
+                                           cur_col_prev_anchors['left', 'front']))
+
+            # cur_col one longer on top
+            if not prev_col_anchors and prev_col_prev_anchors and cur_col_anchors and cur_col_prev_anchors:
+                connectors.append(Connector(prev_col_prev_anchors['right', 'front'] +
+                                           cur_col_anchors['left'] +
+                                           cur_col_prev_anchors['left', 'front']))
+
+            prev_col_prev_anchors = prev_col_anchors
+            cur_col_prev_anchors = cur_col_anchors
+        return connectors
+
+    @staticmethod
+    def _make_thumb_cluster(col, thumb_config, key_config, socket_config):
         thumbcluster = ManuformThumbCluster(key_config, socket_config)
         # offset based on home key position
         tc_home_key = thumbcluster.home_key
-        col = self._parts.get(1)
 
         # TODO: improve column and row naming so this is readable.
 
         # hand tuned alignment
-        thumbcluster.rotate(20, -30, 20, degrees=True)
-        thumbcluster.translate(-5,-3,-7)
+        thumbcluster.rotate(*thumb_config.rotation, degrees=True)
+        thumbcluster.translate(*thumb_config.offset)
 
         anchor_pos = list(col.get_part(-1).anchors.centroid())
         anchor_pos[1] -= tc_home_key.anchors.bounds()[1]  # shift alone y axis
         tc_offset = [x for x in anchor_pos]
         thumbcluster.translate(*tc_offset)
+        return thumbcluster
 
-        self._parts.add(thumbcluster)
-
-        # add connectors between the thumb cluster and the keyboard
+    @staticmethod
+    def _make_thumb_connectors(thumbcluster, col0, col1, col2, col3):
+        """Connectors between the thumb cluster and the keyboard"""
         thumb_key1 = thumbcluster.key_grid.grid[0][1].get_part('socket')
         thumb_key2 = thumbcluster.key_grid.grid[0][2].get_part('socket')
         thumb_key3 = thumbcluster.key_grid.grid[0][3].get_part('socket')
 
-        bottom_left_key0 = self._parts.get(0).get_part(-1).get_part('socket')
-        bottom_left_key1 = self._parts.get(1).get_part(-1).get_part('socket')
-        bottom_left_key2 = self._parts.get(2).get_part(-2).get_part('socket')
-        bottom_left_key3 = self._parts.get(3).get_part(-2).get_part('socket')
-
-        self._parts.add(Connector(thumb_key1.anchors['left'] +
-                                  bottom_left_key0.anchors['left','front']))
+        bottom_left_key0 = col0.get_part(-1).get_part('socket')
+        bottom_left_key1 = col1.get_part(-1).get_part('socket')
+        bottom_left_key2 = col2.get_part(-2).get_part('socket')
+        bottom_left_key3 = col3.get_part(-2).get_part('socket')
 
-        self._parts.add(Connector(thumb_key1.anchors['left','front'] +
-                                  thumb_key2.anchors['left','back'] +
-                                  bottom_left_key0.anchors['left']))
+        return [Connector(thumb_key1.anchors['left'] +
+                          bottom_left_key0.anchors['left','front']),
 
-        self._parts.add(Connector(thumb_key2.anchors['left'] +
-                                  bottom_left_key0.anchors['back']))
+                Connector(thumb_key1.anchors['left','front'] +
+                          thumb_key2.anchors['left','back'] +
+                          bottom_left_key0.anchors['left']),
 
-        self._parts.add(Connector(thumb_key3.anchors['left'] +
-                                  bottom_left_key1.anchors['back']))
+                Connector(thumb_key2.anchors['left'] +
+                          bottom_left_key0.anchors['back']),
 
-        self._parts.add(Connector(thumb_key2.anchors['left','front'] +
-                                  thumb_key3.anchors['left','back'] +
-                                  bottom_left_key0.anchors['back','right'] +
-                                  bottom_left_key1.anchors['back','left']))
+                Connector(thumb_key3.anchors['left'] +
+                          bottom_left_key1.anchors['back']),
 
-        self._parts.add(Connector(thumb_key3.anchors['left','front'] +
-                                  bottom_left_key2.anchors['back','left'] +
-                                  bottom_left_key1.anchors['back','right']))
+                Connector(thumb_key2.anchors['left','front'] +
+                          thumb_key3.anchors['left','back'] +
+                          bottom_left_key0.anchors['back','right'] +
+                          bottom_left_key1.anchors['back','left']),
 
-        self._parts.add(Connector(thumb_key3.anchors['left','front'] +
-                                  bottom_left_key2.anchors['back'] +
-                                  bottom_left_key3.anchors['back','left']))
+                Connector(thumb_key3.anchors['left','front'] +
+                          bottom_left_key2.anchors['back','left'] +
+                          bottom_left_key1.anchors['back','right']),
 
-        self._parts.add(Connector(thumb_key3.anchors['front'] +
-                                  bottom_left_key3.anchors['back','left']))
+                Connector(thumb_key3.anchors['left','front'] +
+                          bottom_left_key2.anchors['back'] +
+                          bottom_left_key3.anchors['back','left']),
 
+                Connector(thumb_key3.anchors['front'] +
+                          bottom_left_key3.anchors['back','left'])]
 
-
-        # load the skirt
+    def _make_edge_pairs(self, thumbcluster, *cols):
+        """Pairs of socket edges that the skirt is built along, moved into their final position"""
         edge_pairs = []
+        last_col = len(cols) - 1
 
         # left side
-        for (num, socket_name) in enumerate(self.get_part(0).get_key_names()):
-            anchors = self.get_part(0).get_part(socket_name).anchors_by_part('socket')
+        for (num, socket_name) in enumerate(cols[0].get_key_names()):
+            anchors = cols[0].get_part(socket_name).anchors_by_part('socket')
             if num != 0:
                 edge_pairs.append((anchors['top','back'], anchors['left','back']))
             edge_pairs.append((anchors['top','front'], anchors['left','front']))
 
         # top
-        for col_name in range(len(col_configs)):
-            col = self.get_part(col_name)
+        for col in cols:
             top_socket_name = col.get_key_names()[-1]
             anchors = col.get_part(top_socket_name).anchors_by_part('socket')
             edge_pairs.append((anchors['top','left'], anchors['front','left']))
             edge_pairs.append((anchors['top','right'], anchors['front','right']))
 
         # right, returning reversed list
-        for socket_name in reversed(self.get_part(len(col_configs)-1).get_key_names()):
-            anchors = self.get_part(len(col_configs)-1).get_part(socket_name).anchors_by_part('socket')
+        for socket_name in reversed(cols[last_col].get_key_names()):
+            anchors = cols[last_col].get_part(socket_name).anchors_by_part('socket')
             edge_pairs.append((anchors['top','front'], anchors['right','front']))
             edge_pairs.append((anchors['top','back'], anchors['right','back']))
 
         # bottom, returning reversed list
-        for col_name in reversed(range(len(col_configs))):
-            col = self.get_part(col_name)
+        for col_name in reversed(range(len(cols))):
+            col = cols[col_name]
             bottom_socket_name = col.get_key_names()[0]
             anchors = col.get_part(bottom_socket_name).anchors_by_part('socket')
             if col_name > 2:
@@ -313,19 +348,11 @@ class DactylManuform(Keyboard):
         edge_pairs.append((thumb_anchors1['top','back'],thumb_anchors1['back','left']))
         #edge_pairs.append((thumb_anchors1['top','front'],thumb_anchors1['front','left']))
 
-
-        # TODO add this to the config
-        conf = configparser.ConfigParser()
-        conf['skirt'] = {}
-        conf['skirt']['wall_thickness'] = '2.0'
-        conf['skirt']['flare_len'] = '4.0'
-        conf['skirt']['flare_angle'] = '30.0'
-
-        # TODO translation should happen based on the config, or based on the minimum Z height of all parts
-        # to make sure all parts of the keyboard stay above the xy plane
-        self._parts.translate(0,0,60)
-        self._parts.rotate(0,20,0,degrees=True)
-        self._parts.add(FlaredSkirt(edge_pairs, conf['skirt']), 'skirt')
-
-        #TODO add anchors that make sense
-        self._anchors = None
+        # the anchors are views of the socket anchors, copy them before moving
+        placed = []
+        for pair in edge_pairs:
+            pair = tuple(anchors.copy() for anchors in pair)
+            for anchors in pair:
+                self._place(anchors)
+            placed.append(pair)
+        return placed
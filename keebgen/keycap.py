@@ -1,8 +1,9 @@
 import numpy as np
 import solid as sl
 
-from .geometry_base import Part, CuboidAnchorCollection
+from .geometry_base import Part, CuboidAnchorCollection, Recipe
 from . import geometry_utils as utils
+from . import resolution
 
 # when adding new keycaps, they should be oriented so the mounting feature is aligned with the Z axis
 # the bottom face should be offset from the XY plane by the same distance that they would be offset from
@@ -13,7 +14,7 @@ class Keycap(Part):
 
     def solid(self):
         # setting the % modifier makes it render visually in openscad, but not when exporting to stl
-        return self._solid.set_modifier('%')
+        return self._apply_transform(self._solid.set_modifier('%'))
 
 class OEM(Keycap):
     def __init__(self, r, u=1):
@@ -71,7 +72,17 @@ class OEM(Keycap):
         top_corners = utils.rotate_points(top_corners, [top_face_angle, 0, 0])
         top_corners = utils.translate_points(top_corners, [0, -top_offset_front, top_front_height])
 
-        corners = top_corners + bottom_corners
+        corners = np.concatenate((top_corners, bottom_corners))
+        self._solid = Recipe(self._make_solid, corners, top_width, bottom_length, top_curve_depth, top_face_angle,
+                             top_offset_front, top_front_height, vertical_offset)
+
+        corners = utils.translate_points(corners, (0, bottom_length/2, 0))
+        corners = utils.translate_points(corners, (0, 0, vertical_offset))
+        self._anchors = CuboidAnchorCollection(corners)
+
+    @staticmethod
+    def _make_solid(corners, top_width, bottom_length, top_curve_depth, top_face_angle, top_offset_front,
+                    top_front_height, vertical_offset):
         # faces must be numbered clockwise when looking at exterior
         key_faces = [[2, 3, 0, 1], # top
                      [1, 0, 4, 5], # front
@@ -80,20 +91,19 @@ class OEM(Keycap):
                      [3, 2, 6, 7], # back
                      [0, 3, 7, 4]] # left
 
-        key_cap = sl.polyhedron(corners, key_faces)
+        key_cap = sl.polyhedron(corners.tolist(), key_faces)
 
-        top_curve_radius = (top_curve_depth**2 + (top_width/2)**2)/(2 * top_curve_depth)
-        curve_cut = sl.cylinder(top_curve_radius, bottom_length*2, center=True, segments=100)
-        curve_cut = sl.rotate([90+top_face_angle, 0, 0])(curve_cut)
-        curve_cut = sl.translate([0,-top_offset_front,top_curve_radius+top_front_height-top_curve_depth])(curve_cut)
+        # a draft keycap is just its outline, see keebgen.resolution
+        profile = resolution.get_profile()
+        if not profile.keycap_proxy:
+            top_curve_radius = (top_curve_depth**2 + (top_width/2)**2)/(2 * top_curve_depth)
+            curve_cut = sl.cylinder(top_curve_radius, bottom_length*2, center=True,
+                                    segments=profile.keycap_curve_segments or None)
+            curve_cut = sl.rotate([90+top_face_angle, 0, 0])(curve_cut)
+            curve_cut = sl.translate([0,-top_offset_front,top_curve_radius+top_front_height-top_curve_depth])(curve_cut)
 
-        key_cap -= curve_cut
+            key_cap -= curve_cut
         key_cap = sl.translate([0, bottom_length/2, 0])(key_cap)
-        corners = utils.translate_points(corners, (0, bottom_length/2, 0))
         key_cap = sl.translate([0, 0, vertical_offset])(key_cap)
-        corners = utils.translate_points(corners, (0, 0, vertical_offset))
         key_cap = sl.color([50 / 255, 175 / 255, 255 / 255, 1])(key_cap)
-
-        # setting the % modifier makes it render visually in openscad, but not when exporting to stl
-        self._solid = key_cap
-        self._anchors = CuboidAnchorCollection(corners)
+        return key_cap
@@ -0,0 +1,419 @@
+from __future__ import annotations
+import numpy as np
+import solid as sl
+
+from . import geometry_utils as utils
+from . import resolution
+from .better_abc import BetterABCMeta, abstractmethod
+
+# Builds triangle meshes directly from the SolidPython tree returned by Part.solid(), so parts
+# can be exported without an OpenSCAD render.
+# Primitives, transforms and hulls are computed with numpy. union, difference and intersection
+# are run through a boolean engine, by default the optional manifold3d package.
+# Meshes use counter-clockwise faces when looking at the exterior, the opposite of OpenSCAD polyhedron()
+
+# OpenSCAD defaults for $fa and $fs
+_DEFAULT_FA = 12.0
+_DEFAULT_FS = 2.0
+
+
+class Mesh:
+    """A triangle mesh made of an (N,3) array of vertices and an (M,3) array of vertex indexes"""
+    def __init__(self, vertices, faces):
+        self.vertices = np.asarray(vertices, dtype=float).reshape((-1, 3))
+        self.faces = np.asarray(faces, dtype=np.int64).reshape((-1, 3))
+
+    @staticmethod
+    def empty() -> Mesh:
+        return Mesh(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))
+
+    @staticmethod
+    def concatenate(meshes) -> Mesh:
+        """Combines meshes without a boolean operation. Overlapping meshes will still overlap"""
+        meshes = [m for m in meshes if not m.is_empty()]
+        if not meshes:
+            return Mesh.empty()
+        offsets = np.cumsum([0] + [len(m.vertices) for m in meshes[:-1]])
+        return Mesh(np.concatenate([m.vertices for m in meshes]),
+                    np.concatenate([m.faces + offset for m, offset in zip(meshes, offsets)]))
+
+    def is_empty(self):
+        return len(self.faces) == 0
+
+    def transform(self, matrix) -> Mesh:
+        """Returns a copy transformed by a 4x4 matrix"""
+        matrix = np.asarray(matrix, dtype=float)
+        vertices = self.vertices @ matrix[:3, :3].T + matrix[:3, 3]
+        faces = self.faces
+        # mirroring turns the faces inside out
+        if np.linalg.det(matrix[:3, :3]) < 0:
+            faces = faces[:, ::-1]
+        return Mesh(vertices, faces)
+
+    def volume(self):
+        a, b, c = (self.vertices[self.faces[:, i]] for i in range(3))
+        return np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6.0
+
+    def bounds(self):
+        """Returns the (min, max) corners of the axis aligned bounding box"""
+        return np.min(self.vertices, axis=0), np.max(self.vertices, axis=0)
+
+    def is_closed(self):
+        """True if every edge is shared by exactly two faces, in opposite directions"""
+        edges = np.concatenate([self.faces[:, [0, 1]], self.faces[:, [1, 2]], self.faces[:, [2, 0]]])
+        forward, forward_counts = np.unique(edges, axis=0, return_counts=True)
+        backward = np.unique(edges[:, ::-1], axis=0)
+        return bool(np.all(forward_counts == 1) and len(forward) == len(backward) and np.array_equal(forward, backward))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {len(self.vertices)} vertices, {len(self.faces)} faces"
+
+
+class BooleanEngine(metaclass=BetterABCMeta):
+    """Interface for the engine that runs boolean operations between meshes"""
+    @abstractmethod
+    def union(self, meshes) -> Mesh:
+        pass
+
+    @abstractmethod
+    def difference(self, mesh, others) -> Mesh:
+        pass
+
+    @abstractmethod
+    def intersection(self, meshes) -> Mesh:
+        pass
+
+
+class ManifoldEngine(BooleanEngine):
+    """Boolean operations using the manifold3d package"""
+    def __init__(self):
+        try:
+            import manifold3d
+        except ImportError as e:
+            raise ImportError('the mesh backend requires the manifold3d package. '
+                              'Install it with `pip install manifold3d`') from e
+        self._manifold3d = manifold3d
+
+    def _to_manifold(self, mesh: Mesh):
+        m3d = self._manifold3d
+        manifold = m3d.Manifold(m3d.Mesh64(vert_properties=np.ascontiguousarray(mesh.vertices),
+                                           tri_verts=np.ascontiguousarray(mesh.faces, dtype=np.uint64)))
+        if manifold.status() != m3d.Error.NoError:
+            raise ValueError(f'mesh is not a closed manifold: {manifold.status()}')
+        return manifold
+
+    @staticmethod
+    def _from_manifold(manifold) -> Mesh:
+        mesh = manifold.to_mesh64()
+        # the returned buffers are read only, copy them so they can be passed back in
+        return Mesh(np.array(mesh.vert_properties)[:, :3], np.array(mesh.tri_verts))
+
+    def _batch(self, meshes, op) -> Mesh:
+        manifolds = [self._to_manifold(m) for m in meshes if not m.is_empty()]
+        if not manifolds:
+            return Mesh.empty()
+        if len(manifolds) == 1:
+            return self._from_manifold(manifolds[0])
+        return self._from_manifold(self._manifold3d.Manifold.batch_boolean(manifolds, op))
+
+    def union(self, meshes) -> Mesh:
+        return self._batch(meshes, self._manifold3d.OpType.Add)
+
+    def difference(self, mesh, others) -> Mesh:
+        others = [m for m in others if not m.is_empty()]
+        if mesh.is_empty() or not others:
+            return mesh
+        return self._batch([mesh] + others, self._manifold3d.OpType.Subtract)
+
+    def intersection(self, meshes) -> Mesh:
+        if any(m.is_empty() for m in meshes):
+            return Mesh.empty()
+        return self._batch(meshes, self._manifold3d.OpType.Intersect)
+
+
+def fragments(r, fn=0, fa=_DEFAULT_FA, fs=_DEFAULT_FS):
+    """Number of segments in a circle of radius r, matching OpenSCAD's $fn, $fa and $fs rules"""
+    if r < 0.00000095367431640625:
+        return 3
+    if fn and fn > 0:
+        return max(int(fn), 3)
+    return int(np.ceil(max(min(360.0 / fa, r * 2 * np.pi / fs), 5)))
+
+
+def _orient_convex(vertices, faces) -> Mesh:
+    """Flips faces of a convex mesh so all of them point away from the center"""
+    vertices = np.asarray(vertices, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    inward = np.einsum('ij,ij->i', np.cross(b - a, c - a), a - np.mean(vertices, axis=0)) < 0
+    faces[inward] = faces[inward][:, ::-1]
+    return Mesh(vertices, faces)
+
+
+def _loft(rings) -> Mesh:
+    """
+    Connects a stack of rings into a closed convex mesh.
+    Each ring is an (n,3) array with the same n, or a single point for cone tips.
+    """
+    vertices = []
+    faces = []
+    starts = []
+    for ring in rings:
+        starts.append(len(vertices))
+        vertices.extend(ring)
+    n = max(len(ring) for ring in rings)
+    i = np.arange(n)
+    for ring_idx in range(len(rings) - 1):
+        s0, s1 = starts[ring_idx], starts[ring_idx + 1]
+        l0, l1 = len(rings[ring_idx]), len(rings[ring_idx + 1])
+        if l0 > 1 and l1 > 1:
+            faces.extend(np.stack((s0 + i, s0 + (i + 1) % n, s1 + (i + 1) % n), axis=1))
+            faces.extend(np.stack((s0 + i, s1 + (i + 1) % n, s1 + i), axis=1))
+        elif l0 > 1:
+            faces.extend(np.stack((s0 + i, s0 + (i + 1) % n, np.full(n, s1)), axis=1))
+        else:
+            faces.extend(np.stack((np.full(n, s0), s1 + (i + 1) % n, s1 + i), axis=1))
+    # cap the ends with fans
+    for ring_idx in (0, len(rings) - 1):
+        if len(rings[ring_idx]) > 1:
+            s = starts[ring_idx]
+            j = np.arange(1, n - 1)
+            faces.extend(np.stack((np.full(n - 2, s), s + j, s + j + 1), axis=1))
+    return _orient_convex(vertices, faces)
+
+
+def _circle(r, n, z):
+    if r == 0:
+        return np.array([[0.0, 0.0, z]])
+    angles = np.deg2rad(360.0 * np.arange(n) / n)
+    return np.stack((r * np.cos(angles), r * np.sin(angles), np.full(n, z)), axis=1)
+
+
+def _param(params, *names, default=None):
+    for name in names:
+        if params.get(name) is not None:
+            return params[name]
+    return default
+
+
+def _cube(obj, backend):
+    size = obj.params.get('size', 1)
+    size = np.broadcast_to(np.asarray(size, dtype=float), (3,))
+    corners = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float) * size
+    if obj.params.get('center'):
+        corners -= size / 2
+    # two triangles per side, oriented afterwards
+    faces = [[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+             [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]]
+    return _orient_convex(corners, faces)
+
+
+def _cylinder(obj, backend):
+    p = obj.params
+    h = _param(p, 'h', default=1.0)
+    r = _param(p, 'r', default=1.0)
+    if _param(p, 'd') is not None:
+        r = p['d'] / 2
+    r1 = _param(p, 'r1', default=r)
+    r2 = _param(p, 'r2', default=r)
+    if _param(p, 'd1') is not None:
+        r1 = p['d1'] / 2
+    if _param(p, 'd2') is not None:
+        r2 = p['d2'] / 2
+    n = backend.fragments(max(r1, r2), _param(p, '$fn', 'segments', default=0))
+    z0 = -h / 2 if p.get('center') else 0.0
+    return _loft([_circle(r1, n, z0), _circle(r2, n, z0 + h)])
+
+
+def _sphere(obj, backend):
+    p = obj.params
+    r = _param(p, 'r', default=1.0)
+    if _param(p, 'd') is not None:
+        r = p['d'] / 2
+    n = backend.fragments(r, _param(p, '$fn', 'segments', default=0))
+    # same ring layout as OpenSCAD
+    num_rings = (n + 1) // 2
+    phis = np.deg2rad(180.0 * (np.arange(num_rings) + 0.5) / num_rings)
+    return _loft([_circle(r * np.sin(phi), n, r * np.cos(phi)) for phi in phis])
+
+
+def _polyhedron(obj, backend):
+    points = np.asarray(obj.params['points'], dtype=float)
+    polygons = obj.params.get('faces') or obj.params.get('triangles')
+    # fan triangulation of each face, then reverse OpenSCAD's clockwise ordering
+    faces = [(face[0], face[i + 1], face[i]) for face in polygons for i in range(1, len(face) - 1)]
+    return Mesh(points, faces)
+
+
+def _hull(obj, backend):
+    children = Mesh.concatenate(backend.evaluate_children(obj))
+    hull = utils.convex_hull(children.vertices)
+    if hull is None:
+        return Mesh.empty()
+    vertices, faces = hull
+    return Mesh(vertices, faces[:, ::-1])
+
+
+def _transform(matrix):
+    def handler(obj, backend):
+        return backend.union(backend.evaluate_children(obj)).transform(matrix(obj.params))
+    return handler
+
+
+def _translate_matrix(params):
+    return utils.translation_matrix(params.get('v', (0, 0, 0)))
+
+
+def _rotate_matrix(params):
+    a = params.get('a', 0)
+    v = params.get('v')
+    if np.ndim(a) == 0 and v is None:
+        return utils.rotation_matrix((0, 0, a))
+    if np.ndim(a) == 0:
+        # rotation of a degrees about the axis v
+        v = np.asarray(v, dtype=float) / np.linalg.norm(v)
+        k = np.array([[0, -v[2], v[1]], [v[2], 0, -v[0]], [-v[1], v[0], 0]])
+        m = np.eye(4)
+        angle = np.deg2rad(a)
+        m[:3, :3] = np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+        return m
+    return utils.rotation_matrix(a)
+
+
+def _multmatrix_matrix(params):
+    m = np.eye(4)
+    given = np.asarray(params['m'], dtype=float)
+    m[:given.shape[0], :given.shape[1]] = given
+    return m
+
+
+def _scale_matrix(params):
+    m = np.eye(4)
+    m[:3, :3] *= np.broadcast_to(np.asarray(params.get('v', 1), dtype=float), (3,))
+    return m
+
+
+def _mirror_matrix(params):
+    v = np.asarray(params.get('v', (1, 0, 0)), dtype=float)
+    v = v / np.linalg.norm(v)
+    m = np.eye(4)
+    m[:3, :3] -= 2 * np.outer(v, v)
+    return m
+
+
+# 4x4 matrix of each OpenSCAD transform, from its params
+TRANSFORMS = {
+    'translate': _translate_matrix,
+    'rotate': _rotate_matrix,
+    'multmatrix': _multmatrix_matrix,
+    'scale': _scale_matrix,
+    'mirror': _mirror_matrix,
+}
+
+
+def _union(obj, backend):
+    return backend.union(backend.evaluate_children(obj))
+
+
+def _difference(obj, backend):
+    children = backend.evaluate_children(obj)
+    if not children:
+        return Mesh.empty()
+    others = [m for m in children[1:] if not m.is_empty()]
+    if not others or children[0].is_empty():
+        return children[0]
+    return backend.engine.difference(children[0], others)
+
+
+def _intersection(obj, backend):
+    children = backend.evaluate_children(obj)
+    if len(children) == 1:
+        return children[0]
+    return backend.engine.intersection(children)
+
+
+class MeshBackend:
+    """
+    Converts SolidPython trees into meshes.
+
+    Handlers for each OpenSCAD call are looked up by name in `handlers`, so additional primitives
+    can be supported by adding to it. Objects with the background (%) or disable (*) modifier are
+    skipped, like they are when OpenSCAD exports an stl.
+
+    If a render_cache.RenderCache is given, the results of boolean operations and hulls are stored
+    in it, and unchanged subtrees are loaded from it instead of being evaluated again.
+    """
+    # operations worth caching, everything else is cheap to recompute
+    cached_operations = ('union', 'difference', 'intersection', 'hull')
+    handlers = {
+        'cube': _cube,
+        'cylinder': _cylinder,
+        'sphere': _sphere,
+        'polyhedron': _polyhedron,
+        'hull': _hull,
+        'union': _union,
+        'part': _union,
+        'color': _union,
+        'difference': _difference,
+        'intersection': _intersection,
+        **{name: _transform(matrix) for name, matrix in TRANSFORMS.items()},
+    }
+
+    def __init__(self, engine: BooleanEngine = None, fa=None, fs=None, cache=None, fn=None):
+        # fn, fa and fs that aren't given are taken from the resolution profile, like in .scad files
+        profile = resolution.get_profile()
+        # made on the first boolean operation, so parts without any don't need manifold3d
+        self._engine = engine
+        self.fa = fa if fa is not None else profile.fa
+        self.fs = fs if fs is not None else profile.fs
+        self.fn = fn if fn is not None else profile.fn
+        self.cache = cache
+        # hashes subtrees for the cache during a call to evaluate()
+        self._hasher = None
+
+    @property
+    def engine(self) -> BooleanEngine:
+        if self._engine is None:
+            self._engine = ManifoldEngine()
+        return self._engine
+
+    def fragments(self, r, fn=0):
+        return fragments(r, fn or self.fn, self.fa, self.fs)
+
+    def evaluate(self, obj: sl.OpenSCADObject) -> Mesh:
+        if obj.modifier in ('%', '*'):
+            return Mesh.empty()
+        if obj.name not in self.handlers:
+            raise NotImplementedError(f'the mesh backend does not support {obj.name}()')
+        if self.cache is None or obj.name not in self.cached_operations:
+            return self.handlers[obj.name](obj, self)
+
+        from .render_cache import SubtreeHasher
+        outermost = self._hasher is None
+        if outermost:
+            self._hasher = SubtreeHasher()
+        try:
+            key = self.cache.key(obj, f'mesh:{self.fn}:{self.fa}:{self.fs}', self._hasher)
+            mesh = self.cache.get(key)
+            if mesh is None:
+                mesh = self.handlers[obj.name](obj, self)
+                self.cache.put(key, mesh)
+            return mesh
+        finally:
+            if outermost:
+                self._hasher = None
+
+    def evaluate_children(self, obj: sl.OpenSCADObject):
+        return [self.evaluate(child) for child in obj.children]
+
+    def union(self, meshes) -> Mesh:
+        meshes = [m for m in meshes if not m.is_empty()]
+        if len(meshes) == 1:
+            return meshes[0]
+        return self.engine.union(meshes)
+
+
+def solid_to_mesh(solid: sl.OpenSCADObject, backend: MeshBackend = None) -> Mesh:
+    if backend is None:
+        backend = MeshBackend()
+    return backend.evaluate(solid)
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import numpy as np
+
+from .mesh_backend import Mesh
+
+# Writers that stream meshes to disk in fixed size chunks. Only one chunk of triangles is
+# expanded at a time, so extra memory stays bounded no matter how large the mesh is.
+
+# number of triangles expanded per write
+CHUNK_SIZE = 65536
+
+# binary stl record for one triangle, 50 bytes
+_STL_TRIANGLE = np.dtype([('normal', '<f4', (3,)),
+                          ('vertices', '<f4', (3, 3)),
+                          ('attribute', '<u2')])
+
+
+def _chunks(num, chunk_size):
+    for start in range(0, num, chunk_size):
+        yield start, min(start + chunk_size, num)
+
+
+def write_stl(mesh: Mesh, file_name, chunk_size=CHUNK_SIZE, header=b'keebgen'):
+    """Writes the mesh as a binary stl"""
+    faces = mesh.faces
+    with open(file_name, 'wb') as f:
+        f.write(header[:80].ljust(80, b' '))
+        f.write(np.uint32(len(faces)).tobytes())
+        record = np.zeros(min(chunk_size, len(faces)), dtype=_STL_TRIANGLE)
+        for start, end in _chunks(len(faces), chunk_size):
+            chunk = record[:end - start]
+            triangles = mesh.vertices[faces[start:end]]
+            normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            chunk['normal'] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+            chunk['vertices'] = triangles
+            f.write(chunk.tobytes())
+
+
+def write_off(mesh: Mesh, file_name, chunk_size=CHUNK_SIZE):
+    """Writes the mesh as an ascii OFF file"""
+    with open(file_name, 'w') as f:
+        f.write(f'OFF\n{len(mesh.vertices)} {len(mesh.faces)} 0\n')
+        for start, end in _chunks(len(mesh.vertices), chunk_size):
+            np.savetxt(f, mesh.vertices[start:end], fmt='%.10g')
+        for start, end in _chunks(len(mesh.faces), chunk_size):
+            faces = mesh.faces[start:end]
+            np.savetxt(f, np.column_stack((np.full(len(faces), 3), faces)), fmt='%d')
+
+
+def read_stl(file_name) -> Mesh:
+    """Reads a binary or ascii stl. Vertices are not merged, each triangle has its own three"""
+    data = Path(file_name).read_bytes()
+    num = int(np.frombuffer(data[80:84], dtype='<u4')[0]) if len(data) >= 84 else -1
+    if len(data) == 84 + num * _STL_TRIANGLE.itemsize:
+        records = np.frombuffer(data[84:], dtype=_STL_TRIANGLE)
+        vertices = records['vertices'].reshape((-1, 3)).astype(float)
+    else:
+        # ascii stl, as written by older versions of OpenSCAD
+        vertices = np.array([line.split()[1:4] for line in data.decode('ascii').splitlines()
+                             if line.lstrip().startswith('vertex')], dtype=float).reshape((-1, 3))
+    return Mesh(vertices, np.arange(len(vertices)).reshape((-1, 3)))
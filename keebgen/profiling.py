@@ -0,0 +1,234 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from .geometry_base import Part, Assembly, AnchorCollection
+
+# Opt-in instrumentation of keyboard builds.
+#
+#   with Profiler() as profiler:
+#       keyboard = DactylManuform(...)
+#       keyboard.solid()
+#   print(profiler.summary())
+#   profiler.to_chrome_trace('build.trace.json')  # open in chrome://tracing or ui.perfetto.dev
+#
+# While a Profiler is active, construction, translate(), rotate(), multmatrix() and solid() of every Part class,
+# and label queries of every AnchorCollection class, are wrapped to record wall time and optionally
+# tracemalloc allocations. The wrappers are removed when it stops, so there is no overhead at all
+# when profiling is off.
+# Parts are often built on their own and only a copy is added to an assembly, like the columns of a
+# keyboard, so copies are tracked too. Part paths are worked out when reporting, from the assemblies
+# the parts, or their copies, ended up in.
+
+# methods that are timed, by the operation name they are reported under
+_PART_OPERATIONS = {'__init__': 'construct', 'translate': 'transform', 'rotate': 'transform',
+                    'multmatrix': 'transform', 'solid': 'solid'}
+_ANCHOR_OPERATIONS = {'__getitem__': 'anchor_query'}
+
+
+def _subclasses(cls):
+    yield cls
+    for subclass in cls.__subclasses__():
+        yield from _subclasses(subclass)
+
+
+class ProfileEvent:
+    """One timed call"""
+    __slots__ = ('operation', 'method', 'obj', 'parents', 'start', 'seconds', 'alloc_bytes', 'thread')
+
+    def __init__(self, operation, method, obj, parents, start, thread):
+        self.operation = operation
+        self.method = method
+        self.obj = obj
+        # objects of the enclosing events, outermost first
+        self.parents = parents
+        self.start = start
+        self.thread = thread
+        self.seconds = 0.0
+        self.alloc_bytes = 0
+
+
+class Profiler:
+    """
+    Records calls made while it is active, see the top of this module.
+    Only one Profiler can be active at a time.
+
+    :param trace_allocations: also record the net bytes allocated by each call with tracemalloc.
+                              This is much slower than timing alone
+    """
+    _active = None
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.events = []
+        self._stack = []
+        self._originals = []
+        self._started_tracemalloc = False
+        self._origin = None
+        # {id(copy): (copy, original)} of the parts copied while active
+        self._copied_from = {}
+
+    def start(self):
+        if Profiler._active is not None:
+            raise RuntimeError('another Profiler is already active')
+        # make sure every part class has been defined, so all of them are hooked
+        from . import keyboard, render  # noqa: F401
+        Profiler._active = self
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._origin = time.perf_counter()
+        for cls in _subclasses(Part):
+            self._hook(cls, _PART_OPERATIONS)
+            if 'copy' in cls.__dict__:
+                self._originals.append((cls, 'copy', cls.__dict__['copy']))
+                setattr(cls, 'copy', self._wrap_copy(cls.__dict__['copy']))
+        for cls in _subclasses(AnchorCollection):
+            self._hook(cls, _ANCHOR_OPERATIONS)
+        return self
+
+    def stop(self):
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        Profiler._active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _hook(self, cls, operations):
+        for name, operation in operations.items():
+            # only methods the class defines itself, inherited ones are hooked on the base class
+            if name in cls.__dict__:
+                original = cls.__dict__[name]
+                self._originals.append((cls, name, original))
+                setattr(cls, name, self._wrap(original, operation, f'{cls.__name__}.{name}'))
+
+    def _wrap(self, func, operation, method):
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(obj, *args, **kwargs):
+            stack = profiler._stack
+            # a subclass calling its base class method is part of the same call
+            if stack and stack[-1].obj is obj and stack[-1].operation == operation:
+                return func(obj, *args, **kwargs)
+            parents = []
+            for e in stack:
+                if e.obj is not obj and not any(e.obj is p for p in parents):
+                    parents.append(e.obj)
+            event = ProfileEvent(operation, method, obj, tuple(parents), time.perf_counter(), threading.get_ident())
+            memory_before = tracemalloc.get_traced_memory()[0] if profiler.trace_allocations else 0
+            stack.append(event)
+            try:
+                return func(obj, *args, **kwargs)
+            finally:
+                stack.pop()
+                event.seconds = time.perf_counter() - event.start
+                if profiler.trace_allocations:
+                    event.alloc_bytes = tracemalloc.get_traced_memory()[0] - memory_before
+                profiler.events.append(event)
+        return wrapper
+
+    def _wrap_copy(self, func):
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(obj, *args, **kwargs):
+            new = func(obj, *args, **kwargs)
+            profiler._copied_from[id(new)] = (new, obj)
+            return new
+        return wrapper
+
+    def _is_copy_of(self, part, obj):
+        """True if part is obj, or a copy of it, or a copy of a copy..."""
+        while part is not obj:
+            if id(part) not in self._copied_from:
+                return False
+            part = self._copied_from[id(part)][1]
+        return True
+
+    def _path_name(self, parent, obj):
+        """
+        The name of obj within parent, its index if it wasn't named, or its class if it isn't a child.
+        obj is also found through the copy of it that was added to parent, if there is only one
+        """
+        if isinstance(parent, Assembly) and getattr(parent, '_parts', None) is not None:
+            indexes = [index for index, part in enumerate(parent._parts) if part is obj]
+            if not indexes:
+                indexes = [index for index, part in enumerate(parent._parts) if self._is_copy_of(part, obj)]
+            if len(indexes) == 1:
+                names = {i: name for name, i in parent._parts._index_lookup.items()}
+                return str(names.get(indexes[0], indexes[0]))
+        return type(obj).__name__
+
+    def path(self, event: ProfileEvent) -> str:
+        """The part path of the object an event was recorded on, e.g. DactylManuform/0/2/socket"""
+        parts = [p for p in event.parents if isinstance(p, Part)]
+        if isinstance(event.obj, Part):
+            parts.append(event.obj)
+        if not parts:
+            return type(event.obj).__name__
+        names = [type(parts[0]).__name__]
+        for parent, obj in zip(parts, parts[1:]):
+            names.append(self._path_name(parent, obj))
+        return '/'.join(names)
+
+    def _aggregate(self, key):
+        totals = {}
+        for event in self.events:
+            entry = totals.setdefault(key(event), {}).setdefault(
+                event.operation, {'calls': 0, 'seconds': 0.0, 'alloc_bytes': 0})
+            entry['calls'] += 1
+            entry['seconds'] += event.seconds
+            entry['alloc_bytes'] += event.alloc_bytes
+        return totals
+
+    def by_class(self):
+        """{class name: {operation: {calls, seconds, alloc_bytes}}}. Nested calls are counted in both"""
+        return self._aggregate(lambda event: type(event.obj).__name__)
+
+    def by_path(self):
+        """{part path: {operation: {calls, seconds, alloc_bytes}}}"""
+        return self._aggregate(self.path)
+
+    def summary(self, limit=20):
+        """The most expensive class and operation pairs, as a table"""
+        rows = [(cls, operation, entry) for cls, operations in self.by_class().items()
+                for operation, entry in operations.items()]
+        rows.sort(key=lambda row: -row[2]['seconds'])
+        lines = [f"{'class':<28}{'operation':<14}{'calls':>8}{'seconds':>10}{'KiB':>10}"]
+        for cls, operation, entry in rows[:limit]:
+            lines.append(f"{cls:<28}{operation:<14}{entry['calls']:>8}{entry['seconds']:>10.4f}"
+                         f"{entry['alloc_bytes'] / 1024:>10.1f}")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'events': len(self.events), 'trace_allocations': self.trace_allocations,
+                'by_class': self.by_class(), 'by_path': self.by_path()}
+
+    def to_json(self, file_name):
+        Path(file_name).write_text(json.dumps(self.to_dict(), indent=1))
+
+    def to_chrome_trace(self, file_name):
+        """Writes the events in the Chrome trace event format, for chrome://tracing or Perfetto"""
+        pid = os.getpid()
+        trace = []
+        for event in sorted(self.events, key=lambda e: e.start):
+            args = {'path': self.path(event)}
+            if self.trace_allocations:
+                args['alloc_bytes'] = event.alloc_bytes
+            trace.append({'name': event.method, 'cat': event.operation, 'ph': 'X', 'pid': pid,
+                          'tid': event.thread, 'ts': (event.start - self._origin) * 1e6,
+                          'dur': event.seconds * 1e6, 'args': args})
+        Path(file_name).write_text(json.dumps({'traceEvents': trace, 'displayTimeUnit': 'ms'}))
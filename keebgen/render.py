@@ -0,0 +1,178 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import solid as sl
+
+from .geometry_base import Part, Assembly
+from . import resolution
+from .mesh_backend import Mesh
+from .mesh_io import read_stl, write_stl
+from .render_cache import SubtreeHasher, split_transform
+
+# Renders an Assembly with several OpenSCAD processes at once.
+# The assembly is split into independent subtrees, each subtree is rendered to an stl by its own
+# openscad process, then one final openscad run unions the results.
+
+# OpenSCAD exits with an error if everything in the file is a background part, like keycaps
+_EMPTY_MESSAGE = 'Current top level object is empty'
+
+
+class SubtreeResult:
+    """The outcome of rendering one subtree"""
+    def __init__(self, path, stl_file, seconds, returncode, stderr, cached=False):
+        # names or indexes of the parts leading to this subtree
+        self.path = path
+        self.stl_file = stl_file
+        self.seconds = seconds
+        self.returncode = returncode
+        self.stderr = stderr
+        # True if the mesh was loaded from a RenderCache instead of rendered
+        self.cached = cached
+
+    @property
+    def empty(self):
+        return self.returncode != 0 and _EMPTY_MESSAGE in self.stderr
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        status = 'ok' if self.ok else 'empty' if self.empty else f'failed ({self.returncode})'
+        source = 'from cache' if self.cached else f'in {self.seconds:.2f}s'
+        return f"{self.__class__.__name__}: {'/'.join(map(str, self.path))} {status} {source}"
+
+
+class RenderError(Exception):
+    pass
+
+
+def split_assembly(part: Part, depth=1) -> List[Tuple[tuple, Part]]:
+    """
+    Splits an assembly into subtrees, descending `depth` levels into nested assemblies.
+    Returns a list of (path, part), where path is the part names or indexes leading to it.
+    """
+    def split(part, path, depth):
+        if depth <= 0 or not isinstance(part, Assembly):
+            return [(path, part)]
+        names = {index: name for name, index in part._parts._index_lookup.items()}
+        subtrees = []
+        for index, child in enumerate(part._parts):
+            subtrees += split(child, path + (names.get(index, index),), depth - 1)
+        return subtrees
+    return split(part, (), depth)
+
+
+# Sets the address space limit, then replaces itself with the command. openscad is started from
+# several threads at once, where subprocess' preexec_fn isn't safe, so the limit is set by this
+# wrapper process instead
+_LIMIT_MEMORY = ('import os, resource, sys; limit = int(sys.argv[1]); '
+                 'resource.setrlimit(resource.RLIMIT_AS, (limit, limit)); os.execvp(sys.argv[2], sys.argv[2:])')
+
+
+def _limit_memory(command, memory_limit):
+    """command wrapped so it runs with at most memory_limit bytes of address space (posix only)"""
+    if memory_limit is None or os.name != 'posix':
+        return command
+    return [sys.executable, '-c', _LIMIT_MEMORY, str(int(memory_limit))] + list(command)
+
+
+def _run_openscad(openscad, scad_file, out_file, timeout, memory_limit):
+    command = _limit_memory([openscad, '-o', str(out_file), str(scad_file)], memory_limit)
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+        returncode, stderr = proc.returncode, proc.stderr
+    except subprocess.TimeoutExpired:
+        returncode, stderr = -1, f'timed out after {timeout}s'
+    return time.perf_counter() - start, returncode, stderr
+
+
+def _cached_result(path, stl_file, mesh, matrix):
+    if mesh.is_empty():
+        return SubtreeResult(path, stl_file, 0.0, 1, _EMPTY_MESSAGE, cached=True)
+    write_stl(mesh if matrix is None else mesh.transform(matrix), stl_file)
+    return SubtreeResult(path, stl_file, 0.0, 0, '', cached=True)
+
+
+def render_parallel(part: Part, out_file, depth=1, jobs=None, timeout=None, memory_limit=None,
+                    openscad='openscad', work_dir=None, cache=None) -> List[SubtreeResult]:
+    """
+    Renders part to out_file (any format openscad can export, usually .stl) using one openscad
+    process per subtree, running up to `jobs` at a time.
+
+    :param depth: how many levels of nested assemblies to split into separate renders
+    :param jobs: number of concurrent openscad processes, defaults to the number of cpus
+    :param timeout: seconds allowed for each openscad process
+    :param memory_limit: bytes of address space allowed for each openscad process (posix only)
+    :param work_dir: where to keep the intermediate .scad and .stl files, a temporary directory if None
+    :param cache: a render_cache.RenderCache. Subtrees found in it aren't rendered, and newly rendered
+                  subtrees are added to it
+    :return: the SubtreeResult for each subtree
+    :raises RenderError: if openscad fails, or every subtree is empty
+    """
+    if shutil.which(openscad) is None:
+        raise RenderError(f'could not find the openscad executable "{openscad}"')
+    jobs = jobs or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(work_dir if work_dir is not None else tmp)
+        work_dir.mkdir(parents=True, exist_ok=True)
+
+        # write every subtree before starting, so the part tree is only touched from this thread
+        tasks = []
+        results = {}
+        hasher = SubtreeHasher()
+        for i, (path, subtree) in enumerate(split_assembly(part, depth)):
+            stl_file = work_dir / f'subtree_{i}.stl'
+            solid = subtree.solid()
+            matrix, key = None, None
+            if cache is not None:
+                # the part's placement is applied to the cached mesh, so identical parts share an entry
+                matrix, solid = split_transform(solid)
+                profile = resolution.get_profile()
+                key = cache.key(solid, f'openscad:{profile.fn}:{profile.fa}:{profile.fs}', hasher)
+                mesh = cache.get(key)
+                if mesh is not None:
+                    results[i] = _cached_result(path, stl_file, mesh, matrix)
+                    continue
+            scad_file = work_dir / f'subtree_{i}.scad'
+            scad_file.write_text(sl.scad_render(solid, file_header=resolution.file_header()))
+            tasks.append((i, path, scad_file, stl_file, matrix, key))
+
+        def render(task):
+            i, path, scad_file, stl_file, matrix, key = task
+            result = SubtreeResult(path, stl_file, *_run_openscad(openscad, scad_file, stl_file, timeout, memory_limit))
+            if key is not None and (result.ok or result.empty):
+                mesh = read_stl(stl_file) if result.ok else Mesh.empty()
+                cache.put(key, mesh)
+                if result.ok and matrix is not None:
+                    write_stl(mesh.transform(matrix), stl_file)
+            return i, result
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results.update(pool.map(render, tasks))
+        results = [results[i] for i in sorted(results)]
+
+        failed = [r for r in results if not r.ok and not r.empty]
+        if failed:
+            raise RenderError('failed to render subtrees:\n' + '\n'.join(f'{r}\n{r.stderr}' for r in failed))
+
+        if not any(r.ok for r in results):
+            raise RenderError('nothing to render, every subtree of the part is empty')
+
+        # union all of the rendered meshes
+        imports = ''.join(f'\n\timport("{r.stl_file.resolve().as_posix()}");' for r in results if r.ok)
+        union_file = work_dir / 'union.scad'
+        union_file.write_text(f'union() {{{imports}\n}}\n')
+        seconds, returncode, stderr = _run_openscad(openscad, union_file, Path(out_file).resolve(), timeout, None)
+        if returncode != 0:
+            raise RenderError(f'failed to union subtrees:\n{stderr}')
+    return results
@@ -0,0 +1,255 @@
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import solid as sl
+
+from .mesh_backend import Mesh, TRANSFORMS
+
+# A persistent cache of rendered meshes, keyed by a canonical hash of the SolidPython subtree
+# that produced them. Most of a keyboard is unchanged between runs, so most subtrees can be
+# loaded from disk instead of being rendered again.
+
+# bump when the hash or the file format changes, so old entries are never read
+CACHE_VERSION = 1
+
+# digits kept when hashing floats. Enough to be exact for anything printable, and coarse enough
+# that floating point noise from a different order of operations hashes the same
+_HASH_DECIMALS = 9
+
+# children of these operations can be reordered without changing the result
+_COMMUTATIVE = ('union', 'intersection', 'hull', 'part')
+
+_ENTRY_SUFFIX = '.npz'
+
+
+def default_cache_dir():
+    """$KEEBGEN_CACHE_DIR, or keebgen in the user's cache directory"""
+    if os.environ.get('KEEBGEN_CACHE_DIR'):
+        return Path(os.environ['KEEBGEN_CACHE_DIR'])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'keebgen'
+
+
+def _format(value):
+    """Formats a param value the same way every time, regardless of its python or numpy type"""
+    if value is None or isinstance(value, (bool, np.bool_)):
+        return repr(None if value is None else bool(value))
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        # adding 0.0 turns -0.0 into 0.0
+        return repr(round(float(value), _HASH_DECIMALS) + 0.0)
+    if isinstance(value, str):
+        return repr(value)
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{k!r}:{_format(value[k])}' for k in sorted(value)) + '}'
+    return '[' + ','.join(_format(v) for v in np.asarray(value, dtype=object).tolist()) + ']'
+
+
+def split_transform(obj: sl.OpenSCADObject):
+    """
+    Peels the chain of transforms off the top of obj.
+    Returns (matrix, inner) where inner is the first object that isn't a transform with one child,
+    and matrix is the 4x4 matrix of the peeled transforms, None if there were none.
+    """
+    matrix = None
+    while obj.name in TRANSFORMS and len(obj.children) == 1 and not obj.modifier:
+        step = TRANSFORMS[obj.name](obj.params)
+        matrix = step if matrix is None else matrix @ step
+        obj = obj.children[0]
+    return matrix, obj
+
+
+class SubtreeHasher:
+    """
+    Computes canonical hashes of SolidPython subtrees.
+
+    Params are hashed in sorted order with fixed float formatting, chains of transforms are folded
+    into a single matrix, and the children of commutative operations are sorted. Two trees that
+    OpenSCAD would render the same way, like a translate() and the equivalent multmatrix(), hash
+    the same.
+    Hashes are memoized by object, so keep one hasher per tree that doesn't change.
+    """
+    def __init__(self):
+        # id -> (obj, hash). Holds a reference to obj so its id can't be reused
+        self._hashes = {}
+
+    def __call__(self, obj: sl.OpenSCADObject) -> str:
+        entry = self._hashes.get(id(obj))
+        if entry is None:
+            entry = (obj, self._hash(obj))
+            self._hashes[id(obj)] = entry
+        return entry[1]
+
+    def _hash(self, obj):
+        matrix, inner = split_transform(obj)
+        if matrix is not None:
+            # a transform of a single child, identity transforms disappear
+            if np.allclose(matrix, np.eye(4), rtol=0, atol=10 ** -_HASH_DECIMALS):
+                return self(inner)
+            header = f'transform({_format(matrix)})'
+            children = [inner]
+        else:
+            params = {k: v for k, v in obj.params.items() if v is not None}
+            # scad_render() renames segments to $fn on the object, so a tree hashes the same before and after
+            if 'segments' in params:
+                params['$fn'] = params.pop('segments')
+            if obj.name in TRANSFORMS:
+                # a transform with several children is a transform of their union
+                header = f'{obj.modifier}transform({_format(TRANSFORMS[obj.name](params))})'
+            else:
+                header = f'{obj.modifier}{obj.name}({_format(params)})'
+            children = obj.children
+
+        child_hashes = [self(child) for child in children]
+        if obj.name in _COMMUTATIVE or obj.name in TRANSFORMS:
+            child_hashes.sort()
+        elif obj.name == 'difference':
+            # everything after the first child is subtracted, in any order
+            child_hashes[1:] = sorted(child_hashes[1:])
+        digest = hashlib.sha1(header.encode())
+        for child_hash in child_hashes:
+            digest.update(child_hash.encode())
+        return digest.hexdigest()
+
+
+class CacheStats:
+    """Size and usage of a RenderCache"""
+    def __init__(self, entries, size, max_size, hits, misses):
+        self.entries = entries
+        # bytes on disk
+        self.size = size
+        self.max_size = max_size
+        # lookups since the RenderCache was created
+        self.hits = hits
+        self.misses = misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}: {self.entries} entries, {self.size / 2 ** 20:.1f} of "
+                f"{self.max_size / 2 ** 20:.1f} MiB, {self.hits} hits, {self.misses} misses")
+
+
+class RenderCache:
+    """
+    Stores meshes on disk by key, evicting the least recently used entries once the total size
+    passes max_size.
+
+    Entries are written to a temporary file and atomically renamed into place, so several
+    processes can share a directory without locks. Readers either see a whole entry or none.
+    Reading an entry updates its modification time, which is used as the last access time.
+    """
+    def __init__(self, directory=None, max_size=2 ** 30):
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # running total of bytes on disk, measured on the first put and updated by writes.
+        # Other processes also write, so it only decides when to scan the directory again
+        self._size_estimate = None
+
+    @staticmethod
+    def key(obj: sl.OpenSCADObject, namespace='', hasher: SubtreeHasher = None) -> str:
+        """
+        The cache key of a subtree. namespace separates renders of the same tree that give
+        different meshes, like OpenSCAD and the mesh backend, or different resolutions.
+        """
+        subtree_hash = (hasher or SubtreeHasher())(obj)
+        return hashlib.sha1(f'{CACHE_VERSION}:{namespace}:{subtree_hash}'.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / (key + _ENTRY_SUFFIX)
+
+    def _entries(self):
+        for path in self.directory.glob('*/*' + _ENTRY_SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            yield path, stat
+
+    def get(self, key):
+        """Returns the cached Mesh, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                mesh = Mesh(data['vertices'], data['faces'])
+            os.utime(path)
+        except FileNotFoundError:
+            mesh = None
+        except (OSError, ValueError, KeyError):
+            # unreadable entry, drop it and render again
+            self._remove(path)
+            mesh = None
+        with self._lock:
+            if mesh is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return mesh
+
+    def put(self, key, mesh: Mesh):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, vertices=mesh.vertices, faces=mesh.faces)
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(Path(tmp))
+            raise
+
+        with self._lock:
+            if self._size_estimate is None:
+                self._size_estimate = sum(stat.st_size for _, stat in self._entries())
+            else:
+                self._size_estimate += path.stat().st_size
+            needs_prune = self._size_estimate > self.max_size
+        if needs_prune:
+            self.prune()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def prune(self, max_size=None):
+        """
+        Removes the least recently used entries until the cache fits in max_size bytes,
+        self.max_size if None. Returns the number of entries removed.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        removed = 0
+        for path, stat in entries:
+            if size <= max_size:
+                break
+            size -= stat.st_size
+            removed += self._remove(path)
+        with self._lock:
+            self._size_estimate = size
+        return removed
+
+    def clear(self):
+        return self.prune(0)
+
+    def stats(self) -> CacheStats:
+        entries = list(self._entries())
+        return CacheStats(len(entries), sum(stat.st_size for _, stat in entries), self.max_size,
+                          self.hits, self.misses)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: {self.directory}"
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from typing import Union
+
+from .config import ResolutionProfile
+
+# One setting for how finely every part is tessellated, from quick drafts to final output.
+#
+#   with resolution('draft'):
+#       keyboard.to_file('keyboard.scad')
+#
+# Profiles are read when solids are built, which is the first time solid() is called for a
+# profile, so a keyboard can be built once and written at several resolutions. $fn, $fa and $fs
+# are written once at the top of .scad files, primitives that need their own segment counts take
+# them from the profile.
+# Custom profiles are made with replace(), e.g. PROFILES['preview'].replace(keycap_curve_segments=60)
+
+PROFILES = {
+    # keycaps are drawn as plain outlines, for fast interactive iteration
+    'draft': ResolutionProfile(fa=30.0, fs=5.0, keycap_curve_segments=12, side_nub_segments=6,
+                               sphere_segments=6, keycap_proxy=True),
+    'preview': ResolutionProfile(fa=15.0, fs=3.0, keycap_curve_segments=32, side_nub_segments=10,
+                                 sphere_segments=10),
+    # OpenSCAD's defaults, and the segment counts parts always had
+    'final': ResolutionProfile(),
+}
+
+_profile = PROFILES['final']
+
+
+def load(profile: Union[str, ResolutionProfile]) -> ResolutionProfile:
+    """profile if it is a ResolutionProfile, otherwise the profile with that name in PROFILES"""
+    if isinstance(profile, ResolutionProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f'unknown resolution profile "{profile}", must be one of {tuple(PROFILES)}')
+    return PROFILES[profile]
+
+
+def get_profile() -> ResolutionProfile:
+    return _profile
+
+
+def set_profile(profile: Union[str, ResolutionProfile]):
+    """Sets the profile used from now on, by name or as a ResolutionProfile"""
+    global _profile
+    _profile = load(profile)
+
+
+@contextmanager
+def resolution(profile: Union[str, ResolutionProfile]):
+    """Uses the profile within the block, see set_profile()"""
+    previous = _profile
+    set_profile(profile)
+    try:
+        yield _profile
+    finally:
+        set_profile(previous)
+
+
+def file_header() -> str:
+    """The top of a .scad file for the current profile"""
+    return _profile.file_header()
@@ -0,0 +1,242 @@
+import json
+import warnings
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import solid as sl
+from solid.solidpython import non_rendered_classes
+
+from .geometry_base import Part, Assembly
+from .mesh_backend import fragments
+from . import resolution
+
+# Measures how complex a SolidPython tree is, and predicts how long OpenSCAD will take to render it.
+#
+#   report = estimate(keyboard, budget=120)
+#   print(report)
+#
+# The prediction is a linear model of a few features of the tree. The default coefficients are
+# rough, fit a model to your own machine with RenderCostModel.add_sample() and fit() using the
+# times of past renders, e.g. from render.render_parallel().
+
+# features the cost model is linear in
+FEATURES = ('nodes', 'facets', 'boolean_facets', 'hulls', 'hull_points')
+
+# seconds per unit of each feature, plus a constant
+DEFAULT_COEFFICIENTS = {
+    'constant': 0.1,
+    'nodes': 1e-4,
+    'facets': 2e-5,
+    'boolean_facets': 1e-4,
+    'hulls': 2e-3,
+    'hull_points': 2e-5,
+}
+
+# operations OpenSCAD runs CGAL booleans for, part() is an implicit union
+_BOOLEANS = ('difference', 'intersection', 'union', 'part')
+
+
+class RenderBudgetWarning(UserWarning):
+    pass
+
+
+class ScadMetrics:
+    """Complexity of a SolidPython tree. Background (%) and disabled (*) subtrees are not rendered and aren't counted"""
+    def __init__(self, node_counts=None, depth=0, facets=0, boolean_facets=0, hull_points=0):
+        # number of nodes of each type, e.g. {'hull': 3, 'sphere': 24}
+        self.node_counts: Dict[str, int] = dict(node_counts or {})
+        # deepest nesting of nodes
+        self.depth = depth
+        # estimated number of triangles in all primitives, from their segment counts
+        self.facets = facets
+        # sum of the facets going into each boolean operation. Nested booleans count their facets again
+        self.boolean_facets = boolean_facets
+        # number of points going into hulls
+        self.hull_points = hull_points
+
+    @property
+    def nodes(self):
+        return sum(self.node_counts.values())
+
+    @property
+    def hulls(self):
+        return self.node_counts.get('hull', 0)
+
+    def features(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in FEATURES}
+
+    def to_dict(self):
+        return {'node_counts': self.node_counts, 'depth': self.depth, **self.features()}
+
+    def __repr__(self):
+        counts = ', '.join(f'{name} {count}' for name, count in sorted(self.node_counts.items(), key=lambda x: -x[1]))
+        return (f"{self.__class__.__name__}: {self.nodes} nodes ({counts}), depth {self.depth}, "
+                f"{self.facets} facets, {self.boolean_facets} boolean facets")
+
+
+def _radius(params, r_name, d_name, default=1.0):
+    if params.get(d_name) is not None:
+        return params[d_name] / 2
+    if params.get(r_name) is not None:
+        return params[r_name]
+    return default
+
+
+def _primitive_facets(obj, fn, fa, fs) -> Tuple[int, int]:
+    """Estimated (triangles, vertices) of a primitive, following OpenSCAD's segment rules"""
+    p = obj.params
+    fn = p.get('segments') or p.get('$fn') or fn
+    if obj.name == 'cube':
+        return 12, 8
+    if obj.name == 'sphere':
+        n = fragments(_radius(p, 'r', 'd'), fn, fa, fs)
+        rings = (n + 1) // 2
+        return 2 * n * (rings - 1) + 2 * (n - 2), n * rings
+    if obj.name == 'cylinder':
+        r = _radius(p, 'r', 'd')
+        r1, r2 = _radius(p, 'r1', 'd1', r), _radius(p, 'r2', 'd2', r)
+        n = fragments(max(r1, r2), fn, fa, fs)
+        if min(r1, r2) == 0:
+            # cone
+            return n + n - 2, n + 1
+        return 2 * n + 2 * (n - 2), 2 * n
+    if obj.name == 'polyhedron':
+        faces = p.get('faces') or p.get('triangles') or []
+        return sum(max(len(face) - 2, 0) for face in faces), len(p.get('points') or [])
+    return 0, 0
+
+
+class _Analyzer:
+    def __init__(self, fn, fa, fs):
+        self._fn = fn
+        self._fa = fa
+        self._fs = fs
+        self.metrics = ScadMetrics()
+
+    def walk(self, obj, depth=1):
+        if obj.modifier in ('%', '*'):
+            return 0, 0
+        if obj.name not in non_rendered_classes:
+            self.metrics.node_counts[obj.name] = self.metrics.node_counts.get(obj.name, 0) + 1
+            self.metrics.depth = max(self.metrics.depth, depth)
+        facets, vertices = _primitive_facets(obj, self._fn, self._fa, self._fs)
+        self.metrics.facets += facets
+        for child in obj.children:
+            child_facets, child_vertices = self.walk(child, depth + 1)
+            facets += child_facets
+            vertices += child_vertices
+        if obj.name in _BOOLEANS and len(obj.children) > 1:
+            self.metrics.boolean_facets += facets
+        if obj.name == 'hull':
+            self.metrics.hull_points += vertices
+        return facets, vertices
+
+
+def analyze(solid: sl.OpenSCADObject, fa=None, fs=None, fn=None) -> ScadMetrics:
+    """
+    Walks a SolidPython tree and measures it, with the file wide $fn, $fa and $fs used for primitives
+    without segments of their own. fn, fa and fs default to the resolution profile's
+    """
+    profile = resolution.get_profile()
+    analyzer = _Analyzer(fn if fn is not None else profile.fn, fa if fa is not None else profile.fa,
+                         fs if fs is not None else profile.fs)
+    analyzer.walk(solid)
+    return analyzer.metrics
+
+
+class RenderCostModel:
+    """
+    Predicts render seconds as a linear function of ScadMetrics features.
+    Samples of past renders can be added and the model fit to them, and saved as a json calibration table.
+    """
+    def __init__(self, coefficients=None, samples=None):
+        self.coefficients = dict(coefficients if coefficients is not None else DEFAULT_COEFFICIENTS)
+        # features of past renders, each with the measured 'seconds'
+        self.samples: List[Dict[str, float]] = list(samples or [])
+
+    def predict(self, metrics: ScadMetrics) -> float:
+        features = metrics.features()
+        return self.coefficients.get('constant', 0) + sum(self.coefficients.get(k, 0) * v for k, v in features.items())
+
+    def add_sample(self, metrics: ScadMetrics, seconds):
+        self.samples.append({**metrics.features(), 'seconds': float(seconds)})
+
+    def fit(self):
+        """
+        Fits the coefficients to the samples by least squares, without negative coefficients.
+        Needs at least one more sample than there are features, otherwise the coefficients are unchanged.
+        """
+        if len(self.samples) <= len(FEATURES):
+            return self.coefficients
+        a = np.array([[1.0] + [sample[name] for name in FEATURES] for sample in self.samples])
+        b = np.array([sample['seconds'] for sample in self.samples])
+        # drop negative terms one at a time, they mean a feature doesn't explain render time here
+        active = list(range(a.shape[1]))
+        while True:
+            solution, *_ = np.linalg.lstsq(a[:, active], b, rcond=None)
+            if np.all(solution >= 0) or len(active) == 1:
+                break
+            del active[int(np.argmin(solution))]
+        values = np.zeros(a.shape[1])
+        values[active] = np.maximum(solution, 0)
+        self.coefficients = dict(zip(('constant',) + FEATURES, values.tolist()))
+        return self.coefficients
+
+    def save(self, file_name):
+        Path(file_name).write_text(json.dumps({'coefficients': self.coefficients, 'samples': self.samples}, indent=1))
+
+    @staticmethod
+    def load(file_name):
+        data = json.loads(Path(file_name).read_text())
+        return RenderCostModel(data.get('coefficients'), data.get('samples'))
+
+
+class CostReport:
+    """Predicted render cost of a part, and the sub-assemblies that contribute the most"""
+    def __init__(self, metrics: ScadMetrics, seconds, budget, offenders):
+        self.metrics = metrics
+        self.seconds = seconds
+        self.budget = budget
+        # (path, predicted seconds, ScadMetrics), most expensive first
+        self.offenders: List[Tuple[str, float, ScadMetrics]] = offenders
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.seconds > self.budget
+
+    def __repr__(self):
+        budget = f' of a {self.budget:.1f}s budget' if self.budget is not None else ''
+        lines = [f'predicted render time {self.seconds:.1f}s{budget}', f'  {self.metrics}']
+        for path, seconds, metrics in self.offenders:
+            lines.append(f'  {seconds:8.1f}s  {path}  ({metrics.nodes} nodes, {metrics.facets} facets)')
+        return '\n'.join(lines)
+
+
+def _sub_parts(part: Part):
+    """Every part below part with its path of part names or indexes"""
+    if isinstance(part, Assembly):
+        yield from part.walk()
+
+
+def estimate(part: Part, budget=None, model: RenderCostModel = None, limit=5) -> CostReport:
+    """
+    Predicts how long OpenSCAD will take to render part.
+    Warns with a RenderBudgetWarning if the prediction is over budget seconds.
+
+    :param limit: number of the most expensive sub-assemblies to report
+    """
+    model = model if model is not None else RenderCostModel()
+    metrics = analyze(part.solid())
+    offenders = []
+    for path, child in _sub_parts(part):
+        child_metrics = analyze(child.solid())
+        offenders.append(('/'.join(map(str, path)), model.predict(child_metrics), child_metrics))
+    offenders.sort(key=lambda offender: -offender[1])
+
+    report = CostReport(metrics, model.predict(metrics), budget, offenders[:limit])
+    if report.over_budget:
+        worst = ', '.join(f'{path} ({seconds:.1f}s)' for path, seconds, _ in report.offenders)
+        warnings.warn(f'predicted render time of {report.seconds:.1f}s is over the {budget:.1f}s budget. '
+                      f'Most expensive parts: {worst}', RenderBudgetWarning, stacklevel=2)
+    return report
@@ -0,0 +1,124 @@
+import hashlib
+from pathlib import Path
+
+import solid as sl
+from solid.solidpython import non_rendered_classes, indent
+
+from . import resolution
+
+# Renders a SolidPython tree with every repeated subtree written once as an OpenSCAD module.
+# Identical sockets and keycaps show up dozens of times in a keyboard. Emitting them as modules
+# shrinks the .scad file, and lets OpenSCAD reuse its CSG cache for each instance.
+
+
+class ModuleReport:
+    """Summary of how much of a tree was deduplicated into modules"""
+    def __init__(self, nodes_inlined, nodes_emitted, modules, instances):
+        # number of nodes the tree would have if every subtree was inlined
+        self.nodes_inlined = nodes_inlined
+        # number of nodes actually written, including module definitions and calls
+        self.nodes_emitted = nodes_emitted
+        # number of distinct modules defined
+        self.modules = modules
+        # number of times a module is instantiated
+        self.instances = instances
+
+    @property
+    def ratio(self):
+        return self.nodes_inlined / max(self.nodes_emitted, 1)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}: {self.nodes_inlined} nodes -> {self.nodes_emitted} nodes "
+                f"({self.ratio:.1f}x), {self.modules} modules, {self.instances} instances")
+
+
+class _ModuleRenderer:
+    def __init__(self, root: sl.OpenSCADObject, min_nodes=3):
+        # subtrees with fewer nodes than this are always inlined
+        self._min_nodes = min_nodes
+        # structural hash and node count of each object, by id. Objects may be shared in the tree
+        self._hashes = {}
+        self._sizes = {}
+        # number of times each distinct subtree is referenced by a distinct parent.
+        # Subtrees that only repeat because their parent repeats are inlined in the parent's module
+        self._references = {}
+        # module definitions by hash, in the order they were defined
+        self._modules = {}
+        self._instances = 0
+        self._emitted = 0
+
+        self._hash(root)
+        self._count_references(root, set())
+        self._root = root
+
+    def _hash(self, obj):
+        if id(obj) not in self._hashes:
+            child_hashes = [self._hash(child) for child in obj.children]
+            digest = hashlib.sha1(obj._render_str_no_children().encode())
+            for child_hash in child_hashes:
+                digest.update(child_hash.encode())
+            self._hashes[id(obj)] = digest.hexdigest()
+            self._sizes[id(obj)] = 1 + sum(self._sizes[id(child)] for child in obj.children)
+        return self._hashes[id(obj)]
+
+    def _count_references(self, obj, visited):
+        obj_hash = self._hashes[id(obj)]
+        if obj_hash in visited:
+            return
+        visited.add(obj_hash)
+        for child in obj.children:
+            child_hash = self._hashes[id(child)]
+            self._references[child_hash] = self._references.get(child_hash, 0) + 1
+            self._count_references(child, visited)
+
+    @staticmethod
+    def _module_name(obj_hash):
+        return 'keebgen_' + obj_hash[:12]
+
+    def _render(self, obj, allow_module=True):
+        obj_hash = self._hashes[id(obj)]
+        if allow_module and self._references.get(obj_hash, 0) > 1 and self._sizes[id(obj)] >= self._min_nodes:
+            if obj_hash not in self._modules:
+                # reserve the name before rendering the body, nested modules are defined after it
+                self._modules[obj_hash] = None
+                body = self._render(obj, allow_module=False)
+                self._modules[obj_hash] = f"\nmodule {self._module_name(obj_hash)}() {{{indent(body)}\n}}"
+            self._instances += 1
+            self._emitted += 1
+            return f"\n{self._module_name(obj_hash)}();"
+
+        s = ''.join(self._render(child) for child in obj.children)
+        if obj.name in non_rendered_classes:
+            return s
+        self._emitted += 1
+        if not obj.children:
+            return obj._render_str_no_children() + ";"
+        return obj._render_str_no_children() + " {" + indent(s) + "\n}"
+
+    def render(self, file_header=''):
+        body = self._render(self._root)
+        if file_header and not file_header.endswith('\n'):
+            file_header += '\n'
+        return file_header + ''.join(self._modules.values()) + '\n' + body
+
+    def report(self):
+        return ModuleReport(self._sizes[id(self._root)], self._emitted, len(self._modules), self._instances)
+
+
+def scad_render_with_modules(solid: sl.OpenSCADObject, min_nodes=3, file_header=''):
+    """
+    Renders the solid to OpenSCAD code, emitting repeated subtrees as modules.
+
+    :param min_nodes: subtrees with fewer nodes than this are inlined even if they repeat
+    :return: (scad code, ModuleReport)
+    """
+    renderer = _ModuleRenderer(solid, min_nodes)
+    return renderer.render(file_header), renderer.report()
+
+
+def scad_render_to_file_with_modules(solid: sl.OpenSCADObject, file_name, min_nodes=3) -> ModuleReport:
+    renderer = _ModuleRenderer(solid, min_nodes)
+    code = renderer.render(resolution.file_header())
+    report = renderer.report()
+    Path(file_name).write_text(f"// Generated by keebgen\n// {report}\n" + code)
+    return report
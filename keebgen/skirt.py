@@ -1,167 +1,189 @@
 import numpy as np
-from .geometry_utils import deg2rad, rad2deg
-from .better_abc import abstractmethod
-from .geometry_base import Assembly, LabeledPoint, AnchorCollection, PartCollection, CuboidAnchorCollection
+import solid as sl
+from .geometry_utils import deg2rad, convex_hull_2D
+from .geometry_base import (Part, Assembly, LabeledPoint, AnchorCollection, PartCollection, CuboidAnchorCollection,
+                            Recipe)
 from .connector import Connector
-from .geometry_utils import unit_vector, vector_angle_2D
-import numpy as np
-import copy
+from .mesh_backend import Mesh
+from .config import SkirtConfig, WALL_MODES
+
+
+# rows of the (num segments, 7, 3) array of segment points, in order of top, middle, bottom
+_SHARED, _WALL_START, _TOP_EXTENSION, _MID_OUTER, _MID_INNER, _BOTTOM_OUTER, _BOTTOM_INNER = range(7)
+_SEGMENT_LABELS = (('outside', 'top'), ('inside', 'top'), ('outside', 'top'), ('outside', 'middle'),
+                   ('inside', 'middle'), ('bottom', 'outside'), ('bottom', 'inside'))
+# the wall's cross section at each segment: over the top, down the outside, across the bottom and up the inside
+_PROFILE = (_SHARED, _TOP_EXTENSION, _MID_OUTER, _BOTTOM_OUTER, _BOTTOM_INNER, _MID_INNER, _WALL_START)
+
+class SweptWall(Part):
+    """
+    A single closed polyhedron through the profile of each skirt segment in order, and back to the first.
+    Use sweep() to build one, it returns None if the segments don't make a closed surface.
+    """
+    def __init__(self, vertices, faces, anchors: AnchorCollection):
+        super().__init__()
+        self._solid = Recipe(lambda: sl.polyhedron(vertices.tolist(), faces.tolist()))
+        self._anchors = anchors
+
+    @staticmethod
+    def sweep(points, anchors: AnchorCollection):
+        """
+        points is the (num segments, 7, 3) array of segment points.
+        The quads between neighbouring profiles are split into triangles, with points that are in more than one
+        segment merged, and the faces that collapse because of it dropped. The wall must not cross itself,
+        which isn't checked.
+        """
+        rings = points[:, _PROFILE]
+        index = np.arange(rings.shape[0] * rings.shape[1]).reshape(rings.shape[:2])
+        # corners of each quad, around the profile and on to the next segment
+        a = index
+        b = np.roll(index, -1, axis=1)
+        c = np.roll(b, -1, axis=0)
+        d = np.roll(a, -1, axis=0)
+        faces = np.concatenate((np.stack((a, b, c), axis=2), np.stack((a, c, d), axis=2))).reshape((-1, 3))
+
+        vertices, merged = np.unique(rings.reshape((-1, 3)), axis=0, return_inverse=True)
+        faces = merged.reshape(-1)[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+
+        mesh = Mesh(vertices, faces)
+        if mesh.is_empty() or not mesh.is_closed():
+            return None
+        # OpenSCAD expects faces to be clockwise when looking at the exterior, which has a negative volume
+        volume = mesh.volume()
+        if volume == 0:
+            return None
+        if volume > 0:
+            faces = faces[:, ::-1]
+        return SweptWall(vertices, faces, anchors)
+
 
 class FlaredSkirt(Assembly):
     # edge pairs in the format of (top_edge, outer_edge),
     # where each edge is made of two anchor points
     # edges will be connected consecutively and last will connect to first
+    # config option wall_mode is one of WALL_MODES:
+    #   hull: two Connector hulls between each pair of neighbouring segments
+    #   sweep: one SweptWall polyhedron through all segments. Falls back to hull if the segments
+    #          don't make a closed surface
     def __init__(self, edge_pairs, config):
         super().__init__()
 
-        self._thickness = config.getfloat('wall_thickness')
-        self._flare_len = config.getfloat('flare_len')
-        self._flare_angle = config.getfloat('flare_angle')
+        config = SkirtConfig.load(config)
+        self._thickness = config.wall_thickness
+        self._flare_len = config.flare_len
+        self._flare_angle = config.flare_angle
+        self._wall_mode = config.wall_mode
 
-        segments = []
-        for edge_pair in edge_pairs:
-            # make sure pair is a pair
-            assert(len(edge_pair) == 2)
-            segments.append(self._make_skirt_segment(edge_pair[0], edge_pair[1]))
+        # make sure each pair is a pair
+        assert all(len(edge_pair) == 2 for edge_pair in edge_pairs)
+        top_edges = np.array([[p.coords for p in edge_pair[0]] for edge_pair in edge_pairs], dtype=float)
+        outer_edges = np.array([[p.coords for p in edge_pair[1]] for edge_pair in edge_pairs], dtype=float)
+        points = self._make_skirt_segments(top_edges, outer_edges)
 
         #now need to work around each segment so the base is a convex hull
         # move the bottom of the skirt segment out to match the convex hull perrimeter
         # the vertical segment above will come with it
         # direction of motion is in the direction of the vector made by bottom inside and bottom outside nodes
 
-        # find the most -x edge to start with
-        furthest_left_val = 1000000000000000.0
-        furtheset_left_index = -1
-        for (index, segment) in enumerate(segments):
-            new_val = segment['bottom', 'outside']
-            assert len(new_val) == 1
-            val = new_val.coords[0][0]
-            if val < furthest_left_val:
-                furthest_left_val = val
-                furthest_left_index = index
-
-        #now re-order the list so the furthest left index is the 0 index
-        segments = segments[furthest_left_index:] + segments[:furthest_left_index]
-
-        #now, work clockwise around the base
-        prev_point = segments[0]['bottom', 'outside']
-        #prev_dir = (0.,-1.) # previous vector as of now is pointing straight down
-
-        # make a 2D point out of the x,y coord of bottom outside corner of the segment
-        def make_point(seg):
-            seg = seg['bottom', 'outside']
-            assert len(seg) == 1
-            return seg.coords[0][:2]
-
-        def point_angles(prev_point, cur_point, next_point):
-            vec1 = [prev_point[0]-cur_point[0], prev_point[1]-cur_point[1]]
-            vec2 = [next_point[0]-cur_point[0], next_point[1]-cur_point[1]]
-            # always return -pi to pi
-            return vector_angle_2D(vec1, vec2)
-
-        # use gift-wrapping method to find 2D convex hull of the skirt base
-
-        # use the previous segment as an imaginary segment straight down from the current point
-        hull_segment_indexes = [0]
-        prev_point = make_point(segments[0])
-        prev_point = [prev_point[0], prev_point[1]-10]
-
-        while True:
-            cur_point = make_point(segments[hull_segment_indexes[-1]])
-            largest_angle = point_angles(prev_point, cur_point, make_point(segments[hull_segment_indexes[0]]))
-            largest_index = 0
-            #loop over all remaining points
-            for (next_index, next_segment) in enumerate(segments[hull_segment_indexes[-1]+1:], hull_segment_indexes[-1]+1):
-                angle = point_angles(prev_point, cur_point, make_point(next_segment))
-                if angle > largest_angle:
-                    largest_angle = angle
-                    largest_index = next_index
-
-            # once there are no larger angles than the starting angle, we have wrapped around the entire hull
-            if largest_index == 0:
-                break
-
-            hull_segment_indexes.append(largest_index)
-            prev_point = cur_point
-
-
-        # we now have a list of the segment indexes that make up the convex hull
-        # of the footprint of the skirts
+        # re-order the segments so the one furthest in -x is first
+        points = np.roll(points, -np.argmin(points[:, _BOTTOM_OUTER, 0]), axis=0)
+
+        # the segments go clockwise around the base, so the hull points in order of their index
+        # are the hull of the skirt base, clockwise, starting at the first segment
+        hull = convex_hull_2D(points[:, _BOTTOM_OUTER, :2])
+        assert hull is not None, 'the skirt base has no area'
+        hull_segment_indexes = np.sort(hull)
+        assert hull_segment_indexes[0] == 0
+
         # work around the skirt segments and move concave corners so they are inline with
-        # the calculated hull points
-
-        for list_index in range(0, len(hull_segment_indexes)):
-            segments_start_index = hull_segment_indexes[list_index-1]
-            segments_end_index = hull_segment_indexes[list_index]
-            # don't do anything if there are no segments between the start and end
-            if segments_end_index - segments_start_index == 1:
-                continue
-
-            # find the first and last segment in the run
-            start_segment = segments[segments_start_index]
-            end_segment = segments[segments_end_index]
-
-            start_p = make_point(start_segment)
-            end_p = make_point(end_segment)
-
-            # this redefines the start and end index for the situation where there are
-            # skirt points after the final convex hull point, before wrapping to the start
-            if list_index == 0:
-                segments_start_index = hull_segment_indexes[list_index-1]
-                segments_end_index = len(segments)-1
-
-            # modify any internal segments between the two hull segments
-            for index in range(segments_start_index, segments_end_index):
-                out_p = segments[index]['bottom', 'outside'].coords[0][:2]
-                in_p = segments[index]['bottom', 'inside'].coords[0][:2]
-
-                # calculate the intersection of the inside/outside point line vs the convex hull line
-                # from the wikipedia line intersection page
-                # https://en.wikipedia.org/wiki/Line%E2%80%93line_intersection
-                # eliminates divide by zero issues when calculating slope
-                denom = (start_p[0]-end_p[0])*(out_p[1]-in_p[1]) - (start_p[1]-end_p[1])*(out_p[0]-in_p[0])
-                if denom == 0:
-                    # this case only happens when lines are parallel. It may be desireable later to
-                    # remove the assert and just let it continue without modification
-                    assert(denom != 0)
-                    continue
-
-                x_intersect = ((start_p[0]*end_p[1]-start_p[1]*end_p[0])*(out_p[0]-in_p[0]) - (start_p[0]-end_p[0])*(out_p[0]*in_p[1]-out_p[1]*in_p[0])) / denom
-                y_intersect = ((start_p[0]*end_p[1]-start_p[1]*end_p[0])*(out_p[1]-in_p[1]) - (start_p[1]-end_p[1])*(out_p[0]*in_p[1]-out_p[1]*in_p[0])) / denom
-
-                # motion distances for inside walls that aren't going all the way to the intersect
-                move_x = x_intersect - out_p[0]
-                move_y = y_intersect - out_p[1]
-
-                # move the outside segment to the hull border
-                segments[index]['bottom','outside'].coords[0][0] = x_intersect
-                segments[index]['bottom','outside'].coords[0][1] = y_intersect
-                segments[index]['middle','outside'].coords[0][0] = x_intersect
-                segments[index]['middle','outside'].coords[0][1] = y_intersect
-
-                segments[index]['bottom','inside'].coords[0][0] += move_x
-                segments[index]['bottom','inside'].coords[0][1] += move_y
-                segments[index]['middle','inside'].coords[0][0] += move_x
-                segments[index]['middle','inside'].coords[0][1] += move_y
+        # the hull line between the hull points before and after them.
+        # each run of segments starts at a hull point, which is moved onto its own hull line first,
+        # and the rest of the run is moved onto the line through the start point's new position.
+        # the run from the last hull point back to the first is moved first, as the run before it ends on it,
+        # and it stops short of the last segment
+        self._snap_runs(points, [np.arange(hull_segment_indexes[-1], len(points) - 1)], [0])
+
+        starts, ends = hull_segment_indexes[:-1], hull_segment_indexes[1:]
+        # don't do anything if there are no segments between the start and end
+        keep = ends - starts != 1
+        self._snap_runs(points, [np.arange(s, e) for s, e in zip(starts[keep], ends[keep])], ends[keep])
+
+        segments = [AnchorCollection(LabeledPoint(p, labels) for p, labels in zip(segment, _SEGMENT_LABELS))
+                    for segment in points]
 
         self._parts = PartCollection()
+        self._anchors = CuboidAnchorCollection.create()
+        if self._wall_mode == 'sweep':
+            wall = SweptWall.sweep(points, sum(segments[1:], segments[0]))
+            if wall is not None:
+                self._parts.add(wall, 'wall')
+                return
+
         prev_segment = segments[-1]
 
         for segment in segments:
             self._parts.add(Connector(segment['top'] + segment['middle'] + prev_segment['top'] + prev_segment['middle']))
             self._parts.add(Connector(segment['middle'] + segment['bottom'] + prev_segment['middle'] + prev_segment['bottom']))
-            self._anchors = CuboidAnchorCollection.create()
             prev_segment = segment
 
-
-    def _same_anchor(self, anchor1, anchor2):
-        for coord1, coord2 in zip(anchor1.coords, anchor2.coords):
-            if coord1 != coord2:
-                return False
-        return True
-
-    # two edges actually made up of three points
-    def _make_skirt_segment(self, top_edge, outer_edge):
+    @staticmethod
+    def _snap_runs(points, runs, end_indexes):
+        """
+        Moves the bottom of the segments in each run onto the hull line from its first segment to its end segment.
+        runs is a list of arrays of segment indexes, each starting with a hull segment
+        """
+        runs = [(run, end) for run, end in zip(runs, end_indexes) if len(run)]
+        if not runs:
+            return
+        runs, end_indexes = zip(*runs)
+        lengths = np.array([len(run) for run in runs])
+        firsts = np.cumsum(lengths) - lengths
+        indexes = np.concatenate(runs)
+        starts = np.repeat([run[0] for run in runs], lengths)
+        # the end points are read before anything moves, a run may end on the start of the next one
+        end_p = points[np.repeat(end_indexes, lengths), _BOTTOM_OUTER, :2]
+
+        # the start of each run is moved first, then the rest of the run is moved onto the line
+        # from the start's new position
+        FlaredSkirt._snap(points, indexes[firsts], points[indexes[firsts], _BOTTOM_OUTER, :2], end_p[firsts])
+        rest = np.ones(len(indexes), dtype=bool)
+        rest[firsts] = False
+        FlaredSkirt._snap(points, indexes[rest], points[starts[rest], _BOTTOM_OUTER, :2], end_p[rest])
+
+    @staticmethod
+    def _snap(points, indexes, start_p, end_p):
+        """Moves the bottom of segments to where the line through their inside and outside points meets start_p->end_p"""
+        if len(indexes) == 0:
+            return
+        out_p = points[indexes, _BOTTOM_OUTER, :2]
+        in_p = points[indexes, _BOTTOM_INNER, :2]
+
+        # calculate the intersection of the inside/outside point line vs the convex hull line
+        # from the wikipedia line intersection page
+        # https://en.wikipedia.org/wiki/Line%E2%80%93line_intersection
+        # eliminates divide by zero issues when calculating slope
+        denom = (start_p[:, 0]-end_p[:, 0])*(out_p[:, 1]-in_p[:, 1]) - (start_p[:, 1]-end_p[:, 1])*(out_p[:, 0]-in_p[:, 0])
+        # this only happens when lines are parallel
+        assert np.all(denom != 0)
+
+        hull_cross = start_p[:, 0]*end_p[:, 1] - start_p[:, 1]*end_p[:, 0]
+        segment_cross = out_p[:, 0]*in_p[:, 1] - out_p[:, 1]*in_p[:, 0]
+        x_intersect = (hull_cross*(out_p[:, 0]-in_p[:, 0]) - (start_p[:, 0]-end_p[:, 0])*segment_cross) / denom
+        y_intersect = (hull_cross*(out_p[:, 1]-in_p[:, 1]) - (start_p[:, 1]-end_p[:, 1])*segment_cross) / denom
+        intersect = np.stack((x_intersect, y_intersect), axis=1)
+
+        # motion distances for inside walls that aren't going all the way to the intersect
+        move = intersect - out_p
+
+        # move the outside segment to the hull border, the inside moves with it
+        points[indexes, _BOTTOM_OUTER, :2] = intersect
+        points[indexes, _MID_OUTER, :2] = intersect
+        points[indexes, _BOTTOM_INNER, :2] += move
+        points[indexes, _MID_INNER, :2] += move
+
+    # each pair of edges is actually made up of three points
+    def _make_skirt_segments(self, top_edges, outer_edges):
     # known limitation: top edge and outer edge are assumed to be perpendicular
     # it will work without this, but the thickness dimensions may not be correct
         '''
@@ -171,76 +193,66 @@ class FlaredSkirt(Assembly):
         --------|
 
 
-        --------|---\
-                |    \
-        --------|     \ sloping wall
-                 \     \
-                  \    |
+        --------|---\\
+                |    \\
+        --------|     \\ sloping wall
+                 \\     \\
+                  \\    |
                   |    |
                   |    | vertical wall to xy plane
                   |_ __|
+
+        top_edges and outer_edges are (num segments, 2, 3) arrays of the points of each edge.
+        Returns a (num segments, 7, 3) array of the points of each segment, labeled by _SEGMENT_LABELS
         '''
         # make sure there are only 2 points in each edge
-        assert len(top_edge) == 2
-        assert len(outer_edge) == 2
-
-        # identify each corner
-        shared_point = None
-        bottom_point = None
-        back_point = None
-        for top_point in top_edge:
-            for outer_point in outer_edge:
-                if self._same_anchor(top_point, outer_point):
-                    point_check = top_point
-                    shared_point = np.array(top_point.coords)
-                    break
-        for top_point in top_edge:
-            if not self._same_anchor(top_point, point_check):
-                back_point = np.array(top_point.coords)
-                break
-        for outer_point in outer_edge:
-            if not self._same_anchor(outer_point, point_check):
-                bottom_point = np.array(outer_point.coords)
-                break
-
-        # make sure all assigned. Will fail if two identical edges provided as input
-        assert len(shared_point) == 3
-        assert len(bottom_point) == 3
-        assert len(back_point) == 3
+        assert top_edges.shape[1:] == (2, 3)
+        assert outer_edges.shape[1:] == (2, 3)
+        rows = np.arange(len(top_edges))
+
+        # identify each corner. The shared point is the last top point that is also an outer point
+        shared = np.all(top_edges[:, :, None] == outer_edges[:, None, :], axis=3).any(axis=2)
+        # will fail if the edges don't share a point
+        assert np.all(shared.any(axis=1))
+        shared_point = top_edges[rows, np.where(shared[:, 1], 1, 0)]
+        not_top_shared = np.any(top_edges != shared_point[:, None], axis=2)
+        not_outer_shared = np.any(outer_edges != shared_point[:, None], axis=2)
+        # will fail if two identical edges provided as input
+        assert np.all(not_top_shared.any(axis=1)) and np.all(not_outer_shared.any(axis=1))
+        back_point = top_edges[rows, np.argmax(not_top_shared, axis=1)]
+        bottom_point = outer_edges[rows, np.argmax(not_outer_shared, axis=1)]
 
         # unit vector pointing out, in line with the top edge
-        top_dir = unit_vector(back_point, shared_point)
+        top_dir = _unit_vectors(shared_point - back_point)
         # unit vector pointing down, in line with the outer edge
-        front_dir = unit_vector(shared_point, bottom_point)
+        front_dir = _unit_vectors(bottom_point - shared_point)
 
         alpha = deg2rad(90 - self._flare_angle) / 2
         u = self._thickness * np.tan(alpha)
 
         wall_start_point = front_dir*self._thickness+shared_point
         top_extension_point = top_dir*u+shared_point
-        ret_points = [LabeledPoint(shared_point, ('outside', 'top')),
-                      LabeledPoint(wall_start_point, ('inside', 'top')),
-                      LabeledPoint(top_extension_point, ('outside', 'top'))]
 
-        flare_dir = unit_vector((0,0,0), top_dir*np.sin(deg2rad(self._flare_angle)) +
-                                         front_dir*np.cos(deg2rad(self._flare_angle)))
+        flare_dir = _unit_vectors(top_dir*np.sin(deg2rad(self._flare_angle)) +
+                                  front_dir*np.cos(deg2rad(self._flare_angle)))
 
-        beta = np.arccos(np.dot(flare_dir,(0,0,-1))) / 2
+        beta = np.arccos(-flare_dir[:, 2]) / 2
         v = self._thickness * np.tan(beta)
 
-        mid_outer_corner = top_extension_point + (u + v + self._flare_len)*flare_dir
+        mid_outer_corner = top_extension_point + (u + v + self._flare_len)[:, None]*flare_dir
         mid_inner_corner = wall_start_point + self._flare_len*flare_dir
 
-        ret_points.append(LabeledPoint(mid_outer_corner, ('outside', 'middle')))
-        ret_points.append(LabeledPoint(mid_inner_corner, ('inside', 'middle')))
+        bottom_outer_corner = mid_outer_corner.copy()
+        bottom_outer_corner[:, 2] = 0.0
+        bottom_inner_corner = mid_inner_corner.copy()
+        bottom_inner_corner[:, 2] = 0.0
 
-        bottom_outer_corner = copy.deepcopy(mid_outer_corner)
-        bottom_outer_corner[2] = 0.0
-        ret_points.append(LabeledPoint(bottom_outer_corner, ('bottom', 'outside')))
+        # a plane of segments in order of top, middle, bottom
+        return np.stack((shared_point, wall_start_point, top_extension_point, mid_outer_corner, mid_inner_corner,
+                         bottom_outer_corner, bottom_inner_corner), axis=1)
 
-        bottom_inner_corner = copy.deepcopy(mid_inner_corner)
-        bottom_inner_corner[2] = 0.0
-        ret_points.append(LabeledPoint(bottom_inner_corner, ('bottom', 'inside')))
 
-        # return a plane of segments in order of top, middle, bottom
-        return AnchorCollection(ret_points)
+def _unit_vectors(vectors):
+    # lengths as a stack of dot products, which rounds the same as norm() of each vector
+    lengths = np.sqrt(vectors[:, None, :] @ vectors[:, :, None])[:, 0]
+    return vectors / lengths
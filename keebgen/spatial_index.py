@@ -0,0 +1,126 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .geometry_base import Assembly, LabeledPoint
+
+# KD-tree over the anchors of every part in an assembly, for finding nearby anchors without
+# walking the parts by hand.
+#
+#   index = keyboard.spatial_index()
+#   i = index.closest(point, ('top', 'front'), exclude='3/r2/socket')
+#   print(index.path(i), index.anchor(i))
+#
+# Anchors are numbered in the order of Assembly.walk(), and queries return those numbers.
+# Only parts that aren't assemblies are included, the anchors of assemblies are derived from their parts.
+# The index rebuilds itself when parts of its assembly were moved with translate(), rotate() or
+# multmatrix(), or parts were added, since it was built, see Part.generation. Changes to other
+# assemblies don't affect it. Anchors moved directly, without their part, aren't noticed.
+
+
+class SpatialIndex:
+    def __init__(self, assembly: Assembly):
+        self._assembly = assembly
+        self._generation = None
+        self.refresh()
+
+    def refresh(self) -> SpatialIndex:
+        """Rebuilds the index if the assembly changed since it was built"""
+        if self._generation == self._assembly.generation:
+            return self
+        paths = []
+        points = []
+        labels = []
+        for path, part in self._assembly.walk():
+            if isinstance(part, Assembly) or part.anchors is None or len(part.anchors) == 0:
+                continue
+            paths.append('/'.join(map(str, path)))
+            points.append(part.anchors.array)
+            labels += part.anchors.labels
+        self._paths = paths
+        self._points = np.concatenate(points) if points else np.zeros((0, 3))
+        self._part_ids = np.repeat(np.arange(len(points)), [len(p) for p in points])
+        self._labels = labels
+
+        # trees of the anchors with each set of labels that was queried
+        self._trees = {}
+        self._generation = self._assembly.generation
+        return self
+
+    def _tree(self, labels: Iterable[str]):
+        """The KD-tree of the anchors that have all labels, and the anchor number of each of its points"""
+        labels = frozenset((labels,) if isinstance(labels, str) else labels)
+        if labels not in self._trees:
+            from scipy.spatial import cKDTree
+            members = np.array([i for i, point_labels in enumerate(self._labels) if labels <= point_labels],
+                               dtype=int)
+            self._trees[labels] = (cKDTree(self._points[members].reshape((-1, 3))), members)
+        return self._trees[labels]
+
+    def __len__(self):
+        self.refresh()
+        return len(self._points)
+
+    @property
+    def points(self) -> np.ndarray:
+        """(N,3) array of the coordinates of every anchor"""
+        self.refresh()
+        return self._points
+
+    def path(self, i) -> str:
+        """The path of the part anchor i belongs to, e.g. '3/r2/socket'"""
+        return self._paths[self._part_ids[i]]
+
+    def labels(self, i) -> frozenset:
+        return self._labels[i]
+
+    def anchor(self, i) -> LabeledPoint:
+        """A copy of anchor i"""
+        return LabeledPoint(self._points[i], self._labels[i])
+
+    def within(self, point, radius, labels=()) -> np.ndarray:
+        """Numbers of the anchors with all labels within radius of point, closest first"""
+        self.refresh()
+        tree, members = self._tree(labels)
+        found = np.array(tree.query_ball_point(np.asarray(point, dtype=float), radius), dtype=int)
+        distances = np.linalg.norm(tree.data[found] - point, axis=1)
+        return members[found[np.argsort(distances, kind='stable')]]
+
+    def nearest(self, point, k=1, labels=()) -> np.ndarray:
+        """Numbers of the k anchors with all labels closest to point, closest first. Fewer if there aren't k"""
+        self.refresh()
+        tree, members = self._tree(labels)
+        k = min(k, len(members))
+        if k == 0:
+            return np.array((), dtype=int)
+        _, found = tree.query(np.asarray(point, dtype=float), k=[i + 1 for i in range(k)])
+        return members[found]
+
+    def closest(self, point, labels=(), exclude: Optional[str] = None) -> Optional[int]:
+        """
+        Number of the anchor with all labels closest to point, that is not on the part with the path
+        exclude, or any part below it. None if there is no such anchor.
+        """
+        self.refresh()
+        _, members = self._tree(labels)
+        k = 8
+        while True:
+            found = self.nearest(point, k, labels)
+            for i in found:
+                path = self.path(i)
+                if exclude is None or not (path == exclude or path.startswith(exclude + '/')):
+                    return int(i)
+            if len(found) == len(members):
+                return None
+            k *= 4
+
+    def pairs_within(self, radius, labels=()) -> np.ndarray:
+        """(N,2) array of the numbers of every pair of anchors with all labels within radius, on different parts"""
+        self.refresh()
+        tree, members = self._tree(labels)
+        pairs = members[tree.query_pairs(radius, output_type='ndarray')].reshape((-1, 2))
+        return pairs[self._part_ids[pairs[:, 0]] != self._part_ids[pairs[:, 1]]]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}: {len(self._points)} anchors on {len(self._paths)} parts'
@@ -0,0 +1,342 @@
+import argparse
+import configparser
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import solid as sl
+
+from .geometry_base import Assembly
+from . import resolution
+from .keyboard import DactylManuform
+
+# Builds many variants of a keyboard config in a process pool.
+# Each variant is a set of overrides on a base config, keyed as "section.option", for example
+# "column.key_gap" or "keyboard.column_2_y_offset". Variants are written to <out_dir>/variants and
+# a line of metrics is appended to <out_dir>/metrics.jsonl as each one finishes, so a sweep that
+# is stopped can be resumed by running it again with the same out_dir.
+#
+#   python -m keebgen.sweep out --param keyboard.column_4_radius=45:55:5 --param column.key_side_lean=0,5
+#
+# [column] options that DactylManuform.column_tuning sets for every column, like radius, have no
+# effect and are rejected. Variants that still come out identical are reported with a
+# DuplicateVariantWarning.
+#
+# Each worker process keeps its own key prototype cache between variants, and mesh formats can
+# share a RenderCache directory between all workers. Every worker builds with the sweep's resolution
+# profile, whatever the process start method.
+
+FORMATS = ('scad', 'stl', 'off')
+
+# metrics written to metrics.csv, in order, after the variant id and its overrides
+_CSV_METRICS = ('build_seconds', 'write_seconds', 'parts', 'file_bytes', 'size_x', 'size_y', 'size_z',
+                'triangles', 'volume', 'error')
+
+
+def parse_values(text: str) -> List[str]:
+    """
+    Parses the values of a sweep parameter. Either a comma separated list, "0,2.5,5", or an
+    inclusive range, "start:stop:step"
+    """
+    if text.count(':') == 2:
+        start, stop, step = (float(x) for x in text.split(':'))
+        if step <= 0:
+            raise ValueError(f'range step must be positive: "{text}"')
+        num = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return [repr(round(start + i * step, 9)) for i in range(num)]
+    return [x.strip() for x in text.split(',') if x.strip()]
+
+
+def expand_grid(params: Dict[str, Sequence]) -> List[Dict[str, str]]:
+    """Every combination of the given values, as a list of overrides"""
+    keys = list(params)
+    return [{key: str(value) for key, value in zip(keys, values)}
+            for values in itertools.product(*(params[key] for key in keys))]
+
+
+def load_manifest(file_name) -> List[Dict[str, str]]:
+    """
+    Reads variants from a json file. It can be a list of overrides, or an object with "params",
+    a grid of values to expand, and/or "variants", a list of overrides.
+    """
+    manifest = json.loads(Path(file_name).read_text())
+    if isinstance(manifest, list):
+        manifest = {'variants': manifest}
+    variants = expand_grid(manifest.get('params', {})) if manifest.get('params') else []
+    variants += [{key: str(value) for key, value in v.items()} for v in manifest.get('variants', [])]
+    return variants
+
+
+class DuplicateVariantWarning(UserWarning):
+    pass
+
+
+def shadowed_options(overrides: Dict[str, str]) -> List[str]:
+    """Overrides of [column] options that DactylManuform.column_tuning sets for every column"""
+    tuned = set.intersection(*(set(tuning) for tuning in DactylManuform.column_tuning))
+    return sorted(key for key in overrides if key.startswith('column.') and key.partition('.')[2] in tuned)
+
+
+def _check_shadowed(overrides: Dict[str, str]):
+    shadowed = shadowed_options(overrides)
+    if shadowed:
+        option = shadowed[0].partition('.')[2]
+        raise ValueError(f'overrides with no effect: {", ".join(shadowed)}. DactylManuform.column_tuning sets '
+                         f'them for every column, override them per column instead, e.g. keyboard.column_4_{option}')
+
+
+def _sections(config) -> Dict[str, Dict[str, str]]:
+    """A ConfigParser, or a dict of sections, as a dict of sections"""
+    if isinstance(config, configparser.ConfigParser):
+        return {name: dict(section) for name, section in config.items() if name != 'DEFAULT'}
+    return config
+
+
+def variant_id(overrides: Dict[str, str], base_config=None, fmt='scad', profile=None) -> str:
+    """
+    A short name for a variant that depends on its overrides, the contents of the base config, the
+    output format and the resolution profile, the current one if it isn't given. A sweep resumed
+    with a different config, format or profile builds every variant again
+    """
+    profile = resolution.load(profile) if profile is not None else resolution.get_profile()
+    key = {'overrides': overrides, 'base': _sections(base_config or {}), 'format': fmt,
+           'resolution': profile.content_hash}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def apply_overrides(base_config: Dict[str, Dict[str, str]], overrides: Dict[str, str]) -> configparser.ConfigParser:
+    config = configparser.ConfigParser()
+    config.read_dict(base_config)
+    for key, value in overrides.items():
+        section, _, option = key.partition('.')
+        if not option:
+            raise ValueError(f'override "{key}" must be formatted as section.option')
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, option, str(value))
+    return config
+
+
+def _leaf_parts(part):
+    if isinstance(part, Assembly):
+        for child in part._parts:
+            yield from _leaf_parts(child)
+    else:
+        yield part
+
+
+def _write_atomic(out_file: Path, write):
+    """Calls write with a temporary path, then moves it to out_file, so partial files never exist"""
+    tmp = out_file.with_name(f'.{out_file.name}.{os.getpid()}.tmp')
+    try:
+        write(tmp)
+        os.replace(tmp, out_file)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def build_variant(base_config, overrides, out_file, fmt='scad', cache_dir=None, profile=None) -> dict:
+    """
+    Builds one variant, writes it to out_file and returns its metrics.
+    profile is the resolution profile to build with, the current one if it isn't given
+    """
+    if profile is not None:
+        with resolution.resolution(profile):
+            return build_variant(base_config, overrides, out_file, fmt, cache_dir)
+    _check_shadowed(overrides)
+    config = apply_overrides(base_config, overrides)
+    start = time.perf_counter()
+    keyboard = DactylManuform.from_config(config)
+    build_seconds = time.perf_counter() - start
+
+    parts = list(_leaf_parts(keyboard))
+    anchors = np.concatenate([p.anchors.array for p in parts if p.anchors is not None])
+    metrics = {'build_seconds': build_seconds, 'parts': len(parts)}
+    metrics.update(zip(('size_x', 'size_y', 'size_z'), (np.max(anchors, axis=0) - np.min(anchors, axis=0)).tolist()))
+
+    start = time.perf_counter()
+    out_file = Path(out_file)
+    if fmt == 'scad':
+        code = sl.scad_render(keyboard.solid(), file_header=resolution.file_header())
+        _write_atomic(out_file, lambda tmp: tmp.write_text(code))
+    else:
+        from .mesh_backend import MeshBackend
+        from .mesh_io import write_stl, write_off
+        cache = None
+        if cache_dir is not None:
+            from .render_cache import RenderCache
+            cache = RenderCache(cache_dir)
+        mesh = keyboard.mesh(MeshBackend(cache=cache))
+        writer = write_stl if fmt == 'stl' else write_off
+        _write_atomic(out_file, lambda tmp: writer(mesh, tmp))
+        metrics.update(triangles=len(mesh.faces), volume=float(mesh.volume()))
+    metrics['write_seconds'] = time.perf_counter() - start
+    metrics['file_bytes'] = out_file.stat().st_size
+    # variants with the same file are reported by run_sweep()
+    metrics['file_sha1'] = hashlib.sha1(out_file.read_bytes()).hexdigest()
+    return metrics
+
+
+def _build_variant_safely(*args):
+    try:
+        return build_variant(*args)
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def read_metrics(out_dir) -> Dict[str, dict]:
+    """The latest metrics of each variant in out_dir/metrics.jsonl, by variant id"""
+    metrics_file = Path(out_dir) / 'metrics.jsonl'
+    results = {}
+    if not metrics_file.exists():
+        return results
+    for line in metrics_file.read_text().splitlines():
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            # the last line may be cut short if a previous run was killed while writing it
+            continue
+        results[row['id']] = row
+    return results
+
+
+def write_metrics_table(rows: List[dict], file_name):
+    """Writes one row per variant, with a column per override and per metric"""
+    override_keys = sorted({key for row in rows for key in row['overrides']})
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id'] + override_keys + list(_CSV_METRICS))
+        for row in rows:
+            writer.writerow([row['id']] + [row['overrides'].get(k, '') for k in override_keys] +
+                            [_format_metric(row.get(m)) for m in _CSV_METRICS])
+
+
+def _format_metric(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f'{value:.6g}'
+    return value
+
+
+def run_sweep(base_config, variants: List[Dict[str, str]], out_dir, jobs=None, fmt='scad',
+              cache_dir=None, progress=None, profile=None) -> List[dict]:
+    """
+    Builds every variant in a process pool, skipping variants already completed in out_dir.
+    Raises a ValueError for overrides that have no effect, see shadowed_options(), and warns with a
+    DuplicateVariantWarning if variants are built to the same file.
+
+    :param base_config: a ConfigParser, or a dict of sections
+    :param variants: overrides for each variant, see apply_overrides()
+    :param jobs: number of worker processes, defaults to the number of cpus
+    :param fmt: one of FORMATS. Mesh formats use the mesh backend, which requires manifold3d
+    :param cache_dir: RenderCache directory shared by all workers, for mesh formats
+    :param progress: called with the metrics row of each variant as it finishes
+    :param profile: the resolution profile, or its name, to build every variant with. The current one if None
+    :return: the metrics row of every variant, in the order given
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown format "{fmt}", expected one of {FORMATS}')
+    for overrides in variants:
+        _check_shadowed(overrides)
+    base_config = _sections(base_config)
+    # passed to the workers, which don't share the current profile with this process
+    profile = resolution.load(profile) if profile is not None else resolution.get_profile()
+    out_dir = Path(out_dir)
+    (out_dir / 'variants').mkdir(parents=True, exist_ok=True)
+
+    by_id = {variant_id(v, base_config, fmt, profile): v for v in variants}
+    done = {i: row for i, row in read_metrics(out_dir).items()
+            if 'error' not in row and row['file'].endswith(f'.{fmt}') and (out_dir / row['file']).exists()}
+    todo = [i for i in by_id if i not in done]
+
+    with open(out_dir / 'metrics.jsonl', 'a') as metrics_file, \
+            ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        futures = {}
+        for i in todo:
+            out_file = Path('variants') / f'{i}.{fmt}'
+            futures[pool.submit(_build_variant_safely, base_config, by_id[i], out_dir / out_file, fmt,
+                                cache_dir, profile)] = (i, out_file)
+        for future in as_completed(futures):
+            i, out_file = futures[future]
+            row = {'id': i, 'overrides': by_id[i], 'file': out_file.as_posix(), **future.result()}
+            # one complete line per variant, written as soon as it finishes
+            metrics_file.write(json.dumps(row) + '\n')
+            metrics_file.flush()
+            os.fsync(metrics_file.fileno())
+            done[i] = row
+            if progress is not None:
+                progress(row)
+
+    rows = [done[i] for i in by_id if i in done]
+    write_metrics_table(rows, out_dir / 'metrics.csv')
+    same_file = {}
+    for row in rows:
+        if 'file_sha1' in row:
+            same_file.setdefault(row['file_sha1'], []).append(row['id'])
+    for ids in same_file.values():
+        if len(ids) > 1:
+            warnings.warn(f'variants {", ".join(ids)} were built to the same file, their overrides have no effect',
+                          DuplicateVariantWarning)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m keebgen.sweep',
+                                     description='Builds every variant of a keyboard config in parallel.')
+    parser.add_argument('out_dir', help='where variants and metrics are written. Rerun with the same '
+                                        'directory to resume a sweep')
+    parser.add_argument('--config', default='default_config.ini', help='base config file')
+    parser.add_argument('--param', action='append', default=[], metavar='SECTION.OPTION=VALUES',
+                        help='values to sweep, as a comma separated list or start:stop:step. '
+                             'Every combination of all params is built')
+    parser.add_argument('--manifest', help='json file of variants, see load_manifest()')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--format', choices=FORMATS, default='scad')
+    parser.add_argument('--cache-dir', default=None, help='shared render cache for mesh formats')
+    parser.add_argument('--resolution', choices=list(resolution.PROFILES), default='final',
+                        help='resolution profile to build every variant with')
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    if not config.read(args.config):
+        parser.error(f'could not read config "{args.config}"')
+
+    params = {}
+    for param in args.param:
+        key, _, values = param.partition('=')
+        if not values:
+            parser.error(f'--param must be formatted as section.option=values, got "{param}"')
+        params[key] = parse_values(values)
+    variants = expand_grid(params) if params else []
+    if args.manifest:
+        variants += load_manifest(args.manifest)
+    if not variants:
+        variants = [{}]
+
+    def progress(row):
+        status = row.get('error') or f"built in {row['build_seconds']:.2f}s"
+        print(f"{row['id']} {row['overrides']} {status}")
+
+    try:
+        rows = run_sweep(config, variants, args.out_dir, args.jobs, args.format, args.cache_dir, progress,
+                         args.resolution)
+    except ValueError as e:
+        parser.error(str(e))
+    failed = [row for row in rows if 'error' in row]
+    print(f'{len(rows) - len(failed)} of {len(variants)} variants built, metrics in '
+          f'{Path(args.out_dir) / "metrics.csv"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
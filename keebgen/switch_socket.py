@@ -1,7 +1,9 @@
 import solid as sl
 from pathlib import Path
 
-from keebgen.geometry_base import Part, CuboidAnchorCollection
+from keebgen.geometry_base import Part, CuboidAnchorCollection, Recipe
+from keebgen.config import SocketConfig
+from keebgen import resolution
 
 # when adding new sockets, the top of the socket should be coplanar with the X,Y plane
 # when the switch is installed, the keycap mounting feature should align with the Z axis
@@ -9,19 +11,34 @@ from keebgen.geometry_base import Part, CuboidAnchorCollection
 class CherryMXSocket(Part):
     def __init__(self, config, u=1):
         super().__init__()
+        config = SocketConfig.load(config)
         # determines how much flat space to reserve around the switch
         # prevents interference between keycap and other geometry
-        width = config.getfloat('overall_width') + (u-1) * 19.0
-        length = config.getfloat('overall_length')
+        width = config.overall_width + (u-1) * 19.0
+        length = config.overall_length
         # changes how tight of a fit the switch is in the opening
-        switch_length = config.getfloat('switch_opening_length')  ## Was 14.1, then 14.25
-        switch_width = config.getfloat('switch_opening_width')
+        switch_length = config.switch_opening_length  ## Was 14.1, then 14.25
+        switch_width = config.switch_opening_width
         # plate thickness for where the switch plugs in
-        thickness = config.getfloat('plate_thickness')
+        thickness = config.plate_thickness
         # if using hot swap PCB's. This is not currently implemented
-        add_hot_swap = config.getboolean('hot_swap')
-        add_side_nubs = config.getboolean('side_nubs')
+        add_hot_swap = config.hot_swap
+        add_side_nubs = config.side_nubs
 
+        # add hot swap socket
+        # TODO, configure for different hot swap socket types
+        if add_hot_swap:
+            #TODO: fix the hot swap socket. currently not parameterized
+            # missing the stl file in this repo
+            raise NotImplemented('hot swap sockets are not yet implemented')
+
+        self._solid = Recipe(self._make_solid, width, length, switch_width, switch_length, thickness,
+                             add_side_nubs, add_hot_swap)
+        self._anchors = CuboidAnchorCollection.create(dims=(width, length, thickness),
+                                                      offset=(0, 0, -thickness/2))
+
+    @staticmethod
+    def _make_solid(width, length, switch_width, switch_length, thickness, add_side_nubs, add_hot_swap):
         # parameters not pulled from config file
         # most people should not need to modify these
         side_nub_width = 2.75
@@ -35,7 +52,8 @@ class CherryMXSocket(Part):
 
         # tapered side nub that stabilizes the switch, goes in right wall
         if add_side_nubs:
-            side_nub = sl.cylinder(side_nub_radius, side_nub_width, segments=20, center=True)
+            side_nub = sl.cylinder(side_nub_radius, side_nub_width, center=True,
+                                   segments=resolution.get_profile().side_nub_segments or None)
             side_nub = sl.rotate(90, [1, 0, 0])(side_nub)
             side_nub = sl.translate([switch_width/2, 0, side_nub_radius-thickness])(side_nub)
             nub_cube_len = (width - switch_width)/2
@@ -45,17 +63,8 @@ class CherryMXSocket(Part):
 
             socket += side_nub + sl.rotate([0, 0, 180])(side_nub)
 
-        # add hot swap socket
-        # TODO, configure for different hot swap socket types
         if add_hot_swap:
-            #TODO: fix the hot swap socket. currently not parameterized
-            # missing the stl file in this repo
-            raise NotImplemented('hot swap sockets are not yet implemented')
-
             hot_swap_socket = sl.import_(Path.cwd().parent / "geometry" / "hot_swap_plate.stl")
             hot_swap_socket = sl.translate([0, 0, thickness - 5.25])(hot_swap_socket)
             socket = sl.union()(socket, hot_swap_socket)
-
-        self._solid = socket
-        self._anchors = CuboidAnchorCollection.create(dims=(width, length, thickness),
-                                                      offset=(0, 0, -thickness/2))
+        return socket
@@ -1,10 +1,12 @@
 from keebgen.better_abc import abstractmethod
 from .connector import Connector
-from .geometry_base import Assembly, PartCollection, CuboidAnchorCollection, Part, AnchorCollection, LabeledPoint
+from .geometry_base import (Assembly, PartCollection, CuboidAnchorCollection, Part, AnchorCollection, LabeledPoint,
+                            is_layout_only)
 from .key_assy import FaceAlignedKey, KeyAssy
 from . import geometry_utils as utils
 
 
+import copy
 import numpy as np
 
 from typing import List, Optional, Tuple
@@ -24,6 +26,15 @@ class ThumbCluster(Assembly):
     def __init__(self):
         super().__init__()
 
+    def copy(self):
+        new = super().copy()
+        # point the key grid at the copied keys
+        copies = {id(old): part for old, part in zip(self._parts, new._parts)}
+        new.key_grid = copy.copy(self.key_grid)
+        new.key_grid.grid = [[None if key is None else copies[id(key)] for key in row]
+                             for row in self.key_grid.grid]
+        return new
+
 
 
 
@@ -171,7 +182,7 @@ class DactylThumbCluster(ThumbCluster):
 
         def K(u=1.):
             """Convenience function for creating new keys"""
-            key = FaceAlignedKey(key_config, socket_config, r=1, u=u)
+            key = FaceAlignedKey.cached(key_config, socket_config, r=1, u=u)
             key.rotate(z=-90) # make the u>1 keys are vertical
             self._parts.add(key)
             return key
@@ -225,7 +236,7 @@ class ManuformThumbCluster(ThumbCluster):
 
         def K(u=1.):
             """Convenience function for creating new keys"""
-            key = FaceAlignedKey(key_config, socket_config, r=1, u=u)
+            key = FaceAlignedKey.cached(key_config, socket_config, r=1, u=u)
             key.rotate(z=-90) # make the u>1 keys are vertical
             self._parts.add(key)
             return key
@@ -271,8 +282,17 @@ class ManuformThumbCluster(ThumbCluster):
             front_right.anchors['front', 'right'])
 
 
-        # Connectors
+        # Connectors, left out of a layout. See geometry_base.layout_only()
+        if not is_layout_only():
+            self._add_connectors(keys)
+
+        self.skirt = None # TODO: Should this be done at the keyboard level?
+
+        # move the TC so the home key is in the center
+        offset = [-x for x in self.home_key.anchors.centroid()]
+        self.translate(*offset)
 
+    def _add_connectors(self, keys):
         # keys as a flat list
         keys_map = sum([x for x in keys], [])
         socket_map = [x.get_part('socket') for x in keys_map]
@@ -321,12 +341,6 @@ class ManuformThumbCluster(ThumbCluster):
         #     socket_map[3].anchors['right']
         # ))
 
-        self.skirt = None # TODO: Should this be done at the keyboard level?
-
-        # move the TC so the home key is in the center
-        offset = [-x for x in self.home_key.anchors.centroid()]
-        self.translate(*offset)
-
     @property
     def home_key(self):
         x,y = self._home_key_idx
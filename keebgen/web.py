@@ -0,0 +1,230 @@
+from collections import defaultdict, deque
+from typing import List, Sequence
+
+import numpy as np
+
+from .connector import Connector
+from .geometry_base import AnchorCollection
+from .key_assy import KeyAssy
+
+# Builds the web of plate between groups of keys, like the columns of a keyboard and its thumb
+# cluster, instead of picking the anchors of each connector by hand.
+#
+#   connectors = make_web([column.keys() for column in columns] + [thumb_cluster.key_grid.keys()])
+#
+# The top corners of every socket are projected onto the plane that fits them best and
+# triangulated in one pass. The sides of the sockets are forced into the triangulation, so no
+# triangle crosses a socket. Triangles that only join keys of one group (groups connect their own
+# keys), or that reach further than max_gap across a gap, are dropped. The remaining triangles are merged
+# into convex pieces, and each piece becomes one Connector through the top and bottom corners of
+# the sockets it touches.
+
+# corners of the top face of a socket, in order around it
+_CORNERS = (('left', 'front'), ('right', 'front'), ('right', 'back'), ('left', 'back'))
+
+
+def socket_corners(keys: Sequence[KeyAssy]):
+    """(num keys, 4, 3) arrays of the top and the bottom corners of each key's socket, in the order of _CORNERS"""
+    top = np.zeros((len(keys), 4, 3))
+    bottom = np.zeros((len(keys), 4, 3))
+    for k, key in enumerate(keys):
+        anchors = key.anchors_by_part('socket')
+        for c, corner in enumerate(_CORNERS):
+            top[k, c] = anchors[('top',) + corner].array[0]
+            bottom[k, c] = anchors[('bottom',) + corner].array[0]
+    return top, bottom
+
+
+def _project(points):
+    """2D coordinates of points in the plane that fits them best"""
+    centered = points - np.mean(points, axis=0)
+    _, _, axes = np.linalg.svd(centered, full_matrices=False)
+    return centered @ axes[:2].T
+
+
+def _cross2(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def _crosses(points, edges, segment, tolerance=1e-9):
+    """mask of the (N,2) edges that cross the segment anywhere but at their ends"""
+    p, q = points[edges[:, 0]], points[edges[:, 1]]
+    a, b = points[segment[0]], points[segment[1]]
+    d1 = _cross2(b - a, p - a)
+    d2 = _cross2(b - a, q - a)
+    d3 = _cross2(q - p, a - p)
+    d4 = _cross2(q - p, b - p)
+    return (d1 * d2 < -tolerance) & (d3 * d4 < -tolerance)
+
+
+def _constrained_triangles(points, constraints, max_flips=10000) -> np.ndarray:
+    """
+    Delaunay triangulation of the 2D points that contains every (a, b) edge in constraints.
+    Edges that cross a missing constraint are flipped until it shows up (Sloan's method).
+    A constraint that can't be inserted, because it runs through a point or crosses another
+    constraint, is left out.
+    """
+    from scipy.spatial import Delaunay
+
+    # the third corner of the triangles on each side of an edge
+    thirds = defaultdict(set)
+
+    def edge(u, v):
+        return (u, v) if u < v else (v, u)
+
+    def add(u, v, w):
+        thirds[edge(u, v)].add(w)
+        thirds[edge(v, w)].add(u)
+        thirds[edge(w, u)].add(v)
+
+    def remove(u, v, w):
+        thirds[edge(u, v)].discard(w)
+        thirds[edge(v, w)].discard(u)
+        thirds[edge(w, u)].discard(v)
+
+    for triangle in Delaunay(points).simplices:
+        add(*triangle)
+
+    for a, b in constraints:
+        if thirds.get(edge(a, b)):
+            continue
+        edges = np.array([e for e, third in thirds.items() if third], dtype=int).reshape((-1, 2))
+        queue = deque(map(tuple, edges[_crosses(points, edges, (a, b))]))
+        flips = 0
+        while queue and flips < max_flips:
+            flips += 1
+            u, v = queue.popleft()
+            if len(thirds[(u, v)]) != 2:
+                continue
+            p, q = thirds[(u, v)]
+            # only a convex quad can be flipped, try again after its neighbours moved
+            if not _crosses(points, np.array([[p, q]]), (u, v))[0]:
+                queue.append((u, v))
+                continue
+            remove(u, v, p)
+            remove(u, v, q)
+            add(p, q, u)
+            add(p, q, v)
+            if _crosses(points, np.array([[p, q]]), (a, b))[0]:
+                queue.append(edge(p, q))
+
+    triangles = {tuple(sorted((u, v, w))) for (u, v), third in thirds.items() for w in third}
+    return np.array(sorted(triangles), dtype=int).reshape((-1, 3))
+
+
+def _inside(points, quads, tolerance=1e-9):
+    """(num points, num quads) mask of the 2D points that are strictly inside each convex quad"""
+    edges = np.roll(quads, -1, axis=1) - quads
+    to_points = points[:, None, None, :] - quads[None, :, :, :]
+    side = _cross2(edges[None], to_points)
+    return np.all(side > tolerance, axis=2) | np.all(side < -tolerance, axis=2)
+
+
+def web_triangles(top_corners, groups, max_gap=8.0) -> np.ndarray:
+    """
+    Triangulates the gaps between sockets.
+
+    :param top_corners: (num keys, 4, 3) top corners of each socket, see socket_corners()
+    :param groups: the group number of each key. Triangles between keys of one group are left out
+    :param max_gap: widest gap between sockets that is bridged, or one for each group. A triangle
+        can be as wide as the widest gap allowed by the groups of its keys
+    :return: (N,3) triangles of corner numbers, where corner c of key k is number 4 * k + c
+    """
+    top_corners = np.asarray(top_corners, dtype=float)
+    groups = np.asarray(groups)
+    max_gap = np.broadcast_to(np.asarray(max_gap, dtype=float), (np.max(groups) + 1,))
+    num_keys = len(top_corners)
+    points = _project(top_corners.reshape((-1, 3)))
+
+    sides = 4 * np.arange(num_keys)[:, None, None] + np.array([[0, 1], [1, 2], [2, 3], [3, 0]])
+    triangles = _constrained_triangles(points, sides.reshape((-1, 2)))
+    keys = triangles // 4
+
+    # triangles between sockets of one group are taken care of by the group
+    keep = ~((groups[keys[:, 0]] == groups[keys[:, 1]]) & (groups[keys[:, 1]] == groups[keys[:, 2]]))
+
+    # nothing is built over a socket, in case one of its sides couldn't be kept
+    corners = points[triangles]
+    keep &= ~np.any(_inside(np.mean(corners, axis=1), points.reshape((-1, 4, 2))), axis=1)
+
+    # a triangle in a gap has a corner on one side of the gap and an edge on the other. How far it
+    # reaches across the gap is the height of each corner whose group is alone in the triangle over
+    # the opposite edge. It's also no longer than a socket side plus the gap
+    corners = top_corners.reshape((-1, 3))[triangles]
+    opposite = np.roll(corners, -2, axis=1) - np.roll(corners, -1, axis=1)
+    lengths = np.linalg.norm(opposite, axis=2)
+    area2 = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    heights = area2[:, None] / np.maximum(lengths, 1e-12)
+    key_groups = groups[keys]
+    alone = (key_groups != np.roll(key_groups, -1, axis=1)) & (key_groups != np.roll(key_groups, -2, axis=1))
+    side = np.max(np.linalg.norm(top_corners - np.roll(top_corners, -1, axis=1), axis=2))
+    gap = np.max(max_gap[key_groups], axis=1)
+    keep &= (area2 > 1e-9) & (np.max(np.where(alone, heights, 0), axis=1) <= gap) & \
+            (np.max(lengths, axis=1) <= np.hypot(side, gap))
+    return triangles[keep]
+
+
+def _convex_pieces(triangles, points, top, flatness=0.5) -> List[np.ndarray]:
+    """
+    Greedily merges neighbouring triangles while their union stays convex, and its top corners
+    stay within flatness of a plane so a piece doesn't bulge over a curved column.
+    Returns the corner numbers of each piece.
+    """
+    from scipy.spatial import ConvexHull
+
+    def area(corners):
+        return ConvexHull(points[corners]).volume if len(corners) > 3 else \
+            abs(_cross2(*(points[corners[1:]] - points[corners[0]]))) / 2
+
+    def flat(corners):
+        centered = top[corners] - np.mean(top[corners], axis=0)
+        normal = np.linalg.svd(centered)[2][-1]
+        return np.max(np.abs(centered @ normal)) <= flatness
+
+    # triangles that share an edge
+    edges = defaultdict(list)
+    for t, triangle in enumerate(triangles):
+        for i in range(3):
+            edges[tuple(sorted((triangle[i], triangle[(i + 1) % 3])))].append(t)
+
+    piece_of = np.arange(len(triangles))
+    pieces = {t: (set(triangle), area(triangle)) for t, triangle in enumerate(triangles)}
+    for shared in edges.values():
+        if len(shared) != 2:
+            continue
+        a, b = (piece_of[t] for t in shared)
+        if a == b:
+            continue
+        corners = np.array(sorted(pieces[a][0] | pieces[b][0]))
+        total = pieces[a][1] + pieces[b][1]
+        # convex if the hull adds no area
+        if abs(area(corners) - total) <= 1e-6 * max(total, 1.0) and flat(corners):
+            pieces[a] = (set(corners), total)
+            piece_of[piece_of == b] = a
+            del pieces[b]
+    return [np.array(sorted(corners)) for corners, _ in pieces.values()]
+
+
+def make_web(groups: Sequence[Sequence[KeyAssy]], max_gap=8.0) -> List[Connector]:
+    """
+    Connectors that fill the gaps between the sockets of different groups of keys, see the top of this module.
+    Keys must be in place before the web is made. max_gap is the widest gap that is bridged, or one for each
+    group, see web_triangles()
+    """
+    keys = [key for group in groups for key in group]
+    if len(keys) < 2:
+        return []
+    group_numbers = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+    top, bottom = socket_corners(keys)
+    triangles = web_triangles(top, group_numbers, max_gap)
+    if not len(triangles):
+        return []
+
+    connectors = []
+    anchors = [key.anchors_by_part('socket') for key in keys]
+    points = _project(top.reshape((-1, 3)))
+    for corners in _convex_pieces(triangles, points, top.reshape((-1, 3))):
+        connectors.append(Connector(sum((anchors[c // 4][(face,) + _CORNERS[c % 4]]
+                                         for c in corners for face in ('top', 'bottom')),
+                                        AnchorCollection(()))))
+    return connectors
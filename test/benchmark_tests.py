@@ -0,0 +1,41 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from keebgen.benchmark import run_benchmarks, compare, append_history, load_history, BENCHMARKS
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run(self):
+        record = run_benchmarks(repeat=1, only=['anchor_queries', 'scad_serialize'])
+        self.assertEqual(set(record['results']), {'anchor_queries', 'scad_serialize'})
+        self.assertGreater(record['results']['scad_serialize']['scad_bytes'], 0)
+        self.assertLessEqual(record['results']['anchor_queries']['min'],
+                             record['results']['anchor_queries']['median'])
+        self.assertIn('dactyl_manuform_build', BENCHMARKS)
+        self.assertFalse(record['quick'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            history = Path(tmp) / 'history.json'
+            append_history(record, history)
+            append_history(record, history)
+            self.assertEqual(len(load_history(history)), 2)
+
+    def test_compare(self):
+        baseline = {'peak_rss_bytes': 100, 'results': {'a': {'min': 1.0, 'median': 1.0, 'repeat': 5, 'size': 10},
+                                                       'b': {'min': 2.0, 'median': 2.0, 'repeat': 5}}}
+        current = {'peak_rss_bytes': 105, 'results': {'a': {'min': 1.05, 'median': 3.0, 'repeat': 5, 'size': 20},
+                                                      'new': {'min': 1.0, 'median': 1.0, 'repeat': 5}}}
+        rows = {(name, metric): regressed for name, metric, _, _, _, regressed in compare(baseline, current)}
+        # medians aren't compared, and benchmarks missing from either run are skipped
+        self.assertEqual(rows, {('a', 'min'): False, ('a', 'size'): True, ('process', 'peak_rss_bytes'): False})
+        self.assertTrue(dict(((n, m), r) for n, m, _, _, _, r in compare(baseline, current, 0.01))[('a', 'min')])
+
+        # quick runs cut workloads down, so they aren't compared against full ones
+        with self.assertRaises(ValueError):
+            compare(baseline, dict(current, quick=True))
+        self.assertEqual(len(compare(dict(baseline, quick=True), dict(current, quick=True))), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
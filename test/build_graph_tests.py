@@ -0,0 +1,133 @@
+import unittest
+import configparser
+from pathlib import Path
+
+import solid as sl
+
+from keebgen.build_graph import BuildGraph
+from keebgen.keyboard import DactylManuform
+from keebgen.connector import Connector
+from keebgen.resolution import resolution
+from keebgen.thumb_cluster import ManuformThumbCluster
+
+
+class BuildGraphTest(unittest.TestCase):
+    def make_graph(self, config, calls):
+        def node(name, func):
+            def run(*args):
+                calls.append(name)
+                return func(*args)
+            return run
+
+        graph = BuildGraph()
+        graph.add('a', node('a', lambda: config['a']), inputs=config['a'])
+        graph.add('b', node('b', lambda: config['b']), inputs=config['b'])
+        graph.add('sum', node('sum', lambda a, b: a + b), deps=('a', 'b'))
+        graph.add('double_a', node('double_a', lambda a: 2 * a), deps=('a',))
+        return graph
+
+    def test_rebuild(self):
+        calls = []
+        first = self.make_graph({'a': 1, 'b': 2}, calls).build()
+        self.assertEqual((first['sum'], first['double_a']), (3, 2))
+        self.assertEqual(first.rebuilt, ['a', 'b', 'sum', 'double_a'])
+
+        calls.clear()
+        same = self.make_graph({'a': 1, 'b': 2}, calls).build(first)
+        self.assertEqual(calls, [])
+        self.assertEqual(same.reused, ['a', 'b', 'sum', 'double_a'])
+        self.assertEqual(same['sum'], 3)
+
+        # only nodes downstream of b are invalidated
+        second = self.make_graph({'a': 1, 'b': 5}, calls).build(same)
+        self.assertEqual(calls, ['b', 'sum'])
+        self.assertEqual(second.rebuilt, ['b', 'sum'])
+        self.assertEqual(second['sum'], 6)
+        self.assertIn('2 of 4 nodes rebuilt', second.summary())
+
+    def test_config_fingerprint(self):
+        # sections with the same values in a different order are the same input
+        config = configparser.ConfigParser()
+        config['x'] = {'one': '1', 'two': '2'}
+        config['y'] = {'two': '2', 'one': '1'}
+        calls = []
+        graph = BuildGraph()
+        graph.add('x', lambda: calls.append('x'), inputs=config['x'])
+        first = graph.build()
+        graph = BuildGraph()
+        graph.add('x', lambda: calls.append('x'), inputs=config['y'])
+        graph.build(first)
+        self.assertEqual(calls, ['x'])
+
+    def test_salt(self):
+        def make_graph(setting):
+            graph = BuildGraph(salt={'setting': setting})
+            graph.add('x', lambda: 1)
+            return graph
+
+        first = make_graph(1).build()
+        self.assertEqual(make_graph(1).build(first).rebuilt, [])
+        self.assertEqual(make_graph(2).build(first).rebuilt, ['x'])
+
+    def test_order(self):
+        graph = BuildGraph()
+        graph.add('a', lambda: 1)
+        with self.assertRaises(KeyError):
+            graph.add('b', lambda c: c, deps=('c',))
+        with self.assertRaises(KeyError):
+            graph.add('a', lambda: 2)
+
+
+class DactylManuformRebuildTest(unittest.TestCase):
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+
+    def build(self, previous=None):
+        c = self.config
+        return DactylManuform(c['keyboard'], c['column'], c['key_assy'], c['socket'], previous=previous)
+
+    def test_rebuild(self):
+        first = self.build()
+        self.assertEqual(first.build_result.reused, [])
+
+        # nothing changed
+        second = self.build(first)
+        self.assertEqual(second.build_result.rebuilt, [])
+        self.assertEqual(sl.scad_render(second.solid()), sl.scad_render(first.solid()))
+
+        # one column changed, its neighbours' connectors and the skirt follow
+        self.config['keyboard']['column_4_radius'] = '50.0'
+        third = self.build(second)
+        self.assertEqual(third.build_result.rebuilt,
+                         ['column_4', 'connectors_4', 'connectors_5', 'edge_pairs', 'skirt'])
+        self.assertIn('thumb_cluster', third.build_result.reused)
+        self.assertEqual(sl.scad_render(third.solid()), sl.scad_render(self.build().solid()))
+        # building the new keyboard didn't move any parts of the old one
+        self.assertEqual(sl.scad_render(second.solid()), sl.scad_render(first.solid()))
+
+    def test_global_settings(self):
+        first = self.build()
+        # nodes built with other global settings aren't reused
+        with resolution('draft'):
+            self.assertEqual(self.build(first).build_result.reused, [])
+        Connector.use_polyhedron = False
+        try:
+            hulls = self.build(first)
+        finally:
+            Connector.use_polyhedron = True
+        self.assertEqual(hulls.build_result.reused, [])
+        self.assertNotEqual(sl.scad_render(hulls.solid()), sl.scad_render(first.solid()))
+        # and the connectors built as hulls aren't reused once polyhedrons are back on
+        self.assertEqual(sl.scad_render(self.build(hulls).solid()), sl.scad_render(first.solid()))
+
+    def test_thumb_cluster_copy(self):
+        keyboard = self.build()
+        thumb_cluster = next(part for part in keyboard._parts if isinstance(part, ManuformThumbCluster))
+        keys = list(thumb_cluster._parts)
+        # the key grid of the placed thumb cluster refers to its own keys
+        self.assertTrue(all(any(key is k for k in keys) for key in thumb_cluster.key_grid.keys()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import configparser
+import time
+from pathlib import Path
+
+import numpy as np
+
+from keebgen.collision import OrientedBox, ConvexShape, BVH, box_penetration, find_collisions, find_keys, KEY_TRAVEL
+from keebgen.geometry_base import Assembly, PartCollection, CuboidAnchorCollection
+from keebgen.key_assy import SocketAlignedKey
+from keebgen.keyboard import DactylManuform
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+class KeyGrid(Assembly):
+    def __init__(self, config, rows, cols, pitch):
+        super().__init__()
+        self._parts = PartCollection()
+        for row in range(rows):
+            for col in range(cols):
+                key = SocketAlignedKey.cached(config['key_assy'], config['socket'], 3)
+                key.translate(col * pitch, row * pitch, 0)
+                self._parts.add(key, f'{row}_{col}')
+        self._anchors = CuboidAnchorCollection.create()
+
+
+def penetration(a: OrientedBox, b: OrientedBox):
+    return box_penetration(a.center[None], a.axes[None], a.half_extents[None],
+                           b.center[None], b.axes[None], b.half_extents[None])[0]
+
+
+class BoxTest(unittest.TestCase):
+    def test_boxes(self):
+        anchors = CuboidAnchorCollection.create(dims=(2, 2, 2))
+        anchors.rotate(0, 0, 30)
+        box = OrientedBox.from_anchors(anchors)
+        self.assertTrue(np.allclose(box.half_extents, 1))
+        self.assertTrue(np.allclose(box.axes[2], (0, 0, 1)))
+
+        other = OrientedBox.from_anchors(anchors)
+        other.center = other.center + box.axes[0] * 1.5
+        self.assertAlmostEqual(penetration(box, other), 0.5)
+        other.center = other.center + box.axes[0] * 1.0
+        self.assertAlmostEqual(penetration(box, other), -0.5)
+        self.assertAlmostEqual(box_penetration(box.center[None], box.axes[None], box.half_extents[None],
+                                               other.center[None], other.axes[None], other.half_extents[None],
+                                               clearance=1.0)[0], 0.5)
+
+        # a box corner pointing at a face, which the face axes alone can't separate
+        diamond = CuboidAnchorCollection.create(dims=(2, 2, 2))
+        diamond.rotate(45, 35.26439, 0)
+        diamond.translate(1 + np.sqrt(3) - 0.1, 0, 0)
+        self.assertGreater(penetration(box, OrientedBox.from_anchors(diamond)), 0)
+
+        # sweeping down the z axis
+        swept = box.swept(4)
+        self.assertTrue(np.allclose(swept.center, box.center - (0, 0, 2)))
+        self.assertTrue(np.allclose(swept.half_extents, (1, 1, 3)))
+
+        shape = ConvexShape(anchors.array)
+        moved = anchors.copy()
+        moved.translate(0, 0, 1.75)
+        self.assertAlmostEqual(shape.penetration(ConvexShape(moved.array)), 0.25)
+
+    def test_bvh(self):
+        rng = np.random.default_rng(0)
+        lower = rng.uniform(0, 100, (300, 3))
+        upper = lower + rng.uniform(0, 10, (300, 3))
+        bvh = BVH(lower, upper)
+        expected = {(i, j) for i in range(300) for j in range(i + 1, 300)
+                    if np.all(lower[i] <= upper[j]) and np.all(lower[j] <= upper[i])}
+        self.assertEqual({tuple(p) for p in bvh.overlapping_pairs()}, expected)
+        self.assertEqual(len(BVH(np.zeros((0, 3)), np.zeros((0, 3))).overlapping_pairs()), 0)
+
+
+class CollisionTest(unittest.TestCase):
+    def test_grid(self):
+        config = load_config()
+        grid = KeyGrid(config, 10, 12, 19.0)
+        self.assertEqual(len(find_keys(grid)), 120)
+        start = time.perf_counter()
+        self.assertEqual(find_collisions(grid, travel=KEY_TRAVEL), [])
+
+        # keycaps are 18mm wide at the bottom
+        grid = KeyGrid(config, 10, 12, 17.5)
+        collisions = find_collisions(grid, travel=KEY_TRAVEL, parts=('keycap',))
+        self.assertLess(time.perf_counter() - start, 1.0)
+        # every neighbouring and diagonal pair of keycaps
+        self.assertEqual(len(collisions), 10 * 11 + 12 * 9 + 2 * 9 * 11)
+        # the overlap is 0.5mm at the bottom, but the tapered sides separate in a little less
+        depths = np.array([c.depth for c in collisions])
+        self.assertTrue(np.all((depths > 0.4) & (depths <= 0.5 + 1e-9)))
+        # the sockets are 18mm wide too
+        parts = {(c.part_a, c.part_b) for c in find_collisions(grid)}
+        self.assertEqual(parts, {('keycap', 'keycap'), ('socket', 'socket')})
+        self.assertEqual(collisions[0].path_a.count('_'), 1)
+
+    def test_travel(self):
+        config = load_config()
+        grid = KeyGrid(config, 1, 2, 12.0)
+        keycap = grid.get_part('0_1').anchors_by_part('keycap')
+        # drop the second key so its keycap is 2mm below the bottom of the first
+        grid.get_part('0_1').translate(0, 0, -(np.max(keycap.array[:, 2]) - np.min(keycap.array[:, 2])) - 2)
+        self.assertEqual(find_collisions(grid, parts=('keycap',)), [])
+        self.assertEqual(len(find_collisions(grid, parts=('keycap',), clearance=2.5)), 1)
+        collisions = find_collisions(grid, travel=KEY_TRAVEL, parts=('keycap',))
+        self.assertEqual(len(collisions), 1)
+        self.assertGreater(collisions[0].depth, 0)
+        self.assertLessEqual(collisions[0].depth, KEY_TRAVEL - 2 + 1e-9)
+
+    def test_keyboard(self):
+        config = load_config()
+        keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+        self.assertEqual(find_collisions(keyboard, travel=KEY_TRAVEL), [])
+
+        config['column']['key_side_lean'] = '20'
+        keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+        collisions = find_collisions(keyboard)
+        self.assertGreater(len(collisions), 0)
+        self.assertTrue(all(c.path_a != c.path_b for c in collisions))
+        self.assertEqual([c.depth for c in collisions], sorted((c.depth for c in collisions), reverse=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import configparser
+from pathlib import Path
+
+from keebgen.config import (ColumnConfig, KeyboardConfig, SkirtConfig, SocketConfig, ThumbClusterConfig,
+                            KeebConfig, load_ini, to_parser)
+from keebgen.key_assy import KeyPrototypeCache, FaceAlignedKey
+from keebgen.keyboard import DactylManuform
+
+CONFIG_FILE = Path(__file__).resolve().parent.parent / 'default_config.ini'
+
+
+class ConfigTest(unittest.TestCase):
+    def test_load(self):
+        config = configparser.ConfigParser()
+        config.read(CONFIG_FILE)
+        configs = load_ini(config)
+        self.assertEqual(configs, KeebConfig())
+        self.assertEqual(configs, load_ini(CONFIG_FILE))
+        self.assertEqual(ColumnConfig.load(config['column']), configs.column)
+        self.assertIs(ColumnConfig.load(configs.column), configs.column)
+
+        # options are parsed the way ConfigParser does
+        column = ColumnConfig.from_section({'num_keys': '5', 'radius': '50', 'show_finger_wireframe': 'no'})
+        self.assertEqual((column.num_keys, column.radius, column.show_finger_wireframe), (5, 50.0, False))
+        thumb = ThumbClusterConfig.from_section({'rotation': '1, 2, 3'})
+        self.assertEqual(thumb.rotation, (1.0, 2.0, 3.0))
+
+        # and written back the same way
+        self.assertEqual(load_ini(to_parser(configs)), configs)
+        changed = KeebConfig(column=column, thumb_cluster=thumb)
+        self.assertEqual(load_ini(to_parser(changed)), changed)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            ColumnConfig.from_section({'radius': '-1'})
+        with self.assertRaises(ValueError):
+            ColumnConfig.from_section({'num_keys': 'four'})
+        with self.assertRaises(ValueError):
+            ColumnConfig(num_keys=3, home_index=3)
+        with self.assertRaises(ValueError):
+            SocketConfig(switch_opening_width=20.0)
+        with self.assertRaises(ValueError):
+            SkirtConfig(wall_mode='spline')
+        with self.assertRaises(ValueError):
+            ColumnConfig.from_section({'raduis': '50'})
+        with self.assertRaises(AttributeError):
+            ColumnConfig().radius = 50.0
+
+    def test_replace(self):
+        column = ColumnConfig()
+        self.assertEqual(column.replace(radius='50').radius, 50.0)
+        self.assertEqual(column.radius, 55.0)
+        self.assertIs(column.replace(), column)
+        with self.assertRaises(ValueError):
+            column.replace(home_index=10)
+
+    def test_content_hash(self):
+        column = ColumnConfig()
+        self.assertEqual(column.content_hash, ColumnConfig.from_section({'radius': '55'}).content_hash)
+        self.assertNotEqual(column.content_hash, column.replace(radius=50.0).content_hash)
+        self.assertEqual(len({column, ColumnConfig(), column.replace(radius=50.0)}), 2)
+        self.assertNotEqual(KeebConfig().content_hash, KeebConfig(column=column.replace(radius=50.0)).content_hash)
+
+        # equivalent configs share key prototypes
+        cache = KeyPrototypeCache()
+        cache.get(FaceAlignedKey, {'switch_type': 'cherry_mx'}, {'overall_width': '18'}, 1)
+        cache.get(FaceAlignedKey, {}, SocketConfig(), 1)
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+
+    def test_column_overrides(self):
+        keyboard = KeyboardConfig.from_section({'column_4_radius': '50', 'column_12_y_offset': '-3',
+                                                'web_mode': 'auto'})
+        self.assertEqual(keyboard.web_mode, 'auto')
+        self.assertEqual(keyboard.column_options(4), {'radius': '50'})
+        self.assertEqual(keyboard.column_options(12), {'y_offset': '-3'})
+        self.assertEqual(keyboard.column_options(0), {})
+        self.assertEqual(KeyboardConfig.from_section(keyboard.to_dict()), keyboard)
+        self.assertNotEqual(keyboard.content_hash, keyboard.replace(column_overrides=()).content_hash)
+
+    def test_keyboard(self):
+        configs = KeebConfig()
+        keyboard = DactylManuform.from_config(configs)
+        self.assertEqual(keyboard.get_part(4).get_part(0).anchors.array.shape, (8, 3))
+
+        # only the column whose config changed is built again
+        configs = KeebConfig(keyboard=KeyboardConfig(column_overrides=((4, 'radius', '50'),)))
+        rebuilt = DactylManuform.from_config(configs, previous=keyboard)
+        self.assertIn('column_4', rebuilt.build_result.rebuilt)
+        self.assertNotIn('column_3', rebuilt.build_result.rebuilt)
+        self.assertNotIn('thumb_cluster', rebuilt.build_result.rebuilt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
-from keebgen.geometry_base import CuboidAnchorCollection, Assembly, PartCollection, AnchorCollection
+from keebgen.geometry_base import CuboidAnchorCollection, Assembly, PartCollection, AnchorCollection, LabeledPoint
 from keebgen.connector import Connector
+from keebgen import geometry_utils as utils
 import copy
+import numpy as np
 
 # convenience function
 def anchors_equal(anchors1, anchors2):
@@ -43,6 +45,162 @@ class AnchorCollectionTests(unittest.TestCase):
         #                  (0, -8, 12), (12, 0, 8), (15, 12, 10), (0, 11, 10) ]
 
 
+    def test_array_transforms(self):
+        c = CuboidAnchorCollection.create(dims=(3, 5, 7), offset=(1, 2, 3))
+        points = [LabeledPoint(p.coords.copy(), p.labels) for p in c]
+
+        c.translate(4, 5, 6)
+        c.rotate(10, 20, 30)
+        for point in points:
+            point.translate(4, 5, 6)
+            point.rotate(10, 20, 30)
+
+        for point, anchor in zip(points, c):
+            self.assertEqual(point.labels, anchor.labels)
+            self.assertTrue(np.allclose(point.coords, anchor.coords))
+
+    def test_views_share_storage(self):
+        c = CuboidAnchorCollection.create()
+        top = c['top']
+        top_right = top['right']
+        self.assertEqual(len(top_right), 2)
+
+        # transforming a view moves the points in the original collection
+        top_right.translate(0, 0, 1)
+        self.assertTrue(np.allclose([p.coords[2] for p in c['top', 'right']], 1.5))
+        self.assertTrue(np.allclose([p.coords[2] for p in c['top', 'left']], 0.5))
+
+        # and the view sees changes made to the original collection
+        c.translate(1, 0, 0)
+        self.assertTrue(np.allclose([p.coords[0] for p in top_right], 1.5))
+
+        # modifying coords through a view writes to the original collection
+        top_right.coords[0][1] = 10
+        self.assertEqual(sum(p.coords[1] == 10 for p in c), 1)
+
+        # collections with different storage are copied when added
+        other = CuboidAnchorCollection.create()
+        combined = c['left'] + other['right']
+        combined.translate(100, 0, 0)
+        self.assertTrue(np.all(c.array[:, 0] < 100))
+
+
+    def test_label_queries(self):
+        c = CuboidAnchorCollection.create()
+        for labels in (['top'], ['top', 'front'], ['left', 'back', 'bottom'], []):
+            expected = [p.coords.tolist() for p in c if p.labels.issuperset(labels)]
+            self.assertEqual([p.coords.tolist() for p in c[labels]], expected)
+
+        self.assertEqual(len(c['top', 'bottom']), 0)
+        self.assertEqual(len(c['not_a_label']), 0)
+
+        # repeated queries are cached, and stay correct after transforms
+        self.assertIs(c['top', 'front'], c['front', 'top'])
+        c.rotate(0, 0, 90)
+        self.assertTrue(np.allclose(c['top', 'front'].array, [p.coords for p in c if {'top', 'front'} <= p.labels]))
+
+
+class GeometryUtilsTest(unittest.TestCase):
+    def test_rotate_points(self):
+        from scipy.spatial.transform import Rotation
+
+        rng = np.random.default_rng(0)
+        points = rng.uniform(-100, 100, (20, 3))
+        for eulers in rng.uniform(-360, 360, (50, 3)):
+            expected = Rotation.from_euler('xyz', eulers, degrees=True).apply(points)
+            self.assertTrue(np.allclose(utils.rotate_points(points, eulers), expected, rtol=0, atol=1e-9))
+            # single points are rotated the same way
+            self.assertTrue(np.allclose(utils.rotate_point(points[0], eulers), expected[0], rtol=0, atol=1e-9))
+            # radians
+            self.assertTrue(np.allclose(utils.rotate_points(points, np.deg2rad(eulers), degrees=False),
+                                        expected, rtol=0, atol=1e-9))
+
+    def test_translate_mean_bounds(self):
+        points = [[0, 0, 0], [2, 4, 6], [1, -2, 3]]
+        self.assertTrue(np.array_equal(utils.translate_points(points, (1, 1, 1)),
+                                       [[1, 1, 1], [3, 5, 7], [2, -1, 4]]))
+        self.assertTrue(np.array_equal(utils.mean_point(points), [1, 2 / 3, 3]))
+        self.assertTrue(np.array_equal(utils.bounds(points), [2, 6, 6]))
+
+    def test_convex_hull_2D(self):
+        # a square with a point inside and one on an edge
+        points = [[0, 0], [1, 0.5], [0.5, 0], [2, 0], [2, 2], [0, 2]]
+        hull = utils.convex_hull_2D(points)
+        self.assertEqual(sorted(hull), [0, 3, 4, 5])
+        # counter-clockwise
+        corners = np.array(points)[hull]
+        area = np.sum(corners[:, 0] * np.roll(corners[:, 1], -1) - np.roll(corners[:, 0], -1) * corners[:, 1])
+        self.assertGreater(area, 0)
+
+        self.assertIsNone(utils.convex_hull_2D([[0, 0], [1, 1]]))
+        self.assertIsNone(utils.convex_hull_2D([[0, 0], [1, 1], [3, 3]]))
+
+
+class KeyPrototypeCacheTest(unittest.TestCase):
+    def test_basic(self):
+        import configparser
+        from pathlib import Path
+        from keebgen.key_assy import FaceAlignedKey, KeyPrototypeCache
+
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        cache = KeyPrototypeCache(max_size=2)
+
+        key1 = FaceAlignedKey.cached(config['key_assy'], config['socket'], 1, cache=cache)
+        key2 = FaceAlignedKey.cached(config['key_assy'], config['socket'], 1, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # instances share geometry, but transform independently
+        self.assertIs(key1.get_part('socket')._solid, key2.get_part('socket')._solid)
+        key1.translate(10, 0, 0)
+        self.assertTrue(np.allclose(key1.anchors.array, key2.anchors.array + (10, 0, 0)))
+        self.assertTrue(np.allclose(key1.anchors_by_part('keycap').array,
+                                    key2.anchors_by_part('keycap').array + (10, 0, 0)))
+
+        # instances match a freshly built key
+        fresh = FaceAlignedKey(config['key_assy'], config['socket'], 1)
+        self.assertTrue(np.allclose(fresh.anchors.array, key2.anchors.array))
+
+        # least recently used prototypes are dropped
+        FaceAlignedKey.cached(config['key_assy'], config['socket'], 2, cache=cache)
+        FaceAlignedKey.cached(config['key_assy'], config['socket'], 3, cache=cache)
+        self.assertEqual(len(cache), 2)
+        FaceAlignedKey.cached(config['key_assy'], config['socket'], 1, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+
+class ConnectorHullTest(unittest.TestCase):
+    def test_polyhedron(self):
+        anchors = CuboidAnchorCollection.create(dims=(2, 3, 4))
+        anchors.rotate(10, 20, 30)
+        connector = Connector(anchors + CuboidAnchorCollection.create(dims=(1, 1, 1)))
+        solid = connector.solid()
+        self.assertEqual(solid.name, 'polyhedron')
+
+        # the interior points are dropped
+        vertices = np.array(solid.params['points'])
+        faces = np.array(solid.params['faces'])
+        self.assertEqual(len(vertices), 8)
+        self.assertTrue(np.allclose(np.sort(vertices, axis=0), np.sort(anchors.array, axis=0)))
+
+        # closed surface, V - E + F = 2
+        edges = {tuple(sorted((f[i], f[(i + 1) % 3]))) for f in faces for i in range(3)}
+        self.assertEqual(len(vertices) - len(edges) + len(faces), 2)
+
+        # faces are clockwise when looking at the exterior, so the normals point inwards
+        center = np.mean(vertices, axis=0)
+        a, b, c = (vertices[faces[:, i]] for i in range(3))
+        normals = np.cross(b - a, c - a)
+        self.assertTrue(np.all(np.einsum('ij,ij->i', normals, center - a) > 0))
+
+    def test_degenerate(self):
+        # coplanar and collinear points fall back to a hull of spheres
+        coplanar = CuboidAnchorCollection.create()['top']
+        self.assertEqual(Connector(coplanar).solid().name, 'hull')
+        collinear = CuboidAnchorCollection.create()['top', 'left']
+        self.assertEqual(Connector(collinear).solid().name, 'hull')
+
+
 class AnchorLinkTest(unittest.TestCase):
     def test_basic(self):
         cube_anchors = CuboidAnchorCollection.create()
@@ -163,5 +321,48 @@ class MultipleTranslationTest(unittest.TestCase):
         #TODO: need to make sure that an exported .scad file matches the expected shape
         # in current config, all three cubes are overlapping unit cubes
 
+class PartTransformTest(unittest.TestCase):
+    def test_single_multmatrix(self):
+        part = Connector(CuboidAnchorCollection.create())
+        part.translate(10, 20, 30)
+        part.rotate(15, 30, 45)
+        part.translate(-5, 0, 5)
+
+        # all transforms should be collapsed into a single node above the original solid
+        solid = part.solid()
+        self.assertEqual(solid.name, 'multmatrix')
+        self.assertEqual(solid.children[0].name, 'polyhedron')
+
+        # the accumulated transform should move the original corners onto the anchors
+        original = CuboidAnchorCollection.create()
+        for orig_point, point in zip(original, part.anchors):
+            moved = part.transform @ np.append(orig_point.coords, 1.)
+            self.assertTrue(np.allclose(moved[:3], point.coords))
+
+    def test_no_accumulation(self):
+        part = Connector(CuboidAnchorCollection.create())
+        part.accumulate_transforms = False
+        part.translate(10, 20, 30)
+        part.rotate(15, 30, 45)
+
+        solid = part.solid()
+        self.assertEqual(solid.name, 'rotate')
+        self.assertEqual(solid.children[0].name, 'translate')
+        self.assertTrue(np.array_equal(part.transform, np.eye(4)))
+
+    def test_matrix(self):
+        moved = Connector(CuboidAnchorCollection.create())
+        moved.translate(10, 20, 30)
+        moved.rotate(15, 30, 45)
+
+        # one multmatrix does the same as the translate and rotate
+        part = Connector(CuboidAnchorCollection.create())
+        part.multmatrix(utils.rotation_matrix((15, 30, 45)) @ utils.translation_matrix((10, 20, 30)))
+        self.assertTrue(np.allclose(part.transform, moved.transform))
+        self.assertTrue(np.allclose(part.anchors.array, moved.anchors.array))
+        self.assertTrue(np.allclose(utils.transform_points(CuboidAnchorCollection.create().array, part.transform),
+                                    part.anchors.array))
+
+
 if __name__ == '__main__':
     unittest.main()
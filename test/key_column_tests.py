@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from keebgen.key_column import ConcaveOrtholinearColumn, column_key_poses, key_edges
+from keebgen.key_assy import FaceAlignedKey
+from keebgen.config import ColumnConfig, KeyConfig, SocketConfig
+from keebgen import geometry_utils as utils
+
+
+def place_sequentially(config: ColumnConfig):
+    """Keys placed one transform at a time, the way columns used to be built"""
+    keys = []
+    for i in range(config.num_keys):
+        r = min(max(4-i + (config.home_index-1), 1), 4)
+        rotation_index = i - config.home_index
+        key = FaceAlignedKey.cached(KeyConfig(), SocketConfig(), r)
+        key.rotate(0, config.key_side_lean, 0)
+        key.translate(0, 0, -config.radius)
+        y_front = utils.mean_point(key.anchors['top', 'front'].array)[1]
+        y_back = utils.mean_point(key.anchors['top', 'back'].array)[1]
+        one_offset = np.arctan(abs(y_front)/config.radius) + np.arctan(abs(y_back)/config.radius) + \
+            2 * np.arctan(config.key_gap/(2*config.radius))
+        key.rotate(one_offset * rotation_index, 0, 0, degrees=False)
+        key.translate(0, 0, config.radius)
+        key.rotate(config.home_tiltback_angle, 0, 0)
+        keys.append(key)
+    return keys
+
+
+class ColumnPoseTest(unittest.TestCase):
+    configs = [ColumnConfig(),
+               ColumnConfig(key_side_lean=20, radius=56.4),
+               ColumnConfig(num_keys=5, home_index=2, radius=65.0, key_gap=3.0, home_tiltback_angle=10),
+               ColumnConfig(num_keys=3, home_index=0, key_side_lean=-20, radius=30.0)]
+
+    def test_placement(self):
+        for config in self.configs:
+            column = ConcaveOrtholinearColumn(config, KeyConfig(), SocketConfig())
+            for key, expected in zip(column.keys(), place_sequentially(config)):
+                for part in ('socket', 'keycap'):
+                    self.assertTrue(np.allclose(key.anchors_by_part(part).array, expected.anchors_by_part(part).array))
+                    self.assertTrue(np.allclose(key.get_part(part).transform, expected.get_part(part).transform))
+
+    def test_batch(self):
+        # unplaced keys of the rows of a default column
+        unplaced = [FaceAlignedKey.cached({}, {}, r) for r in (4, 3, 2, 1)]
+        front_y, back_y = key_edges(unplaced)
+        radius = np.array([[40.0, 55.0, 70.0], [45.0, 60.0, 90.0]])
+        lean = np.array([0.0, 0.0, -15.0])
+        poses = column_key_poses(4, 1, radius, 2.5, lean, 25.0, front_y, back_y)
+        self.assertEqual(poses.shape, (2, 3, 4, 4, 4))
+        for i, j in np.ndindex(radius.shape):
+            self.assertTrue(np.allclose(poses[i, j], column_key_poses(4, 1, radius[i, j], 2.5, lean[j], 25.0,
+                                                                      front_y, back_y)))
+
+        # the default column is in the batch
+        keys = ConcaveOrtholinearColumn(ColumnConfig(), {}, {}).keys()
+        for key, unplaced_key, pose in zip(keys, unplaced, poses[0, 1]):
+            self.assertTrue(np.allclose(utils.transform_points(unplaced_key.anchors.array, pose), key.anchors.array))
+
+if __name__ == '__main__':
+    unittest.main()
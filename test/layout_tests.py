@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+import solid as sl
+
+from keebgen.geometry_base import Part, Recipe, CuboidAnchorCollection, layout_only, is_layout_only
+from keebgen.keyboard import DactylManuform
+from keebgen.key_assy import FaceAlignedKey, KeyPrototypeCache
+from keebgen.connector import Connector
+from keebgen.config import KeebConfig, KeyConfig, SocketConfig
+
+
+class Cube(Part):
+    def __init__(self):
+        super().__init__()
+        self._solid = Recipe(sl.cube, 2)
+        self._anchors = CuboidAnchorCollection.create((2, 2, 2))
+
+
+class RecipeTest(unittest.TestCase):
+    def test_lazy(self):
+        cube = Cube()
+        recipe = cube._solid_source
+        self.assertFalse(recipe.built)
+        cube.translate(1, 0, 0)
+        copy = cube.copy()
+        self.assertFalse(recipe.built)
+
+        # copies share the solid
+        self.assertIs(cube.solid().children[0], copy.solid().children[0])
+        self.assertTrue(recipe.built)
+        self.assertEqual(sl.scad_render(cube.solid()), sl.scad_render(sl.multmatrix(cube.transform.tolist())(sl.cube(2))))
+
+        # recipes in args are built first
+        self.assertEqual(Recipe(sl.translate([1, 0, 0]), Recipe(sl.cube, 2))()._render_str_no_children(),
+                         sl.translate([1, 0, 0])._render_str_no_children())
+
+    def test_parts(self):
+        cache = KeyPrototypeCache()
+        key = cache.get(FaceAlignedKey, KeyConfig(), SocketConfig(), 1)
+        for part in ('socket', 'keycap'):
+            self.assertFalse(key.get_part(part)._solid_source.built)
+
+        # the connector's solid is made from where its anchors were when it was made
+        anchors = key.anchors_by_part('socket')['front']
+        connector = Connector(anchors)
+        key.translate(10, 0, 0)
+        self.assertFalse(connector._solid_source.built)
+        moved = Connector(anchors)
+        key.translate(-10, 0, 0)
+        self.assertEqual(sl.scad_render(connector.solid()), sl.scad_render(Connector(anchors).solid()))
+        self.assertNotEqual(sl.scad_render(connector.solid()), sl.scad_render(moved.solid()))
+
+    def test_abstract(self):
+        class NoSolid(Part):
+            def __init__(self):
+                self._anchors = CuboidAnchorCollection.create()
+
+        with self.assertRaises(NotImplementedError):
+            NoSolid()
+
+
+class LayoutTest(unittest.TestCase):
+    def test_keyboard(self):
+        configs = KeebConfig()
+        keyboard = DactylManuform.from_config(configs)
+        with layout_only():
+            self.assertTrue(is_layout_only())
+            layout = DactylManuform.from_config(configs, previous=keyboard)
+        self.assertFalse(is_layout_only())
+        self.assertTrue(layout.layout_only)
+
+        # a layout isn't reused for a full build, and the other way around
+        self.assertIn('column_0', layout.build_result.rebuilt)
+        self.assertNotIn('skirt', layout.build_result.values)
+        rebuilt = DactylManuform.from_config(configs, previous=layout)
+        self.assertIn('column_0', rebuilt.build_result.rebuilt)
+
+        # the keys are in the same place, without anything else
+        keys = [part for _, part in keyboard.walk() if isinstance(part, FaceAlignedKey)]
+        layout_keys = [part for _, part in layout.walk() if isinstance(part, FaceAlignedKey)]
+        self.assertEqual(len(layout_keys), len(keys))
+        for key, layout_key in zip(keys, layout_keys):
+            self.assertTrue(np.allclose(layout_key.anchors.array, key.anchors.array))
+        self.assertFalse(any(isinstance(part, Connector) for _, part in layout.walk()))
+        self.assertIsInstance(sl.scad_render(layout.solid()), str)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+import unittest
+import configparser
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import solid as sl
+
+from keebgen.geometry_base import CuboidAnchorCollection, LabeledPoint, AnchorCollection
+from keebgen.connector import Connector
+from keebgen.switch_socket import CherryMXSocket
+from keebgen.keycap import OEM
+from keebgen.skirt import FlaredSkirt
+
+try:
+    import manifold3d
+except ImportError:
+    manifold3d = None
+
+from keebgen.mesh_backend import Mesh, BooleanEngine, MeshBackend
+from keebgen.mesh_io import write_stl, write_off, read_stl
+
+if manifold3d is not None:
+    from keebgen.mesh_backend import solid_to_mesh
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+def openscad_volume(solid):
+    """Renders the solid with OpenSCAD and returns the volume of the exported stl"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scad = Path(tmp) / 'part.scad'
+        stl = Path(tmp) / 'part.stl'
+        scad.write_text(sl.scad_render(solid))
+        subprocess.run(['openscad', '-o', str(stl), '--export-format', 'asciistl', str(scad)],
+                       check=True, capture_output=True)
+        vertices = [[float(x) for x in line.split()[1:]]
+                    for line in stl.read_text().splitlines() if line.strip().startswith('vertex')]
+    triangles = np.array(vertices).reshape((-1, 3, 3))
+    return np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6.0
+
+
+def make_skirt():
+    corners = [LabeledPoint(p, l) for p, l in zip(
+        [(0, 0, 0), (10, 0, 0), (10, 10, 0), (0, 10, 0), (0, 0, 3), (10, 0, 3), (10, 10, 3), (0, 10, 3)],
+        [('bottom', 'left', 'back'), ('bottom', 'right', 'back'), ('bottom', 'right', 'front'),
+         ('bottom', 'left', 'front'), ('top', 'left', 'back'), ('top', 'right', 'back'),
+         ('top', 'right', 'front'), ('top', 'left', 'front')])]
+    cube = Connector(AnchorCollection(corners))
+    cube.translate(0, 0, 25)
+    a = cube.anchors
+    edge_pairs = ((a['top', 'left'], a['front', 'left']),
+                  (a['top', 'right'], a['front', 'right']),
+                  (a['top', 'front'], a['front', 'right']),
+                  (a['top', 'back'], a['back', 'right']),
+                  (a['top', 'right'], a['back', 'right']),
+                  (a['top', 'left'], a['back', 'left']),
+                  (a['top', 'back'], a['back', 'left']),
+                  (a['top', 'front'], a['front', 'left']))
+    config = configparser.ConfigParser()
+    config['skirt'] = {'wall_thickness': '2.0', 'flare_len': '4.0', 'flare_angle': '30.0'}
+    return FlaredSkirt(edge_pairs, config['skirt'])
+
+
+@unittest.skipIf(manifold3d is None, 'manifold3d is not installed')
+class MeshBackendTest(unittest.TestCase):
+    def check_mesh(self, mesh, part):
+        self.assertFalse(mesh.is_empty())
+        self.assertTrue(mesh.is_closed())
+        self.assertGreater(mesh.volume(), 0)
+        # the mesh should fit in the part's anchors
+        low, high = mesh.bounds()
+        anchors = part.anchors.array
+        self.assertTrue(np.all(low >= np.min(anchors, axis=0) - 1e-6))
+        self.assertTrue(np.all(high <= np.max(anchors, axis=0) + 1e-6))
+
+    def test_primitives(self):
+        cube = solid_to_mesh(sl.cube([1, 2, 3], center=True))
+        self.assertAlmostEqual(cube.volume(), 6)
+        self.assertTrue(cube.is_closed())
+
+        cylinder = solid_to_mesh(sl.cylinder(r=1, h=2, segments=6))
+        # hexagonal prism
+        self.assertAlmostEqual(cylinder.volume(), 3 * np.sqrt(3))
+
+        cone = solid_to_mesh(sl.cylinder(r1=1, r2=0, h=3, segments=4))
+        self.assertAlmostEqual(cone.volume(), 2)
+        self.assertTrue(cone.is_closed())
+
+        sphere = solid_to_mesh(sl.sphere(r=1, segments=30))
+        self.assertTrue(sphere.is_closed())
+        self.assertAlmostEqual(sphere.volume(), 4 / 3 * np.pi, delta=0.1)
+
+        moved = solid_to_mesh(sl.translate([1, 2, 3])(sl.rotate([0, 0, 90])(sl.cube(1))))
+        self.assertTrue(np.allclose(moved.bounds(), ([0, 2, 3], [1, 3, 4])))
+
+        difference = solid_to_mesh(sl.cube(2, center=True) - sl.cube(1, center=True))
+        self.assertAlmostEqual(difference.volume(), 7)
+
+        union = solid_to_mesh(sl.cube(1) + sl.translate([0.5, 0, 0])(sl.cube(1)))
+        self.assertAlmostEqual(union.volume(), 1.5)
+
+        # background parts are not exported
+        self.assertTrue(solid_to_mesh(sl.cube(1).set_modifier('%')).is_empty())
+
+    def test_socket(self):
+        config = load_config()
+        config['socket']['side_nubs'] = 'false'
+        socket = CherryMXSocket(config['socket'])
+        mesh = socket.mesh()
+        self.check_mesh(mesh, socket)
+        self.assertAlmostEqual(mesh.volume(), (18 * 18 - 14.4 * 14.4) * 4)
+
+        config['socket']['side_nubs'] = 'true'
+        socket_with_nubs = CherryMXSocket(config['socket'])
+        self.check_mesh(socket_with_nubs.mesh(), socket_with_nubs)
+        self.assertGreater(socket_with_nubs.mesh().volume(), mesh.volume())
+
+    def test_keycap(self):
+        keycap = OEM(3)
+        # keycaps are background parts, so check the underlying solid
+        mesh = solid_to_mesh(keycap._solid.copy().set_modifier(''))
+        self.check_mesh(mesh, keycap)
+
+        # the curved cut only removes material from the polyhedron
+        def walk(obj):
+            yield obj
+            for child in obj.children:
+                yield from walk(child)
+        polyhedron = next(x for x in walk(keycap._solid) if x.name == 'polyhedron')
+        self.assertLess(mesh.volume(), solid_to_mesh(polyhedron).volume())
+
+    def test_connector(self):
+        from scipy.spatial import ConvexHull
+        anchors = CuboidAnchorCollection.create(dims=(2, 3, 4))
+        anchors.rotate(10, 20, 30)
+        connector = Connector(anchors)
+        mesh = connector.mesh()
+        self.check_mesh(mesh, connector)
+        self.assertAlmostEqual(mesh.volume(), ConvexHull(anchors.array).volume)
+
+        # hull of spheres fallback
+        flat = Connector(CuboidAnchorCollection.create(dims=(2, 3, 4))['top'])
+        self.assertTrue(flat.mesh().is_closed())
+
+    def test_skirt(self):
+        skirt = make_skirt()
+        mesh = skirt.mesh()
+        self.assertTrue(mesh.is_closed())
+        self.assertGreater(mesh.volume(), 0)
+
+    @unittest.skipIf(shutil.which('openscad') is None, 'openscad is not installed')
+    def test_openscad_parity(self):
+        config = load_config()
+        anchors = CuboidAnchorCollection.create(dims=(2, 3, 4))
+        anchors.rotate(10, 20, 30)
+        keycap = OEM(2)
+        for solid in (CherryMXSocket(config['socket']).solid(),
+                      keycap._solid.copy().set_modifier(''),
+                      Connector(anchors).solid(),
+                      make_skirt().solid()):
+            self.assertAlmostEqual(solid_to_mesh(solid).volume(), openscad_volume(solid), delta=1e-3 * abs(openscad_volume(solid)))
+
+
+class BooleanEngineTest(unittest.TestCase):
+    def test_abstract(self):
+        class UnionOnly(BooleanEngine):
+            def union(self, meshes):
+                return Mesh.concatenate(meshes)
+
+        with self.assertRaises(TypeError):
+            BooleanEngine()
+        with self.assertRaises(TypeError):
+            UnionOnly()
+
+    def test_lazy(self):
+        # parts without boolean operations are meshed without manifold3d
+        backend = MeshBackend()
+        mesh = backend.evaluate(sl.translate([1, 0, 0])(sl.hull()(sl.cube(1), sl.sphere(r=1, segments=8))))
+        self.assertTrue(mesh.is_closed())
+        self.assertTrue(backend.evaluate(sl.difference()(sl.cube(2), sl.cube(1).set_modifier('%'))).is_closed())
+        self.assertIsNone(backend._engine)
+
+
+class MeshIOTest(unittest.TestCase):
+    def setUp(self):
+        # two tetrahedrons, no boolean engine required
+        tetra = Mesh([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]])
+        self.mesh = Mesh.concatenate([tetra, tetra.transform(np.diag([2., 2., 2., 1.]))])
+
+    def test_stl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            whole = Path(tmp) / 'whole.stl'
+            chunked = Path(tmp) / 'chunked.stl'
+            write_stl(self.mesh, whole)
+            write_stl(self.mesh, chunked, chunk_size=3)
+            self.assertEqual(whole.stat().st_size, 84 + 50 * len(self.mesh.faces))
+            self.assertEqual(whole.read_bytes(), chunked.read_bytes())
+
+            read = read_stl(whole)
+            self.assertEqual(len(read.faces), len(self.mesh.faces))
+            self.assertAlmostEqual(read.volume(), self.mesh.volume(), places=5)
+
+    def test_ascii_stl(self):
+        triangles = self.mesh.vertices[self.mesh.faces]
+        lines = ['solid test'] + [line for t in triangles for line in
+                                  ['facet normal 0 0 0', 'outer loop', *(f'vertex {x} {y} {z}' for x, y, z in t),
+                                   'endloop', 'endfacet']] + ['endsolid test']
+        with tempfile.TemporaryDirectory() as tmp:
+            stl = Path(tmp) / 'ascii.stl'
+            stl.write_text('\n'.join(lines))
+            read = read_stl(stl)
+        self.assertEqual(len(read.faces), len(self.mesh.faces))
+        self.assertAlmostEqual(read.volume(), self.mesh.volume())
+
+    def test_off(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            off = Path(tmp) / 'mesh.off'
+            write_off(self.mesh, off, chunk_size=3)
+            lines = off.read_text().splitlines()
+        self.assertEqual(lines[0], 'OFF')
+        self.assertEqual(lines[1], f'{len(self.mesh.vertices)} {len(self.mesh.faces)} 0')
+        vertices = np.array([line.split() for line in lines[2:2 + len(self.mesh.vertices)]], dtype=float)
+        faces = np.array([line.split() for line in lines[2 + len(self.mesh.vertices):]], dtype=int)
+        self.assertTrue(np.allclose(vertices, self.mesh.vertices))
+        self.assertTrue(np.array_equal(faces[:, 1:], self.mesh.faces))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import configparser
+import json
+import tempfile
+from pathlib import Path
+
+from keebgen.geometry_base import Part, AnchorCollection
+from keebgen.key_assy import prototype_cache
+from keebgen.key_column import ConcaveOrtholinearColumn
+from keebgen.keyboard import DactylManuform
+from keebgen.profiling import Profiler
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        # build keys from scratch instead of copying cached prototypes
+        prototype_cache.clear()
+
+    def make_column(self):
+        c = self.config
+        return ConcaveOrtholinearColumn(c['column'], c['key_assy'], c['socket'])
+
+    def test_hooks(self):
+        originals = (Part.__dict__['translate'], Part.__dict__['solid'], AnchorCollection.__dict__['__getitem__'])
+        with Profiler(trace_allocations=True) as profiler:
+            self.assertIsNot(Part.__dict__['translate'], originals[0])
+            with self.assertRaises(RuntimeError):
+                Profiler().start()
+            column = self.make_column()
+            column.translate(1, 2, 3)
+            column.solid()
+        # hooks are removed when the profiler stops
+        self.assertEqual((Part.__dict__['translate'], Part.__dict__['solid'], AnchorCollection.__dict__['__getitem__']),
+                         originals)
+
+        by_class = profiler.by_class()
+        self.assertEqual(by_class['ConcaveOrtholinearColumn']['construct']['calls'], 1)
+        self.assertGreaterEqual(by_class['ConcaveOrtholinearColumn']['transform']['calls'], 1)
+        self.assertEqual(by_class['ConcaveOrtholinearColumn']['solid']['calls'], 1)
+        # keys are placed in their column with multmatrix()
+        self.assertTrue(any(e.operation == 'transform' and e.method.endswith('.multmatrix') for e in profiler.events))
+        self.assertTrue(any('anchor_query' in operations for operations in by_class.values()))
+        # subclasses calling their base class __init__ count as one construction
+        self.assertEqual(by_class['CherryMXSocket']['construct']['calls'],
+                         sum(1 for e in profiler.events if e.method == 'CherryMXSocket.__init__'))
+        self.assertGreater(by_class['ConcaveOrtholinearColumn']['construct']['alloc_bytes'], 0)
+
+        # named children of the column are reported by name
+        paths = profiler.by_path()
+        self.assertIn('ConcaveOrtholinearColumn/0/socket', paths)
+        self.assertIn('solid', paths['ConcaveOrtholinearColumn/0/socket'])
+
+    def test_keyboard_paths(self):
+        with Profiler() as profiler:
+            keyboard = DactylManuform.from_config(self.config)
+        # columns are built on their own and a copy is added to the keyboard, they're still reported by index
+        columns = [profiler.path(e) for e in profiler.events if e.method == 'ConcaveOrtholinearColumn.__init__']
+        self.assertEqual(columns, [f'DactylManuform/{col_num}' for col_num in range(keyboard.num_cols)])
+        paths = profiler.by_path()
+        for col_num in range(keyboard.num_cols):
+            self.assertIn(f'DactylManuform/{col_num}/0/socket', paths)
+        self.assertNotIn('DactylManuform/ConcaveOrtholinearColumn', paths)
+        self.assertNotIn('DactylManuform/ManuformThumbCluster', paths)
+        self.assertIn('construct', paths['DactylManuform/skirt'])
+        # copies aren't tracked once the profiler stops
+        self.assertNotEqual(Part.__dict__['copy'].__module__, 'keebgen.profiling')
+
+    def test_export(self):
+        with Profiler() as profiler:
+            self.make_column()
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler.to_json(Path(tmp) / 'profile.json')
+            profiler.to_chrome_trace(Path(tmp) / 'trace.json')
+            profile = json.loads((Path(tmp) / 'profile.json').read_text())
+            trace = json.loads((Path(tmp) / 'trace.json').read_text())
+        self.assertEqual(profile['events'], len(profiler.events))
+        self.assertIn('ConcaveOrtholinearColumn', profile['by_class'])
+        self.assertEqual(len(trace['traceEvents']), len(profiler.events))
+        event = trace['traceEvents'][0]
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['name'], 'ConcaveOrtholinearColumn.__init__')
+        self.assertGreaterEqual(event['ts'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
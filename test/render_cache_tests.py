@@ -0,0 +1,193 @@
+import unittest
+import configparser
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import solid as sl
+
+from keebgen.mesh_backend import Mesh
+from keebgen.render_cache import SubtreeHasher, RenderCache, split_transform
+from keebgen.switch_socket import CherryMXSocket
+
+try:
+    import manifold3d
+except ImportError:
+    manifold3d = None
+
+if manifold3d is not None:
+    from keebgen.mesh_backend import MeshBackend
+
+
+def tetrahedron(scale=1.0):
+    return Mesh(np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]]) * scale,
+                [[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]])
+
+
+class SubtreeHasherTest(unittest.TestCase):
+    def test_stable(self):
+        hasher = SubtreeHasher()
+        cube = sl.cube([1, 2, 3], center=True)
+        # same tree built twice
+        self.assertEqual(hasher(cube), SubtreeHasher()(sl.cube([1, 2, 3], center=True)))
+        # numpy and python numbers, and float noise, format the same
+        self.assertEqual(hasher(cube), hasher(sl.cube(np.array([1., 2., 3. + 1e-12]), center=True)))
+        self.assertEqual(hasher(sl.sphere(r=0.0)), hasher(sl.sphere(r=-0.0)))
+        self.assertNotEqual(hasher(cube), hasher(sl.cube([1, 2, 3.001], center=True)))
+        self.assertNotEqual(hasher(cube), hasher(sl.cube([1, 2, 3])))
+
+        # rendering the tree renames segments to $fn, which doesn't change its hash
+        sphere = sl.translate([1, 0, 0])(sl.sphere(d=1, segments=10))
+        before = SubtreeHasher()(sphere)
+        sl.scad_render(sphere)
+        self.assertEqual(SubtreeHasher()(sphere), before)
+        self.assertNotEqual(before, SubtreeHasher()(sl.translate([1, 0, 0])(sl.sphere(d=1, segments=12))))
+
+    def test_transforms(self):
+        hasher = SubtreeHasher()
+        cube = sl.cube(1)
+        translated = sl.translate([1, 2, 3])(cube)
+        matrix = np.eye(4)
+        matrix[:3, 3] = (1, 2, 3)
+        self.assertEqual(hasher(translated), hasher(sl.multmatrix(matrix.tolist())(sl.cube(1))))
+        # chains fold into one matrix
+        self.assertEqual(hasher(translated), hasher(sl.translate([1, 0, 0])(sl.translate([0, 2, 3])(cube))))
+        # identity transforms disappear
+        self.assertEqual(hasher(cube), hasher(sl.rotate([0, 0, 0])(cube)))
+        self.assertNotEqual(hasher(translated), hasher(sl.translate([1, 2, 4])(cube)))
+        # the modifier is part of the subtree
+        self.assertNotEqual(hasher(cube), hasher(sl.cube(1).set_modifier('%')))
+
+        matrix, inner = split_transform(sl.translate([1, 0, 0])(sl.rotate([0, 0, 90])(cube)))
+        self.assertIs(inner, cube)
+        self.assertTrue(np.allclose(matrix @ [1, 0, 0, 1], [1, 1, 0, 1]))
+
+    def test_order(self):
+        hasher = SubtreeHasher()
+        a, b, c = sl.cube(1), sl.sphere(1), sl.cylinder(r=1, h=2)
+        self.assertEqual(hasher(sl.union()(a, b)), hasher(sl.union()(b, a)))
+        self.assertEqual(hasher(sl.difference()(a, b, c)), hasher(sl.difference()(a, c, b)))
+        self.assertNotEqual(hasher(sl.difference()(a, b)), hasher(sl.difference()(b, a)))
+
+    def test_parts(self):
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        socket = CherryMXSocket(config['socket'])
+        moved = CherryMXSocket(config['socket'])
+        moved.rotate(10, 20, 30)
+        moved.translate(4, 5, 6)
+        # placement doesn't change the hash of the part's contents
+        self.assertEqual(SubtreeHasher()(split_transform(socket.solid())[1]),
+                         SubtreeHasher()(split_transform(moved.solid())[1]))
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_get_put(self):
+        cache = RenderCache(self.directory)
+        key = cache.key(sl.cube(1))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, tetrahedron())
+        mesh = RenderCache(self.directory).get(key)
+        self.assertTrue(np.array_equal(mesh.vertices, tetrahedron().vertices))
+        self.assertTrue(np.array_equal(mesh.faces, tetrahedron().faces))
+        self.assertNotEqual(key, cache.key(sl.cube(1), 'other namespace'))
+
+        # empty meshes round trip
+        cache.put('0' * 40, Mesh.empty())
+        self.assertTrue(cache.get('0' * 40).is_empty())
+
+        stats = cache.stats()
+        self.assertEqual(stats.entries, 2)
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertGreater(stats.size, 0)
+
+    def test_corrupt_entry(self):
+        cache = RenderCache(self.directory)
+        key = cache.key(sl.cube(1))
+        cache.put(key, tetrahedron())
+        cache._path(key).write_bytes(b'not a mesh')
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(cache._path(key).exists())
+
+    def test_prune(self):
+        cache = RenderCache(self.directory)
+        keys = [cache.key(sl.cube(i + 1)) for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.put(key, tetrahedron(i + 1))
+            # distinct access times
+            os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+        # the oldest entry becomes the most recently used
+        cache.get(keys[0])
+        entry_size = cache._path(keys[0]).stat().st_size
+
+        self.assertEqual(cache.prune(2 * entry_size), 2)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[3]))
+        self.assertEqual(cache.stats().entries, 2)
+        self.assertEqual(cache.clear(), 2)
+        self.assertEqual(cache.stats().entries, 0)
+
+        # puts evict once max_size is passed
+        small = RenderCache(self.directory, max_size=3 * entry_size)
+        for i, key in enumerate(keys):
+            small.put(key, tetrahedron(i + 1))
+        self.assertLessEqual(small.stats().size, small.max_size)
+
+    def test_concurrent_writers(self):
+        caches = [RenderCache(self.directory, max_size=10 ** 5) for _ in range(4)]
+        keys = [RenderCache.key(sl.cube(i + 1)) for i in range(20)]
+
+        def work(i):
+            cache = caches[i % len(caches)]
+            for key in keys:
+                mesh = cache.get(key)
+                if mesh is not None:
+                    self.assertEqual(len(mesh.faces), 4)
+                cache.put(key, tetrahedron())
+                cache.prune(cache.max_size // 2)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(work, range(16)))
+        # no temporary files are left behind
+        self.assertEqual(list(self.directory.glob('*/.*')), [])
+        for path, _ in caches[0]._entries():
+            with np.load(path) as data:
+                self.assertEqual(data['faces'].shape, (4, 3))
+
+
+@unittest.skipIf(manifold3d is None, 'manifold3d is not installed')
+class MeshBackendCacheTest(unittest.TestCase):
+    def test_reuse(self):
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = RenderCache(tmp)
+            socket = CherryMXSocket(config['socket'])
+            expected = socket.mesh()
+            first = socket.mesh(MeshBackend(cache=cache))
+            self.assertGreater(cache.misses, 0)
+            self.assertAlmostEqual(first.volume(), expected.volume())
+
+            # a moved socket reuses the cached mesh
+            socket.rotate(0, 0, 45)
+            socket.translate(10, 0, 0)
+            misses, hits = cache.misses, cache.hits
+            second = socket.mesh(MeshBackend(cache=cache))
+            self.assertEqual(cache.misses, misses)
+            self.assertGreater(cache.hits, hits)
+            self.assertAlmostEqual(second.volume(), expected.volume())
+            self.assertTrue(np.allclose(second.bounds(), socket.mesh().bounds()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import configparser
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from keebgen.geometry_base import Assembly
+from keebgen.key_column import ConcaveOrtholinearColumn
+from keebgen.render import split_assembly, render_parallel, RenderError, _limit_memory
+
+
+def make_column():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
+
+
+class SplitAssemblyTest(unittest.TestCase):
+    def test_depth(self):
+        column = make_column()
+        self.assertEqual(split_assembly(column, depth=0), [((), column)])
+
+        subtrees = split_assembly(column, depth=1)
+        self.assertEqual(len(subtrees), len(list(column._parts)))
+        # keys are named by their row, connectors by their index
+        paths = [path for path, _ in subtrees]
+        for name in column.get_key_names():
+            self.assertIn((name,), paths)
+
+        # keys are assemblies of a socket and keycap
+        deeper = dict(split_assembly(column, depth=2))
+        self.assertIs(deeper[(0, 'socket')], column.get_part(0).get_part('socket'))
+        self.assertFalse(any(isinstance(part, Assembly) for part in deeper.values()))
+
+    @unittest.skipIf(shutil.which('openscad') is None, 'openscad is not installed')
+    def test_render(self):
+        column = make_column()
+        with tempfile.TemporaryDirectory() as tmp:
+            out_file = Path(tmp) / 'column.stl'
+            results = render_parallel(column, out_file, depth=1, jobs=2, timeout=600)
+            self.assertTrue(out_file.exists())
+        self.assertEqual(len(results), len(list(column._parts)))
+
+
+    @unittest.skipIf(os.name != 'posix', 'needs a shell script to stand in for openscad')
+    def test_all_empty(self):
+        column = make_column()
+        with tempfile.TemporaryDirectory() as tmp:
+            # answers every render like openscad does for a file of background parts
+            openscad = Path(tmp) / 'openscad'
+            calls = Path(tmp) / 'calls'
+            openscad.write_text(f'#!/bin/sh\necho >> "{calls}"\n'
+                                'echo "Current top level object is empty." >&2\nexit 1\n')
+            openscad.chmod(0o755)
+            out_file = Path(tmp) / 'column.stl'
+            with self.assertRaisesRegex(RenderError, 'every subtree of the part is empty'):
+                render_parallel(column, out_file, depth=1, jobs=2, openscad=str(openscad))
+            # the union isn't run
+            self.assertEqual(len(calls.read_text().splitlines()), len(list(column._parts)))
+            self.assertFalse(out_file.exists())
+
+    @unittest.skipIf(os.name != 'posix', 'memory limits are only set on posix')
+    def test_memory_limit(self):
+        command = [sys.executable, '-c', 'import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0])']
+        self.assertEqual(_limit_memory(command, None), command)
+        limit = 2 ** 34
+        output = subprocess.run(_limit_memory(command, limit), capture_output=True, text=True, check=True).stdout
+        self.assertEqual(int(output), limit)
+
+if __name__ == '__main__':
+    unittest.main()
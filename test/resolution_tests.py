@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import solid as sl
+
+from keebgen import resolution
+from keebgen.resolution import PROFILES, resolution as use_resolution
+from keebgen.config import ResolutionProfile
+from keebgen.keycap import OEM
+from keebgen.switch_socket import CherryMXSocket
+from keebgen.finger import Finger
+from keebgen.mesh_backend import MeshBackend
+from keebgen.scad_metrics import analyze
+
+try:
+    import manifold3d
+except ImportError:
+    manifold3d = None
+
+
+class ResolutionTest(unittest.TestCase):
+    def test_profiles(self):
+        self.assertEqual(resolution.get_profile(), PROFILES['final'])
+        with use_resolution('draft') as profile:
+            self.assertIs(resolution.get_profile(), PROFILES['draft'])
+            self.assertTrue(profile.keycap_proxy)
+        self.assertIs(resolution.get_profile(), PROFILES['final'])
+
+        custom = PROFILES['preview'].replace(keycap_curve_segments='60')
+        self.assertEqual(custom.keycap_curve_segments, 60)
+        self.assertIs(resolution.load(custom), custom)
+        with self.assertRaises(ValueError):
+            resolution.load('ultra')
+        with self.assertRaises(ValueError):
+            ResolutionProfile(side_nub_segments=2)
+
+    def test_parts(self):
+        keycap = OEM(1)
+        socket = CherryMXSocket({})
+        finger = Finger(50, 40, 20)
+
+        # final is what parts always made
+        self.assertIn('$fn = 100', sl.scad_render(keycap.solid()))
+        self.assertIn('$fn = 20', sl.scad_render(socket.solid()))
+        self.assertNotIn('$fn', sl.scad_render(finger.solid()))
+        final = sl.scad_render(keycap.solid())
+
+        # the same parts are built again for another profile
+        facets = {}
+        for name in ('draft', 'preview', 'final'):
+            with use_resolution(name):
+                facets[name] = analyze(keycap.solid()).facets + analyze(socket.solid()).facets
+        self.assertLess(facets['draft'], facets['preview'])
+        self.assertLess(facets['preview'], facets['final'])
+        with use_resolution('draft'):
+            self.assertNotIn('difference', sl.scad_render(keycap.solid()))
+            self.assertIn('$fn = 6', sl.scad_render(socket.solid()))
+            self.assertIn('$fn = 6', sl.scad_render(finger.solid()))
+        with use_resolution(PROFILES['final'].replace(keycap_curve_segments=0)):
+            self.assertNotIn('$fn', sl.scad_render(keycap.solid()))
+        self.assertEqual(sl.scad_render(keycap.solid()), final)
+
+    def test_output(self):
+        socket = CherryMXSocket({})
+        with tempfile.TemporaryDirectory() as tmp:
+            with use_resolution('preview'):
+                socket.to_file(Path(tmp) / 'socket.scad')
+                socket.to_file(Path(tmp) / 'socket_modules.scad', use_modules=True)
+            for name in ('socket.scad', 'socket_modules.scad'):
+                code = (Path(tmp) / name).read_text()
+                self.assertEqual(code.count('$fa = 15.0;'), 1)
+                self.assertIn('$fs = 3.0;', code)
+
+    @unittest.skipIf(manifold3d is None, 'manifold3d is not installed')
+    def test_mesh(self):
+        socket = CherryMXSocket({})
+        with use_resolution('preview'):
+            backend = MeshBackend()
+            preview = socket.mesh()
+        self.assertEqual((backend.fa, backend.fs), (15.0, 3.0))
+        self.assertEqual((MeshBackend().fa, MeshBackend(fa=5.0).fa), (12.0, 5.0))
+        self.assertLess(len(preview.faces), len(socket.mesh().faces))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import configparser
+import warnings
+import tempfile
+from pathlib import Path
+
+import solid as sl
+
+from keebgen.key_column import ConcaveOrtholinearColumn
+from keebgen.resolution import resolution, PROFILES
+from keebgen.scad_metrics import analyze, estimate, RenderCostModel, RenderBudgetWarning, FEATURES
+
+
+class ScadMetricsTest(unittest.TestCase):
+    def test_analyze(self):
+        solid = sl.difference()(sl.cube(10), sl.translate([1, 1, 1])(sl.sphere(r=2, segments=8)))
+        metrics = analyze(solid)
+        self.assertEqual(metrics.node_counts, {'difference': 1, 'cube': 1, 'translate': 1, 'sphere': 1})
+        self.assertEqual(metrics.depth, 3)
+        # 8 segments and 4 rings
+        sphere_facets = 2 * 8 * 3 + 2 * 6
+        self.assertEqual(metrics.facets, 12 + sphere_facets)
+        self.assertEqual(metrics.boolean_facets, 12 + sphere_facets)
+
+        hull = analyze(sl.hull()(sl.cylinder(r=1, h=1, segments=6), sl.cylinder(r1=1, r2=0, h=1, segments=6)))
+        self.assertEqual(hull.hulls, 1)
+        self.assertEqual(hull.facets, (12 + 8) + (6 + 4))
+        self.assertEqual(hull.hull_points, 12 + 7)
+        self.assertEqual(hull.boolean_facets, 0)
+
+        # primitives without segments of their own use the file wide $fn
+        self.assertEqual(analyze(sl.sphere(r=2), fn=8).facets, sphere_facets)
+        self.assertEqual(analyze(sl.sphere(r=2, segments=8), fn=30).facets, sphere_facets)
+        with resolution(PROFILES['final'].replace(fn=8)):
+            self.assertEqual(analyze(sl.sphere(r=2)).facets, sphere_facets)
+
+        # background parts aren't rendered
+        self.assertEqual(analyze(sl.union()(sl.cube(1), sl.cube(2).set_modifier('%'))).node_counts,
+                         {'union': 1, 'cube': 1})
+
+    def test_model(self):
+        model = RenderCostModel()
+        small, big = analyze(sl.cube(1)), analyze(sl.sphere(r=10, segments=64))
+        self.assertLess(model.predict(small), model.predict(big))
+
+        # fit to made up renders that take 1ms per facet plus 0.5s
+        solids = [sl.sphere(r=1, segments=n) for n in (8, 16, 24, 32, 48, 64, 96)]
+        for solid in solids:
+            metrics = analyze(solid)
+            model.add_sample(metrics, 0.5 + 1e-3 * metrics.facets)
+        coefficients = model.fit()
+        self.assertEqual(set(coefficients), {'constant', *FEATURES})
+        self.assertTrue(all(value >= 0 for value in coefficients.values()))
+        test = analyze(sl.sphere(r=1, segments=40))
+        self.assertAlmostEqual(model.predict(test), 0.5 + 1e-3 * test.facets, places=3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model.save(Path(tmp) / 'calibration.json')
+            loaded = RenderCostModel.load(Path(tmp) / 'calibration.json')
+        self.assertEqual(loaded.coefficients, model.coefficients)
+        self.assertEqual(len(loaded.samples), len(solids))
+
+    def test_estimate(self):
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        column = ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            report = estimate(column, budget=1e6, limit=3)
+        self.assertFalse(report.over_budget)
+        self.assertEqual(len(report.offenders), 3)
+        seconds = [offender[1] for offender in report.offenders]
+        self.assertEqual(seconds, sorted(seconds, reverse=True))
+        self.assertLessEqual(seconds[0], report.seconds)
+
+        with self.assertWarns(RenderBudgetWarning):
+            self.assertTrue(estimate(column, budget=0).over_budget)
+
+
+if __name__ == '__main__':
+    unittest.main()
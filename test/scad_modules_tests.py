@@ -0,0 +1,48 @@
+import unittest
+import re
+import configparser
+from pathlib import Path
+
+from keebgen.key_column import ConcaveOrtholinearColumn
+from keebgen.scad_modules import scad_render_with_modules
+
+
+def expand_modules(code):
+    """Replaces every module call with the body of the module"""
+    modules = {}
+    def define(match):
+        modules[match.group(1)] = match.group(2)
+        return ''
+    code = re.sub(r'\nmodule (\w+)\(\) \{(.*?)\n\}(?=\n)', define, code, flags=re.DOTALL)
+    while modules:
+        expanded = re.sub(r'(\w+)\(\);', lambda m: modules.get(m.group(1), m.group(0)), code)
+        if expanded == code:
+            break
+        code = expanded
+    return code
+
+
+def normalize(code):
+    return re.sub(r'\s+', '', code)
+
+
+class ScadModulesTest(unittest.TestCase):
+    def test_column(self):
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+        column = ConcaveOrtholinearColumn(config['column'], config['key_assy'], config['socket'])
+        solid = column.solid()
+
+        code, report = scad_render_with_modules(solid)
+        # every key in the column shares the socket geometry
+        self.assertGreater(report.modules, 0)
+        self.assertGreaterEqual(report.instances, 4)
+        self.assertGreater(report.ratio, 1.0)
+        self.assertLess(len(code), len(solid._render()))
+
+        # expanding the modules gives back the original tree
+        self.assertEqual(normalize(expand_modules(code)), normalize(solid._render()))
+
+
+if __name__ == '__main__':
+    unittest.main()
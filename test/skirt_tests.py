@@ -0,0 +1,104 @@
+import unittest
+import configparser
+from pathlib import Path
+
+import numpy as np
+
+from keebgen.keyboard import DactylManuform
+from keebgen.skirt import FlaredSkirt, SweptWall
+from keebgen.mesh_backend import Mesh
+from keebgen import geometry_utils as utils
+
+try:
+    import manifold3d
+except ImportError:
+    manifold3d = None
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+def gift_wrap(points):
+    """Clockwise hull of points ordered clockwise from the leftmost, by gift wrapping over later points only"""
+    hull = [0]
+    prev_point = points[0] - (0, 10)
+    while True:
+        cur_point = points[hull[-1]]
+        angles = [utils.vector_angle_2D(prev_point - cur_point, p - cur_point) for p in points]
+        largest_index = 0
+        for index in range(hull[-1] + 1, len(points)):
+            if angles[index] > angles[largest_index]:
+                largest_index = index
+        if largest_index == 0:
+            return hull
+        hull.append(largest_index)
+        prev_point = cur_point
+
+
+def make_skirt(wall_mode):
+    config = load_config()
+    keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+    edge_pairs = keyboard.build_result['edge_pairs']
+    conf = configparser.ConfigParser()
+    conf['skirt'] = {'wall_thickness': '2.0', 'flare_len': '4.0', 'flare_angle': '30.0', 'wall_mode': wall_mode}
+    return FlaredSkirt(edge_pairs, conf['skirt']), edge_pairs
+
+
+class FlaredSkirtTest(unittest.TestCase):
+    def test_hull(self):
+        # the footprint hull is the same as the gift wrapping it replaced
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            angles = np.sort(rng.uniform(0, 2 * np.pi, 40))[::-1]
+            points = np.stack((np.cos(angles), np.sin(angles)), axis=1) * rng.uniform(5, 10, (40, 1))
+            points = np.roll(points, -np.argmin(points[:, 0]), axis=0)
+            self.assertEqual(list(np.sort(utils.convex_hull_2D(points))), gift_wrap(points))
+
+    def test_footprint(self):
+        skirt, edge_pairs = make_skirt('hull')
+
+        # two connectors per edge pair, the lower ones end on the xy plane
+        self.assertEqual(len(list(skirt._parts)), 2 * len(edge_pairs))
+        bottom = np.concatenate([part.anchors['bottom', 'outside'].array for part in list(skirt._parts)[1::2]])
+        self.assertTrue(np.all(bottom[:, 2] == 0))
+
+        # the bottom outside corners all lie on the convex hull of the footprint
+        hull = bottom[utils.convex_hull_2D(bottom[:, :2]), :2]
+        edges = np.roll(hull, -1, axis=0) - hull
+        normals = np.stack((edges[:, 1], -edges[:, 0]), axis=1) / np.linalg.norm(edges, axis=1)[:, None]
+        distances = np.einsum('ij,kj->ik', bottom[:, :2], normals) - np.einsum('ij,ij->i', hull, normals)
+        self.assertTrue(np.all(distances <= 1e-9))
+        self.assertTrue(np.all(np.min(np.abs(distances), axis=1) <= 1e-9))
+
+    @unittest.skipIf(manifold3d is None, 'manifold3d is not installed')
+    def test_sweep(self):
+        hull_skirt, edge_pairs = make_skirt('hull')
+        skirt, _ = make_skirt('sweep')
+        parts = list(skirt._parts)
+        self.assertEqual(len(parts), 1)
+        self.assertIsInstance(parts[0], SweptWall)
+        self.assertEqual(parts[0].solid().name, 'polyhedron')
+        # every segment's points are on the wall
+        self.assertEqual(len(parts[0].anchors), 7 * len(edge_pairs))
+        self.assertTrue(np.array_equal(np.unique(parts[0].anchors.array, axis=0),
+                                       np.unique(np.concatenate([p.anchors.array for p in hull_skirt._parts]), axis=0)))
+
+        mesh = skirt.mesh()
+        self.assertTrue(mesh.is_closed())
+        # the hulls fill in a little more around corners than the swept wall
+        hull_volume = sum(abs(Mesh(*utils.convex_hull(p.anchors.array)).volume()) for p in hull_skirt._parts)
+        self.assertGreater(mesh.volume(), 0)
+        self.assertLess(mesh.volume(), hull_volume)
+
+    def test_sweep_fallback(self):
+        # segments that don't enclose anything can't be swept
+        self.assertIsNone(SweptWall.sweep(np.zeros((4, 7, 3)), None))
+        with self.assertRaises(ValueError):
+            make_skirt('loft')
+
+
+if __name__ == '__main__':
+    unittest.main()
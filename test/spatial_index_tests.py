@@ -0,0 +1,88 @@
+import unittest
+import configparser
+from pathlib import Path
+
+import numpy as np
+
+from keebgen.keyboard import DactylManuform
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+class SpatialIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config = load_config()
+        cls.keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+
+    def test_queries(self):
+        index = self.keyboard.spatial_index()
+        points = index.points
+        paths = np.array([index.path(i) for i in range(len(index))])
+        has_top = np.array(['top' in index.labels(i) for i in range(len(index))])
+        self.assertEqual(index.path(0), '0/-1/socket')
+
+        point = points[0] + (3, 1, 2)
+        distances = np.linalg.norm(points - point, axis=1)
+        within = index.within(point, 10)
+        self.assertEqual(sorted(within), list(np.flatnonzero(distances <= 10)))
+        self.assertTrue(np.all(np.diff(distances[within]) >= 0))
+        # parts share some corners, so compare distances rather than numbers
+        nearest = index.nearest(point, 5, 'top')
+        self.assertTrue(all(has_top[nearest]))
+        self.assertTrue(np.allclose(distances[nearest], np.sort(distances[has_top])[:5]))
+
+        # the nearest top anchor on another part than the first socket
+        closest = index.closest(points[0], 'top', exclude=paths[0])
+        other = has_top & (paths != paths[0])
+        self.assertAlmostEqual(np.linalg.norm(points[closest] - points[0]),
+                               np.min(np.linalg.norm(points[other] - points[0], axis=1)))
+        # excluding the whole key
+        key = paths[0].rsplit('/', 1)[0]
+        closest = index.closest(points[0], exclude=key)
+        self.assertFalse(index.path(closest).startswith(key + '/'))
+        self.assertIsNone(index.closest(points[0], 'no such label'))
+
+        # pairs are on different parts
+        pairs = index.pairs_within(1.0, ('top', 'front'))
+        self.assertGreater(len(pairs), 0)
+        self.assertTrue(np.all(paths[pairs[:, 0]] != paths[pairs[:, 1]]))
+        self.assertTrue(np.all(np.linalg.norm(points[pairs[:, 0]] - points[pairs[:, 1]], axis=1) <= 1.0))
+
+    def test_invalidation(self):
+        keyboard = self.keyboard.copy()
+        index = keyboard.spatial_index()
+        self.assertIs(keyboard.spatial_index(), index)
+        self.assertIsNot(self.keyboard.spatial_index(), index)
+
+        before = index.points.copy()
+        column = keyboard.get_part(0)
+        column.translate(0, 0, 5)
+        moved = np.array([index.path(i).startswith('0/') for i in range(len(index))])
+        self.assertTrue(np.allclose(index.points[moved], before[moved] + (0, 0, 5)))
+        self.assertTrue(np.array_equal(index.points[~moved], before[~moved]))
+        self.assertEqual(index.path(index.nearest(before[0] + (0, 0, 5))[0]), index.path(0))
+
+        # moving a key inside a column changes the keyboard
+        generation = keyboard.generation
+        keyboard.get_part(1).get_part(0).translate(1, 0, 0)
+        self.assertGreater(keyboard.generation, generation)
+        moved = np.array([index.path(i).startswith('1/0/') for i in range(len(index))])
+        self.assertTrue(np.allclose(index.points[moved], before[moved] + (1, 0, 0)))
+
+        # but changes to other assemblies, even copies of this one, don't throw the index away
+        points = index.points
+        generation = self.keyboard.generation
+        other = self.keyboard.copy()
+        other.get_part(0).translate(0, 0, 5)
+        other.get_part(1).get_part(0).translate(1, 0, 0)
+        self.assertIs(index.points, points)
+        self.assertEqual(self.keyboard.generation, generation)
+
+
+if __name__ == '__main__':
+    unittest.main()
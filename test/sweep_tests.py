@@ -0,0 +1,116 @@
+import unittest
+import configparser
+import csv
+import json
+import tempfile
+import warnings
+from pathlib import Path
+
+from keebgen import resolution
+from keebgen.sweep import (parse_values, expand_grid, load_manifest, variant_id, apply_overrides, run_sweep,
+                           shadowed_options, DuplicateVariantWarning)
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+class SweepTest(unittest.TestCase):
+    def test_values(self):
+        self.assertEqual(parse_values('50:60:5'), ['50.0', '55.0', '60.0'])
+        self.assertEqual(parse_values('0:1:0.1')[-1], '1.0')
+        self.assertEqual(parse_values('1, 2.5,x'), ['1', '2.5', 'x'])
+        with self.assertRaises(ValueError):
+            parse_values('0:1:0')
+
+        grid = expand_grid({'column.radius': [50, 60], 'column.key_side_lean': ['0', '5']})
+        self.assertEqual(len(grid), 4)
+        self.assertIn({'column.radius': '60', 'column.key_side_lean': '5'}, grid)
+        self.assertEqual(variant_id({'a.b': '1', 'c.d': '2'}), variant_id({'c.d': '2', 'a.b': '1'}))
+        # the base config and format are part of the id
+        self.assertEqual(variant_id({}, load_config()), variant_id({}, load_config()))
+        self.assertNotEqual(variant_id({}, load_config()), variant_id({}, {'column': {'radius': '50'}}))
+        self.assertNotEqual(variant_id({}, load_config()), variant_id({}, load_config(), 'stl'))
+        self.assertEqual(variant_id({}, load_config()), variant_id({}, load_config(), profile='final'))
+        self.assertNotEqual(variant_id({}, load_config()), variant_id({}, load_config(), profile='draft'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / 'manifest.json'
+            manifest.write_text(json.dumps({'params': {'column.radius': [50, 60]},
+                                            'variants': [{'keyboard.column_2_y_offset': 8}]}))
+            self.assertEqual(load_manifest(manifest), [{'column.radius': '50'}, {'column.radius': '60'},
+                                                       {'keyboard.column_2_y_offset': '8'}])
+
+    def test_overrides(self):
+        config = apply_overrides({'column': {'radius': '55'}}, {'column.radius': '60', 'new.option': 'x'})
+        self.assertEqual(config['column']['radius'], '60')
+        self.assertEqual(config['new']['option'], 'x')
+        with self.assertRaises(ValueError):
+            apply_overrides({}, {'radius': '60'})
+
+    def test_resume(self):
+        variants = [{'keyboard.column_4_radius': '50'}, {'keyboard.column_4_radius': '52'},
+                    {'keyboard.column_2_y_offset': '8'}]
+        with tempfile.TemporaryDirectory() as tmp:
+            out_dir = Path(tmp)
+            built = []
+            rows = run_sweep(load_config(), variants[:2], out_dir, jobs=2, progress=built.append)
+            self.assertEqual(len(built), 2)
+            for row in rows:
+                self.assertNotIn('error', row)
+                self.assertTrue((out_dir / row['file']).exists())
+                self.assertGreater(row['file_bytes'], 0)
+                self.assertGreater(row['parts'], 0)
+
+            # simulate a run that was killed while writing a line
+            with open(out_dir / 'metrics.jsonl', 'a') as f:
+                f.write('{"id": "trunc')
+
+            built.clear()
+            rows = run_sweep(load_config(), variants, out_dir, jobs=2, progress=built.append)
+            # only the new variant is built
+            self.assertEqual([row['overrides'] for row in built], [variants[2]])
+            self.assertEqual([row['overrides'] for row in rows], variants)
+
+            with open(out_dir / 'metrics.csv') as f:
+                table = list(csv.DictReader(f))
+            self.assertEqual([row['id'] for row in table], [variant_id(v, load_config()) for v in variants])
+            self.assertEqual(table[0]['keyboard.column_4_radius'], '50')
+
+            # a different base config isn't mistaken for the finished sweep
+            built.clear()
+            config = load_config()
+            config['column']['key_gap'] = '3.0'
+            rows = run_sweep(config, variants[:1], out_dir, jobs=1, progress=built.append)
+            self.assertEqual([row['overrides'] for row in built], variants[:1])
+            self.assertNotEqual(rows[0]['id'], variant_id(variants[0], load_config()))
+
+            # and neither is a different resolution profile, which every worker builds with
+            built.clear()
+            rows = run_sweep(load_config(), variants[:1], out_dir, jobs=1, progress=built.append, profile='draft')
+            self.assertEqual(len(built), 1)
+            self.assertEqual(rows[0]['id'], variant_id(variants[0], load_config(), profile='draft'))
+            code = (out_dir / rows[0]['file']).read_text()
+            self.assertTrue(code.startswith(resolution.PROFILES['draft'].file_header()))
+
+
+    def test_no_effect(self):
+        # column_tuning sets the radius of every column
+        self.assertEqual(shadowed_options({'column.radius': '50', 'column.key_gap': '3'}), ['column.radius'])
+        self.assertEqual(shadowed_options({'keyboard.column_4_radius': '50'}), [])
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                run_sweep(load_config(), [{'column.radius': '50'}], tmp, jobs=1)
+
+            # the pinky column's radius is already 48.9
+            with self.assertWarns(DuplicateVariantWarning):
+                rows = run_sweep(load_config(), [{}, {'keyboard.column_4_radius': '48.9'}], tmp, jobs=1)
+            self.assertEqual(rows[0]['file_sha1'], rows[1]['file_sha1'])
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DuplicateVariantWarning)
+                run_sweep(load_config(), [{}, {'keyboard.column_4_radius': '50'}], tmp, jobs=1)
+
+if __name__ == '__main__':
+    unittest.main()
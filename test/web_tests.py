@@ -0,0 +1,105 @@
+import unittest
+import configparser
+from pathlib import Path
+
+import numpy as np
+
+from keebgen.keyboard import DactylManuform
+from keebgen.connector import Connector
+from keebgen import web
+from keebgen import geometry_utils as utils
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(Path(__file__).resolve().parent.parent / 'default_config.ini')
+    return config
+
+
+def square(x, y, size=18.0):
+    """top corners of a flat socket with its front left corner at x, y, in the order of web._CORNERS"""
+    return [(x, y, 0), (x + size, y, 0), (x + size, y + size, 0), (x, y + size, 0)]
+
+
+def area(triangles, corners):
+    points = corners.reshape((-1, 3))[triangles]
+    return np.sum(np.linalg.norm(np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0]), axis=1)) / 2
+
+
+def overlap(a, b, tolerance=1e-6):
+    """True if the convex hulls of the 2D points a and b overlap by more than touching"""
+    for points in (a, b):
+        hull = points[utils.convex_hull_2D(points)]
+        edges = np.roll(hull, -1, axis=0) - hull
+        for normal in np.stack((edges[:, 1], -edges[:, 0]), axis=1):
+            normal /= np.linalg.norm(normal)
+            if np.max(a @ normal) <= np.min(b @ normal) + tolerance or \
+                    np.max(b @ normal) <= np.min(a @ normal) + tolerance:
+                return False
+    return True
+
+
+class WebTest(unittest.TestCase):
+    def test_triangles(self):
+        # a column of 3 keys and a column of 2 keys next to it, moved up by half a key. Gaps are 2mm
+        corners = np.array([square(0, 0), square(0, 20), square(0, 40), square(20, 10), square(20, 30)])
+        groups = [0, 0, 0, 1, 1]
+        triangles = web.web_triangles(corners, groups)
+        keys = triangles // 4
+
+        # every triangle joins both columns
+        self.assertTrue(np.all(np.any(keys < 3, axis=1) & np.any(keys >= 3, axis=1)))
+        # the gap is filled along the long column, tapering off past the ends of the short one
+        self.assertAlmostEqual(area(triangles, corners), 2 * 58 - 2 * 10)
+        points = corners.reshape((-1, 3))[triangles]
+        self.assertTrue(np.all((points[..., 0] >= 18) & (points[..., 0] <= 20)))
+
+        # columns further apart than max_gap aren't joined, unless one of them allows it
+        corners[3:, :, 0] += 10
+        self.assertEqual(len(web.web_triangles(corners, groups)), 0)
+        self.assertAlmostEqual(area(web.web_triangles(corners, groups, (8.0, 15.0)), corners), 12 * 58 - 12 * 10)
+
+    def test_keyboard(self):
+        config = load_config()
+        config['keyboard']['web_mode'] = 'auto'
+        keyboard = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'])
+        built = keyboard.build_result
+        self.assertNotIn('thumb_connectors', built.values)
+        connectors = built['web']
+        self.assertTrue(all(isinstance(connector, Connector) for connector in connectors))
+
+        # the web is made before the keyboard is moved into place, in the frame of the built columns
+        groups = [built[f'column_{col_num}'].keys() for col_num in range(keyboard.num_cols)] + \
+                 [built['thumb_cluster'].key_grid.keys()]
+        top = np.concatenate([web.socket_corners(keys)[0] for keys in groups]).reshape((-1, 3))
+        corner_groups = np.repeat(np.arange(len(groups)), [4 * len(keys) for keys in groups])
+        thumb = len(groups) - 1
+
+        # every pair of neighbouring columns is joined, and so is the thumb cluster
+        joined = set()
+        for connector in connectors:
+            points = connector.anchors['top'].array
+            distances = np.linalg.norm(points[:, None] - top[None], axis=2)
+            self.assertTrue(np.all(np.min(distances, axis=1) < 1e-9))
+            joined.add(tuple(sorted(set(corner_groups[np.argmin(distances, axis=1)]))))
+        for col_num in range(1, keyboard.num_cols):
+            self.assertTrue(any(col_num - 1 in pair and col_num in pair for pair in joined))
+        self.assertTrue(any(thumb in pair and len(pair) > 1 for pair in joined))
+
+        # and no connector is built over a socket, in the plane the web is triangulated in
+        centered = top - np.mean(top, axis=0)
+        axes = np.linalg.svd(centered, full_matrices=False)[2][:2]
+        sockets = (centered @ axes.T).reshape((-1, 4, 2))
+        for connector in connectors:
+            piece = (connector.anchors['top'].array - np.mean(top, axis=0)) @ axes.T
+            self.assertFalse(any(overlap(piece, socket) for socket in sockets))
+
+        # the web is rebuilt on its own
+        config['keyboard']['web_thumb_gap'] = '12.0'
+        rebuilt = DactylManuform(config['keyboard'], config['column'], config['key_assy'], config['socket'],
+                                 previous=keyboard)
+        self.assertEqual(rebuilt.build_result.rebuilt, ['web'])
+
+
+if __name__ == '__main__':
+    unittest.main()